@@ -0,0 +1,90 @@
+#!/usr/bin/python
+"""
+Benchmarks the nearest endpoint search of the infill path linking.
+
+A sparse synthetic layer of short fill segments scattered at random is linked greedily, as getPathsFromEndpoints does when
+no endpoint nearby can be reached: from the end of the last segment to the nearest endpoint left, removing both endpoints
+of each segment as it is linked. The nearest endpoint is found with:
+    linear  every endpoint left in the endpoint table, as the linking used to
+    tree    the EndpointTree of the remaining endpoints, built when the linking starts
+
+The linear search is quadratic, so it is only run on the layers with up to 20000 endpoints unless -a is given.
+Both searches link the segments in the same order, so the linked length is printed for comparison.
+
+Usage:
+    python benchmarks/endpoint_search.py [-a] [endpoints ...]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fabmetheus_utilities import euclidean
+
+__linear_maximum_endpoints__ = 20000
+__methods__ = ['linear', 'tree']
+
+def getEndpoints(numberOfEndpoints, segmentLength):
+    'Get the endpoints of short horizontal segments scattered at random over a square, about twenty segment lengths apart.'
+    random.seed(numberOfEndpoints)
+    side = segmentLength * 20.0 * (0.5 * numberOfEndpoints) ** 0.5
+    endpoints = []
+    for segmentIndex in xrange(numberOfEndpoints / 2):
+        begin = complex(random.uniform(0.0, side), random.uniform(0.0, side))
+        beginEndpoint = euclidean.Endpoint()
+        endEndpoint = euclidean.Endpoint()
+        beginEndpoint.getFromOtherPoint(endEndpoint, begin)
+        endEndpoint.getFromOtherPoint(beginEndpoint, begin + segmentLength)
+        endpoints += [beginEndpoint, endEndpoint]
+    return endpoints
+
+def getLinkedLength(method, endpoints, oneOverEndpointWidth):
+    'Link the segments greedily with the search method and get the length of the links.'
+    endpointTable = {}
+    for endpoint in endpoints[2 :]:
+        euclidean.addElementToPixelListFromPoint(endpoint, endpointTable, endpoint.point * oneOverEndpointWidth)
+    endpointTree = None
+    if method == 'tree':
+        endpointTree = euclidean.EndpointTree(euclidean.getListTableElements(endpointTable))
+    linkedLength = 0.0
+    otherEndpoint = endpoints[1]
+    while len(endpointTable) > 0:
+        if method == 'linear':
+            nextEndpoint = otherEndpoint.getNearestEndpoint(euclidean.getListTableElements(endpointTable))
+        else:
+            nextEndpoint = endpointTree.getNearestEndpoint(otherEndpoint.point)
+        linkedLength += abs(nextEndpoint.point - otherEndpoint.point)
+        euclidean.removeElementFromPixelListFromPoint(nextEndpoint, endpointTable, nextEndpoint.point * oneOverEndpointWidth)
+        otherEndpoint = nextEndpoint.otherEndpoint
+        euclidean.removeElementFromPixelListFromPoint(otherEndpoint, endpointTable, otherEndpoint.point * oneOverEndpointWidth)
+        if endpointTree != None:
+            endpointTree.removeEndpoint(nextEndpoint)
+            endpointTree.removeEndpoint(otherEndpoint)
+    return linkedLength
+
+def main():
+    'Time the linking of the layers with each search method.'
+    arguments = sys.argv[1 :]
+    isAllLinear = '-a' in arguments
+    arguments = [argument for argument in arguments if argument != '-a']
+    numbersOfEndpoints = [10000, 30000, 100000]
+    if len(arguments) > 0:
+        numbersOfEndpoints = [int(argument) for argument in arguments]
+    extrusionWidth = 0.4
+    oneOverEndpointWidth = 1.0 / (5.0 * extrusionWidth)
+    for numberOfEndpoints in numbersOfEndpoints:
+        endpoints = getEndpoints(numberOfEndpoints, 4.0 * extrusionWidth)
+        print('%d endpoints' % len(endpoints))
+        for method in __methods__:
+            if method == 'linear' and len(endpoints) > __linear_maximum_endpoints__ and not isAllLinear:
+                print('%-7s skipped, -a runs it' % method)
+                continue
+            startTime = time.time()
+            linkedLength = getLinkedLength(method, endpoints, oneOverEndpointWidth)
+            print('%-7s %8.2f s  linked length %.3f' % (method, time.time() - startTime, linkedLength))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/python
+"""
+Benchmarks the multiprocess inset of the layers.
+
+A binary stl of a grid of many sided columns is generated, carved and prefaced, and its layers are inset with:
+    serial      the layers one after the other in this process
+    manager     the layers in a manager list mapped to the bound inset method in a pool, as the multiprocess inset used to
+    executor    the layer executor, which sends the boundaries of each layer to the workers and gets back its perimeter paths
+
+The bytes printed for each method are those pickled to the workers and back for all the layers, and the digest is that
+of the inset layers, which is the same for every method.
+
+Usage:
+    python benchmarks/inset_layers.py [-j processes] [columns]
+"""
+
+import copy_reg
+import cPickle
+import hashlib
+import logging
+import math
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'plugins'))
+
+from config import config
+from entities import SlicedModel
+from entities.Extruder import setupExtruders
+from utilities import class_pickler, layer_executor
+import inset
+import meshes
+import skeinforge_engine
+
+__methods__ = ['serial', 'manager', 'executor']
+
+def getDigest(slicedModel):
+    'Get the digest of the layers of the inset model.'
+    digest = hashlib.md5()
+    for layer in slicedModel.layers:
+        digest.update(str(layer))
+    return digest.hexdigest()
+
+def getExecutorBytes(insetSkein):
+    'Get the bytes pickled to the workers and back by the layer executor.'
+    numberOfBytes = 0
+    for layer in insetSkein.slicedModel.layers:
+        boundaries = [nestedRing.getXYBoundaries() for nestedRing in insetSkein.getNestedRingsInInsetOrder(layer)]
+        layerArguments = (insetSkein.getHalfWidth(layer), layer_executor.getLoopsArray(boundaries))
+        numberOfBytes += len(cPickle.dumps(layerArguments, 2))
+        numberOfBytes += len(cPickle.dumps(inset.getPerimeterPathsArrays(insetSkein, layerArguments), 2))
+    return numberOfBytes
+
+def getManagerBytes(insetSkein):
+    'Get the bytes pickled to the workers and back by the manager list, which sends every layer before and after its inset.'
+    numberOfBytes = 0
+    for layer in insetSkein.slicedModel.layers:
+        numberOfBytes += len(cPickle.dumps(layer, 2))
+        insetSkein.addInsetForLayer(layer)
+        numberOfBytes += len(cPickle.dumps(layer, 2))
+    return numberOfBytes
+
+def insetByManager(insetSkein, processes):
+    'Inset the layers in a manager list mapped to the bound inset method in a pool, as the multiprocess inset used to.'
+    copy_reg.pickle(types.MethodType, class_pickler._pickle_method, class_pickler._unpickle_method)
+    sharedLayers = multiprocessing.Manager().list(insetSkein.slicedModel.layers)
+    pool = multiprocessing.Pool(processes)
+    resultLayers = pool.map(insetSkein.addInsetForLayer, sharedLayers)
+    pool.close()
+    pool.join()
+    for resultLayer in resultLayers:
+        insetSkein.slicedModel.layers[resultLayer.index] = resultLayer
+
+def writeColumnsStl(fileName, numberOfColumns):
+    'Write a binary stl of a square grid of the number of many sided columns.'
+    side = max(1, int(math.ceil(numberOfColumns ** 0.5)))
+    facets = []
+    for columnIndex in xrange(numberOfColumns):
+        center = (12.0 * (columnIndex % side), 12.0 * (columnIndex / side))
+        facets += meshes.getFrustumFacets(5.0, 5.0, 120, 10.0, center)
+    meshes.writeStl(fileName, facets)
+
+def main():
+    'Carve and preface the generated model, then time the inset of its layers with each method.'
+    arguments = sys.argv[1 :]
+    processes = multiprocessing.cpu_count()
+    if '-j' in arguments:
+        processesIndex = arguments.index('-j')
+        processes = int(arguments[processesIndex + 1])
+        del arguments[processesIndex : processesIndex + 2]
+    numberOfColumns = 16
+    if len(arguments) > 0:
+        numberOfColumns = int(arguments[0])
+    os.chdir(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    config.read('skeinforge_engine.cfg')
+    config.read(config.get('general', 'default.profile'))
+    logging.basicConfig(level=logging.WARNING)
+    fileName = os.path.join(tempfile.gettempdir(), 'inset_layers_benchmark.stl')
+    writeColumnsStl(fileName, numberOfColumns)
+    try:
+        slicedModel = SlicedModel()
+        slicedModel.runtimeParameters.inputFilename = fileName
+        setupExtruders(slicedModel)
+        skeinforge_engine.getCraftedTextFromPlugins(['carve', 'preface'], slicedModel)
+    finally:
+        os.remove(fileName)
+    pickledModel = cPickle.dumps(slicedModel, 2)
+    print('%d columns, %d layers, %d processes of %d cpus' % (numberOfColumns, len(slicedModel.layers), processes, multiprocessing.cpu_count()))
+    for method in __methods__:
+        insetSkein = inset.InsetSkein(cPickle.loads(pickledModel))
+        startTime = time.time()
+        if method == 'serial':
+            insetSkein.inset()
+        elif method == 'manager':
+            insetByManager(insetSkein, processes)
+        else:
+            insetSkein.insetByProcesses(processes)
+        duration = time.time() - startTime
+        numberOfBytes = 0
+        if method == 'manager':
+            numberOfBytes = getManagerBytes(inset.InsetSkein(cPickle.loads(pickledModel)))
+        elif method == 'executor':
+            numberOfBytes = getExecutorBytes(inset.InsetSkein(cPickle.loads(pickledModel)))
+        print('%-9s %8.2f s %11d bytes  digest %s' % (method, duration, numberOfBytes, getDigest(insetSkein.slicedModel)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/python
+"""
+Benchmarks the loop intersection tests.
+
+The loops of a lattice layer, a square plate with a grid of round holes, are tested with:
+    brute   the functions of euclidean, which test every segment of the loops
+    index   the segment index, which tests only the segments in the grid cells of each line
+
+For each method the layer is checked for loops intersecting each other, as the carve does, and lines across the layer
+are tested against the loops, as the comb does.  The results are the same for both methods.
+
+Usage:
+    python benchmarks/loop_intersection.py [holes along a side]
+"""
+
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fabmetheus_utilities import euclidean
+from fabmetheus_utilities import segment_index
+
+__methods__ = ['brute', 'index']
+
+def getCircle(center, radius, numberOfSides):
+    'Get a clockwise circle loop.'
+    return [center + radius * euclidean.getWiddershinsUnitPolar(-2.0 * math.pi * sideIndex / numberOfSides) for sideIndex in xrange(numberOfSides)]
+
+def getLatticeLoops(numberOfHoles, pitch=3.0, numberOfSides=24):
+    'Get the loops of the lattice layer, the plate and its round holes.'
+    side = numberOfHoles * pitch
+    loops = [[complex(0.0, 0.0), complex(side, 0.0), complex(side, side), complex(0.0, side)]]
+    for holeIndex in xrange(numberOfHoles * numberOfHoles):
+        center = complex(pitch * (holeIndex % numberOfHoles + 0.5), pitch * (holeIndex / numberOfHoles + 0.5))
+        loops.append(getCircle(center, 0.35 * pitch, numberOfSides))
+    return loops
+
+def main():
+    'Time the intersection tests of the lattice layer with each method.'
+    numberOfHoles = 12
+    if len(sys.argv) > 1:
+        numberOfHoles = int(sys.argv[1])
+    loops = getLatticeLoops(numberOfHoles)
+    side = numberOfHoles * 3.0
+    random.seed(0)
+    lines = []
+    for lineIndex in xrange(2000):
+        begin = complex(random.uniform(0.0, side), random.uniform(0.0, side))
+        lines.append((begin, begin + 3.0 * euclidean.getWiddershinsUnitPolar(random.uniform(0.0, 2.0 * math.pi))))
+    print('%d loops, %d segments, %d lines' % (len(loops), sum([len(loop) for loop in loops]), len(lines)))
+    for method in __methods__:
+        startTime = time.time()
+        if method == 'brute':
+            isListIntersecting = euclidean.isLoopListIntersecting(loops)
+            intersectingLines = [lineIndex for lineIndex, line in enumerate(lines) if euclidean.isLineIntersectingLoops(loops, line[0], line[1])]
+        else:
+            isListIntersecting = segment_index.isLoopListIntersecting(loops)
+            intersectingLines = segment_index.SegmentIndex(loops).getIntersectingLines(lines)
+        print('%-6s %8.3f s  loops intersecting %s, %d intersecting lines' % (method, time.time() - startTime, isListIntersecting, len(intersectingLines)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Generates the closed triangle meshes of the benchmarks and writes them as binary stl files.
+
+Each mesh is a list of facets, each facet a tuple of three (x, y, z) vertexes counterclockwise seen from outside, and
+the facets of a mesh share their edges exactly, so the meshes carve as correct meshes.
+    cube        a 20 mm cube
+    cylinder    a cylinder of 720 sides
+    vase        a thin walled vase, a tube with a wall of two extrusion widths whose radius waves with the height
+    overhang    an upside down cone frustum, whose side overhangs by 60 degrees from the vertical
+    lattice     a square plate with a grid of square holes, with hundreds of loops on each layer
+"""
+
+import math
+import struct
+
+def addQuadFacets(facets, begin, end, endTop, beginTop):
+    'Add the two facets of a quadrilateral, given counterclockwise seen from outside.'
+    facets.append((begin, end, endTop))
+    facets.append((begin, endTop, beginTop))
+
+def getCubeFacets():
+    'Get the facets of the 20 mm cube.'
+    return getFrustumFacets(10.0 * math.sqrt(2.0), 10.0 * math.sqrt(2.0), 4, 20.0)
+
+def getCylinderFacets():
+    'Get the facets of the cylinder of 720 sides.'
+    return getFrustumFacets(10.0, 10.0, 720, 10.0)
+
+def getFrustumFacets(bottomRadius, topRadius, numberOfSides, height, center=(0.0, 0.0)):
+    'Get the facets of a closed cone frustum with regular polygon ends, which is a prism if the radiuses are equal.'
+    bottomCorners = getPolygon(center, bottomRadius, numberOfSides, 0.0)
+    topCorners = getPolygon(center, topRadius, numberOfSides, height)
+    bottomCenter = (center[0], center[1], 0.0)
+    topCenter = (center[0], center[1], height)
+    facets = []
+    for sideIndex in xrange(numberOfSides):
+        nextIndex = (sideIndex + 1) % numberOfSides
+        addQuadFacets(facets, bottomCorners[sideIndex], bottomCorners[nextIndex], topCorners[nextIndex], topCorners[sideIndex])
+        facets.append((bottomCenter, bottomCorners[nextIndex], bottomCorners[sideIndex]))
+        facets.append((topCenter, topCorners[sideIndex], topCorners[nextIndex]))
+    return facets
+
+def getLatticeFacets(numberOfHoles=10, pitch=3.0, barWidth=1.2, height=4.0):
+    'Get the facets of a square plate with a grid of square holes, which is built of rectangular cells so that the facets share their edges.'
+    lines = []
+    for holeIndex in xrange(numberOfHoles + 1):
+        lines += [holeIndex * pitch, holeIndex * pitch + barWidth]
+    numberOfCells = len(lines) - 1
+    isSolid = lambda x, y: x >= 0 and y >= 0 and x < numberOfCells and y < numberOfCells and (x % 2 == 0 or y % 2 == 0)
+    facets = []
+    for x in xrange(numberOfCells):
+        for y in xrange(numberOfCells):
+            if not isSolid(x, y):
+                continue
+            corners = [(lines[x], lines[y]), (lines[x + 1], lines[y]), (lines[x + 1], lines[y + 1]), (lines[x], lines[y + 1])]
+            bottoms = [(corner[0], corner[1], 0.0) for corner in corners]
+            tops = [(corner[0], corner[1], height) for corner in corners]
+            facets += [(bottoms[0], bottoms[2], bottoms[1]), (bottoms[0], bottoms[3], bottoms[2])]
+            facets += [(tops[0], tops[1], tops[2]), (tops[0], tops[2], tops[3])]
+            neighbors = [(x, y - 1), (x + 1, y), (x, y + 1), (x - 1, y)]
+            for sideIndex, neighbor in enumerate(neighbors):
+                if not isSolid(neighbor[0], neighbor[1]):
+                    nextIndex = (sideIndex + 1) % 4
+                    addQuadFacets(facets, bottoms[sideIndex], bottoms[nextIndex], tops[nextIndex], tops[sideIndex])
+    return facets
+
+def getOverhangFacets():
+    'Get the facets of the upside down cone frustum, whose side overhangs by 60 degrees from the vertical.'
+    height = 8.0
+    return getFrustumFacets(2.0, 2.0 + height * math.tan(math.radians(60.0)), 120, height)
+
+def getPolygon(center, radius, numberOfSides, z):
+    'Get the counterclockwise corners of a regular polygon, turned by half a side so that a square has sides along the axes.'
+    corners = []
+    for sideIndex in xrange(numberOfSides):
+        angle = math.pi * (2.0 * sideIndex + 1.0) / numberOfSides
+        corners.append((center[0] + radius * math.cos(angle), center[1] + radius * math.sin(angle), z))
+    return corners
+
+def getVaseFacets(numberOfSides=240, numberOfRings=40, wallThickness=1.2, height=20.0):
+    'Get the facets of the thin walled vase, a tube whose outer and inner walls are joined by rings at the bottom and the top.'
+    outerRings = []
+    innerRings = []
+    for ringIndex in xrange(numberOfRings + 1):
+        z = height * ringIndex / numberOfRings
+        outerRadius = 12.0 + 3.0 * math.sin(2.0 * math.pi * z / height)
+        outerRings.append(getPolygon((0.0, 0.0), outerRadius, numberOfSides, z))
+        innerRings.append(getPolygon((0.0, 0.0), outerRadius - wallThickness, numberOfSides, z))
+    facets = []
+    for sideIndex in xrange(numberOfSides):
+        nextIndex = (sideIndex + 1) % numberOfSides
+        for ringIndex in xrange(numberOfRings):
+            outerRing = outerRings[ringIndex]
+            outerRingTop = outerRings[ringIndex + 1]
+            addQuadFacets(facets, outerRing[sideIndex], outerRing[nextIndex], outerRingTop[nextIndex], outerRingTop[sideIndex])
+            innerRing = innerRings[ringIndex]
+            innerRingTop = innerRings[ringIndex + 1]
+            addQuadFacets(facets, innerRing[nextIndex], innerRing[sideIndex], innerRingTop[sideIndex], innerRingTop[nextIndex])
+        addQuadFacets(facets, innerRings[0][sideIndex], innerRings[0][nextIndex], outerRings[0][nextIndex], outerRings[0][sideIndex])
+        addQuadFacets(facets, outerRings[-1][sideIndex], outerRings[-1][nextIndex], innerRings[-1][nextIndex], innerRings[-1][sideIndex])
+    return facets
+
+def writeStl(fileName, facets):
+    'Write the facets as a binary stl file.'
+    stlFile = open(fileName, 'wb')
+    stlFile.write('\0' * 80)
+    stlFile.write(struct.pack('<I', len(facets)))
+    for facet in facets:
+        stlFile.write(struct.pack('<3f', 0.0, 0.0, 0.0))
+        for vertex in facet:
+            stlFile.write(struct.pack('<3f', *vertex))
+        stlFile.write('\0\0')
+    stlFile.close()
+
+# The generators of the meshes by name, in the order in which the benchmarks run them.
+__meshes__ = [
+        ('cube', getCubeFacets),
+        ('cylinder', getCylinderFacets),
+        ('vase', getVaseFacets),
+        ('overhang', getOverhangFacets),
+        ('lattice', getLatticeFacets)]
@@ -0,0 +1,80 @@
+#!/usr/bin/python
+"""
+Benchmarks the pixel table of the line fill.
+
+The pixel table operations of the fill of a round layer are repeated with:
+    dict    the pixel dictionary
+    grid    the pixel grid covering the layer, backed by a numpy array
+
+The layer has a perimeter and an around of short segments, fill lines crossing it in long segments, and for each fill line
+an intersection test and a removal of a segment table, as the fill does when it adds points to the paths.
+
+Usage:
+    python benchmarks/pixel_table.py [diameter in millimeters]
+"""
+
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fabmetheus_utilities import euclidean
+from fabmetheus_utilities import pixel_grid
+
+__methods__ = ['dict', 'grid']
+
+def getCircle(radius, numberOfSides):
+    'Get a counterclockwise circle loop.'
+    return [radius * euclidean.getWiddershinsUnitPolar(2.0 * math.pi * sideIndex / numberOfSides) for sideIndex in xrange(numberOfSides)]
+
+def getFillResult(loops, pixelTable, radius, extrusionWidth, width):
+    'Fill the round layer using the pixel table and return the number of intersecting segments and of pixels left.'
+    for loop in loops:
+        euclidean.addLoopToPixelTable(loop, pixelTable, width)
+    numberOfIntersections = 0
+    y = -radius + extrusionWidth
+    pathIndex = 0
+    while y < radius - extrusionWidth:
+        halfLength = math.sqrt(radius * radius - y * y) - extrusionWidth
+        begin = complex(-halfLength, y)
+        end = complex(halfLength, y + 0.2 * extrusionWidth)
+        euclidean.addValueSegmentToPixelTable(begin, end, pixelTable, pathIndex, width)
+        segmentTable = {}
+        maskTable = {}
+        euclidean.addValueSegmentToPixelTable(begin, end, maskTable, None, width)
+        euclidean.addSegmentToPixelTable(begin, complex(0.0, y + extrusionWidth), segmentTable, 0.0, 2.0, width)
+        if euclidean.isPixelTableIntersecting(pixelTable, segmentTable, maskTable):
+            numberOfIntersections += 1
+        removalTable = {}
+        euclidean.addValueSegmentToPixelTable(begin, 0.5 * (begin + end), removalTable, pathIndex, width)
+        euclidean.removePixelTableFromPixelTable(removalTable, pixelTable)
+        y += extrusionWidth
+        pathIndex += 1
+    return numberOfIntersections, len(pixelTable)
+
+def main():
+    'Time the fill of the round layer with each pixel table.'
+    diameter = 100.0
+    if len(sys.argv) > 1:
+        diameter = float(sys.argv[1])
+    extrusionWidth = 0.4
+    width = 0.25 * extrusionWidth
+    radius = 0.5 * diameter
+    loops = [getCircle(radius, 720), getCircle(radius - 0.25 * extrusionWidth, 720)]
+    print('%.0f mm layer, %d fill lines' % (diameter, int(diameter / extrusionWidth)))
+    for method in __methods__:
+        startTime = time.time()
+        if method == 'dict':
+            pixelTable = {}
+        else:
+            pixelTable = pixel_grid.getPixelTable(loops, width)
+            if pixelTable.__class__ == dict:
+                print('%-6s numpy is not installed or the layer is too large for a grid' % method)
+                continue
+        numberOfIntersections, numberOfPixels = getFillResult(loops, pixelTable, radius, extrusionWidth, width)
+        print('%-6s %8.3f s  %d intersections %d pixels' % (method, time.time() - startTime, numberOfIntersections, numberOfPixels))
+
+if __name__ == '__main__':
+    main()
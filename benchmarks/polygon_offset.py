@@ -0,0 +1,50 @@
+#!/usr/bin/python
+"""
+Benchmarks the polygon offset backends.
+
+The loops of a lattice layer, a square plate with a grid of round holes, are offset with each backend:
+    intercircle   the circles around the points of the loops and the loops of their intersections
+    clipper       the integer coordinate offset of pyclipper, if it is installed
+
+For each backend every loop is inset by itself, as inset and comb do, and the region of the loops is inset and outset, as
+fill, support and skirt do.  The loops of the backends differ slightly, so their number and area are printed to compare them.
+
+Usage:
+    python benchmarks/polygon_offset.py [holes along a side]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fabmetheus_utilities import euclidean
+from fabmetheus_utilities import polygon_offset
+from loop_intersection import getLatticeLoops
+
+def getSummary(loops):
+    'Get the number and the total area of the loops.'
+    return '%d loops of area %.2f' % (len(loops), sum([euclidean.getAreaLoop(loop) for loop in loops]))
+
+def main():
+    'Time the offsets of the lattice layer with each backend.'
+    numberOfHoles = 12
+    if len(sys.argv) > 1:
+        numberOfHoles = int(sys.argv[1])
+    loops = getLatticeLoops(numberOfHoles)
+    radius = 0.3
+    print('%d loops, %d points, radius %s' % (len(loops), sum([len(loop) for loop in loops]), radius))
+    for backend in polygon_offset.globalBackends:
+        polygon_offset.setBackend(backend)
+        if polygon_offset.getBackend() != backend:
+            print('%-11s not available' % backend)
+            continue
+        startTime = time.time()
+        insetLoops = polygon_offset.getInsetLoopsFromLoops(radius, loops)
+        separateInsetLoops = polygon_offset.getInsetSeparateLoopsFromLoops(radius, loops)
+        separateOutsetLoops = polygon_offset.getInsetSeparateLoopsFromLoops(-radius, loops)
+        print('%-11s %8.3f s  inset %s, separate inset %s, separate outset %s' % (backend, time.time() - startTime, getSummary(insetLoops), getSummary(separateInsetLoops), getSummary(separateOutsetLoops)))
+
+if __name__ == '__main__':
+    main()
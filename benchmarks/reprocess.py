@@ -0,0 +1,119 @@
+#!/usr/bin/python
+"""
+Benchmarks the reprocessing of exported sliced models, and checks that both formats reprocess to the same gcode.
+
+A generated mesh is skeined once with the sliced model exported in each format:
+    binary  the sliced model file, whose layers are read lazily
+    pickle  the pickle of the whole sliced model
+
+Each exported model is then reprocessed with each list of plugins, preface among them, which builds the layers anew
+and appends them to those of the model. Last the binary model is reprocessed into a pickle, and that pickle is
+reprocessed again. The gcode of each reprocess must be the same for both formats, otherwise the check exits with 1.
+
+Usage:
+    python benchmarks/reprocess.py [-c config] [mesh]
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+__benchmarks_directory__ = os.path.dirname(os.path.abspath(__file__))
+__repository_directory__ = os.path.dirname(__benchmarks_directory__)
+sys.path.insert(0, __repository_directory__)
+
+import meshes
+
+__formats__ = ['binary', 'pickle']
+__plugin_lists__ = ['fill', 'preface,fill', 'inset,fill,cool']
+__profile_text__ = '''[profile]
+name=reprocess
+
+[dimension]
+extrusion.units.relative=true
+
+[export]
+file.extension.profile=false
+export.slicedmodel=true
+export.slicedmodel.format=%s
+export.slicedmodel.extension=slicedmodel
+overwrite.exported.slicedmodel=true
+'''
+
+def getFileDigest(fileName):
+    'Get the md5 hex digest of the content of the file.'
+    digestFile = open(fileName, 'rb')
+    digest = hashlib.md5(digestFile.read()).hexdigest()
+    digestFile.close()
+    return digest
+
+def skein(configFilename, profileFilename, inputFilename, gcodeFilename, plugins=None):
+    'Skein or reprocess the file and get the seconds it took and the digest of its gcode.'
+    import skeinforge_engine
+    argv = ['-c', configFilename, '-p', profileFilename, '-o', gcodeFilename]
+    if plugins != None:
+        argv += ['-r', plugins]
+    startTime = time.time()
+    skeinforge_engine.main(argv + [inputFilename])
+    seconds = time.time() - startTime
+    if not os.path.isfile(gcodeFilename):
+        raise Exception('No gcode was exported for %s' % inputFilename)
+    digest = getFileDigest(gcodeFilename)
+    os.remove(gcodeFilename)
+    return seconds, digest
+
+def main():
+    'Reprocess the sliced models of both formats and compare their gcode.'
+    meshNames = [name for name, getFacets in meshes.__meshes__]
+    parser = argparse.ArgumentParser(description='Benchmarks the reprocessing of exported sliced models.')
+    parser.add_argument('mesh', nargs='?', choices=meshNames, help='Mesh to skein, defaults to the vase.', default='vase')
+    parser.add_argument('-c', metavar='config', help='Configuration for skeinforge engine.', default=os.path.join(__repository_directory__, 'skeinforge_engine.cfg'))
+    args = parser.parse_args()
+
+    configFilename = os.path.abspath(args.c)
+    directory = tempfile.mkdtemp(prefix='skeinforge_reprocess_')
+    binaryDigests = {}
+    numberOfDifferences = 0
+    try:
+        stlFilename = os.path.join(directory, args.mesh + '.stl')
+        meshes.writeStl(stlFilename, dict(meshes.__meshes__)[args.mesh]())
+        gcodeFilename = os.path.join(directory, args.mesh + '.gcode')
+        modelFilename = os.path.join(directory, args.mesh + '.slicedmodel')
+        profileFilenames = {}
+        for modelFormat in __formats__:
+            profileFilenames[modelFormat] = os.path.join(directory, modelFormat + '.profile')
+            profileFile = open(profileFilenames[modelFormat], 'w')
+            profileFile.write(__profile_text__ % modelFormat)
+            profileFile.close()
+            skein(configFilename, profileFilenames[modelFormat], stlFilename, gcodeFilename)
+            shutil.move(modelFilename, os.path.join(directory, modelFormat + '.slicedmodel'))
+        print('%-16s %-8s %10s  %s' % ('plugins', 'format', 'seconds', 'gcode'))
+        runs = [(plugins, modelFormat, modelFormat) for plugins in __plugin_lists__ for modelFormat in __formats__]
+        runs.append(('fill', 'binary', 'pickle'))
+        for plugins, modelFormat, exportFormat in runs:
+            shutil.copy(os.path.join(directory, modelFormat + '.slicedmodel'), modelFilename)
+            seconds, digest = skein(configFilename, profileFilenames[exportFormat], modelFilename, gcodeFilename, plugins)
+            label = modelFormat
+            if exportFormat != modelFormat:
+                seconds, digest = skein(configFilename, profileFilenames[exportFormat], modelFilename, gcodeFilename, plugins)
+                label = '%s to %s' % (modelFormat, exportFormat)
+            if modelFormat == __formats__[0] and exportFormat == modelFormat:
+                binaryDigests[plugins] = digest
+            mark = ''
+            if digest != binaryDigests[plugins]:
+                mark = '  DIFFERS'
+                numberOfDifferences += 1
+            print('%-16s %-8s %10.3f  %s%s' % (plugins, label, seconds, digest, mark))
+    finally:
+        shutil.rmtree(directory)
+    if numberOfDifferences > 0:
+        print('\n%d reprocesses differ from those of the binary sliced model' % numberOfDifferences)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+#!/usr/bin/python
+"""
+Benchmarks the vertex welding of the stl import.
+
+A binary stl of a triangulated height field is generated, each vertex of which is shared by up to six facets, and loaded with:
+    str     the former welding, keyed on str(Vector3)
+    tuple   the pure python welding, keyed on the coordinate tuple
+    numpy   the sort based unique over the packed facet vertex array
+
+Each method runs in its own process so that the reported peak resident memory belongs to that method alone.
+
+Usage:
+    python benchmarks/stl_weld.py [facets]
+"""
+
+import os
+import resource
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fabmetheus_utilities import archive
+from fabmetheus_utilities.fabmetheus_tools.interpret_plugins import stl
+from fabmetheus_utilities.geometry.geometry_tools import face
+from fabmetheus_utilities.geometry.solids import triangle_mesh
+
+__methods__ = ['str', 'tuple', 'numpy']
+
+def getCarvingByString(fileName):
+    'Get the triangle mesh by unpacking every vertex and keying it on its string, as the stl import used to.'
+    stlData = archive.getFileText(fileName, True, 'rb')
+    triangleMesh = triangle_mesh.TriangleMesh()
+    vertexIndexTable = {}
+    vertexes = []
+    for facetIndex in xrange((len(stlData) - 84) / 50):
+        byteIndex = 84 + facetIndex * 50
+        vertexes.append(stl.getVertexGivenBinary(byteIndex + 12, stlData))
+        vertexes.append(stl.getVertexGivenBinary(byteIndex + 24, stlData))
+        vertexes.append(stl.getVertexGivenBinary(byteIndex + 36, stlData))
+    for vertexIndex in xrange(0, len(vertexes), 3):
+        faceGivenLines = face.Face()
+        faceGivenLines.index = len(triangleMesh.faces)
+        for i in xrange(vertexIndex, vertexIndex + 3):
+            vertex = vertexes[i]
+            vertexUniqueIndex = len(vertexIndexTable)
+            if str(vertex) in vertexIndexTable:
+                vertexUniqueIndex = vertexIndexTable[str(vertex)]
+            else:
+                vertexIndexTable[str(vertex)] = vertexUniqueIndex
+                triangleMesh.vertexes.append(vertex)
+            faceGivenLines.vertexIndexes.append(vertexUniqueIndex)
+        triangleMesh.faces.append(faceGivenLines)
+    return triangleMesh
+
+def writeHeightFieldStl(fileName, numberOfFacets):
+    'Write a binary stl of a wavy height field with about the number of facets.'
+    side = max(2, int((numberOfFacets / 2) ** 0.5))
+    stlFile = open(fileName, 'wb')
+    stlFile.write('\0' * 80)
+    stlFile.write(struct.pack('<I', 2 * side * side))
+    getVertex = lambda x, y: (0.1 * x, 0.1 * y, 5.0 + ((x * 7 + y * 13) % 17) * 0.01)
+    for x in xrange(side):
+        for y in xrange(side):
+            corners = [getVertex(x, y), getVertex(x + 1, y), getVertex(x + 1, y + 1), getVertex(x, y + 1)]
+            for facet in [(corners[0], corners[1], corners[2]), (corners[0], corners[2], corners[3])]:
+                stlFile.write(struct.pack('<3f', 0.0, 0.0, 1.0))
+                for vertex in facet:
+                    stlFile.write(struct.pack('<3f', *vertex))
+                stlFile.write('\0\0')
+    stlFile.close()
+    return 2 * side * side
+
+def runMethod(method, fileName):
+    'Load the stl with one welding method and print the time, peak memory and mesh size.'
+    getCarving = stl.getCarving
+    if method == 'str':
+        getCarving = getCarvingByString
+    elif method == 'tuple':
+        stl.numpy = None
+    elif stl.numpy == None:
+        print('%-6s numpy is not installed' % method)
+        return
+    startTime = time.time()
+    triangleMesh = getCarving(fileName)
+    duration = time.time() - startTime
+    peakMegabytes = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    print('%-6s %8.2f s %9.1f MB peak  %d vertexes %d faces' % (method, duration, peakMegabytes, len(triangleMesh.vertexes), len(triangleMesh.faces)))
+
+def main():
+    'Generate the mesh and time each welding method in a separate process.'
+    numberOfFacets = 200000
+    if len(sys.argv) > 1:
+        numberOfFacets = int(sys.argv[1])
+    fileName = os.path.join(tempfile.gettempdir(), 'stl_weld_benchmark.stl')
+    numberOfFacets = writeHeightFieldStl(fileName, numberOfFacets)
+    print('%d facets, %d bytes' % (numberOfFacets, os.path.getsize(fileName)))
+    try:
+        for method in __methods__:
+            subprocess.check_call([sys.executable, os.path.abspath(__file__), '--method', method, fileName])
+    finally:
+        os.remove(fileName)
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == '--method':
+        runMethod(sys.argv[2], sys.argv[3])
+    else:
+        main()
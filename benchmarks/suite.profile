@@ -0,0 +1,11 @@
+; The profile of the benchmark suite, overriding the default.profile defined in skeinforge_engine.cfg.
+; The suite keeps the relative extrusion distances it has always benchmarked, so that its results compare with older baselines.
+
+[profile]
+name=suite
+
+[export]
+export.slicedmodel=false
+
+[dimension]
+extrusion.units.relative=true
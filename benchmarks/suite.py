@@ -0,0 +1,174 @@
+#!/usr/bin/python
+"""
+Benchmark suite of the skeining of the generated meshes of benchmarks/meshes.py.
+
+Each mesh is skeined with the whole plugin sequence of the configuration, in a process of its own so that the peak
+resident memory belongs to that mesh alone. For each mesh the results are the seconds of the skein and of each plugin,
+the peak resident memory, the number of layers, and the size and md5 digest of the gcode. With -n the skein of each
+mesh is repeated and the fastest run is kept.
+
+The results are written as json, and if a baseline results file is given they are compared with it. A mesh whose
+seconds or peak memory grew by more than the tolerance, or whose gcode changed, is a regression and the suite exits
+with 1, so that the results of a change can be checked against those of the commit before it:
+    python benchmarks/suite.py -o baseline.json
+    python benchmarks/suite.py -b baseline.json
+
+The default profile benchmarks/suite.profile uses relative extrusion distances.
+
+Usage:
+    python benchmarks/suite.py [-c config] [-p profile] [-n repeats] [-o results] [-b baseline] [-t tolerance] [mesh ...]
+"""
+
+from collections import OrderedDict
+import argparse
+import hashlib
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+__benchmarks_directory__ = os.path.dirname(os.path.abspath(__file__))
+__repository_directory__ = os.path.dirname(__benchmarks_directory__)
+sys.path.insert(0, __repository_directory__)
+
+import meshes
+
+def getComparisonLines(name, result, baselineResult, tolerance):
+    'Get the lines comparing the result of a mesh with its baseline result, and whether it is a regression.'
+    lines = []
+    isRegression = False
+    for key, unit in [('seconds', 's'), ('peakMegabytes', 'MB')]:
+        ratio = result[key] / max(baselineResult[key], 1e-9)
+        mark = ''
+        if ratio > 1.0 + tolerance:
+            mark = '  REGRESSION'
+            isRegression = True
+        lines.append('%-9s %-14s %10.3f %s %10.3f %s %7.2fx%s' % (name, key, baselineResult[key], unit, result[key], unit, ratio, mark))
+    for plugin, seconds in result['plugins'].items():
+        baselineSeconds = baselineResult['plugins'].get(plugin)
+        if baselineSeconds != None:
+            lines.append('%-9s   %-12s %10.3f s %10.3f s %7.2fx' % (name, plugin, baselineSeconds, seconds, seconds / max(baselineSeconds, 1e-9)))
+    if result['gcodeDigest'] != baselineResult['gcodeDigest']:
+        lines.append('%-9s gcode changed, %s layers %s bytes were %s layers %s bytes  REGRESSION' % (name, result['layers'], result['gcodeBytes'], baselineResult['layers'], baselineResult['gcodeBytes']))
+        isRegression = True
+    return lines, isRegression
+
+def getFileDigest(fileName):
+    'Get the md5 hex digest of the content of the file.'
+    fileDigest = hashlib.md5()
+    digestFile = open(fileName, 'rb')
+    for block in iter(lambda: digestFile.read(1048576), ''):
+        fileDigest.update(block)
+    digestFile.close()
+    return fileDigest.hexdigest()
+
+def getMeshResult(configFilename, profileFilename, stlFilename, repeats):
+    'Skein the mesh in a process of its own the number of times and get the result of the fastest run.'
+    arguments = [sys.executable, os.path.abspath(__file__), '--skein', configFilename, profileFilename, stlFilename]
+    bestResult = None
+    for repeatIndex in xrange(repeats):
+        process = subprocess.Popen(arguments, cwd=__repository_directory__, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output, errors = process.communicate()
+        if process.returncode != 0:
+            raise Exception('Skeining %s failed:\n%s' % (stlFilename, errors[-4000 :]))
+        result = json.loads(output.splitlines()[-1], object_pairs_hook=OrderedDict)
+        if bestResult == None or result['seconds'] < bestResult['seconds']:
+            bestResult = result
+    return bestResult
+
+def skeinMesh(configFilename, profileFilename, stlFilename):
+    'Skein the mesh with the whole plugin sequence and print its result as a json line.'
+    import skeinforge_engine
+    pluginStartTimes = []
+    progressCallback = lambda pluginIndex, numberOfPlugins, plugin: pluginStartTimes.append((plugin, time.time()))
+    gcodeFilename = os.path.splitext(stlFilename)[0] + '.gcode'
+    startTime = time.time()
+    slicedModel = skeinforge_engine.main(['-c', configFilename, '-p', profileFilename, '-o', gcodeFilename, stlFilename], progressCallback)
+    endTime = time.time()
+    if slicedModel == None or not os.path.isfile(gcodeFilename):
+        raise Exception('No gcode was exported for %s' % stlFilename)
+    plugins = OrderedDict()
+    for pluginIndex, (plugin, pluginStartTime) in enumerate(pluginStartTimes):
+        pluginEndTime = endTime
+        if pluginIndex + 1 < len(pluginStartTimes):
+            pluginEndTime = pluginStartTimes[pluginIndex + 1][1]
+        plugins[plugin] = round(pluginEndTime - pluginStartTime, 6)
+    result = OrderedDict([
+            ('seconds', round(endTime - startTime, 6)),
+            ('peakMegabytes', round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 3)),
+            ('layers', len(slicedModel.layers)),
+            ('gcodeBytes', os.path.getsize(gcodeFilename)),
+            ('gcodeDigest', getFileDigest(gcodeFilename)),
+            ('plugins', plugins)])
+    print(json.dumps(result))
+
+def main():
+    'Skein the meshes, write the results and compare them with the baseline.'
+    parser = argparse.ArgumentParser(description='Benchmarks the skeining of the generated meshes.')
+    parser.add_argument('meshes', nargs='*', help='Meshes to skein, defaults to all of %s.' % ', '.join([name for name, getFacets in meshes.__meshes__]))
+    parser.add_argument('-c', metavar='config', help='Configuration for skeinforge engine.', default=os.path.join(__repository_directory__, 'skeinforge_engine.cfg'))
+    parser.add_argument('-p', metavar='profile', help='Profile for the skeining.', default=os.path.join(__benchmarks_directory__, 'suite.profile'))
+    parser.add_argument('-n', metavar='repeats', type=int, help='Number of skeins of each mesh, of which the fastest is kept.', default=1)
+    parser.add_argument('-o', metavar='results', help='Json file to write the results to.')
+    parser.add_argument('-b', metavar='baseline', help='Json results file to compare the results with.')
+    parser.add_argument('-t', metavar='tolerance', type=float, help='Relative growth of the seconds or the peak memory which is a regression.', default=0.1)
+    args = parser.parse_args()
+
+    meshNames = [name for name, getFacets in meshes.__meshes__]
+    for meshName in args.meshes:
+        if meshName not in meshNames:
+            parser.error('Unknown mesh %s, the meshes are %s.' % (meshName, ', '.join(meshNames)))
+    configFilename = os.path.abspath(args.c)
+    profileFilename = os.path.abspath(args.p)
+    results = OrderedDict([
+            ('python', platform.python_version()),
+            ('platform', platform.platform()),
+            ('profile', profileFilename),
+            ('meshes', OrderedDict())])
+    directory = tempfile.mkdtemp(prefix='skeinforge_suite_')
+    try:
+        for meshName, getFacets in meshes.__meshes__:
+            if len(args.meshes) > 0 and meshName not in args.meshes:
+                continue
+            stlFilename = os.path.join(directory, meshName + '.stl')
+            meshes.writeStl(stlFilename, getFacets())
+            result = getMeshResult(configFilename, profileFilename, stlFilename, args.n)
+            results['meshes'][meshName] = result
+            print('%-9s %8.3f s %9.1f MB peak %5d layers %10d bytes of gcode' % (meshName, result['seconds'], result['peakMegabytes'], result['layers'], result['gcodeBytes']))
+    finally:
+        shutil.rmtree(directory)
+
+    if args.o != None:
+        resultsFile = open(args.o, 'w')
+        json.dump(results, resultsFile, indent=2)
+        resultsFile.close()
+    if args.b == None:
+        return 0
+    baselineFile = open(args.b)
+    baseline = json.load(baselineFile, object_pairs_hook=OrderedDict)
+    baselineFile.close()
+    print('\n%-9s %-14s %12s %12s %8s' % ('mesh', 'measure', 'baseline', 'result', 'ratio'))
+    numberOfRegressions = 0
+    for meshName, result in results['meshes'].items():
+        if meshName not in baseline['meshes']:
+            print('%-9s is not in the baseline' % meshName)
+            continue
+        lines, isRegression = getComparisonLines(meshName, result, baseline['meshes'][meshName], args.t)
+        print('\n'.join(lines))
+        if isRegression:
+            numberOfRegressions += 1
+    print('\n%d of %d meshes regressed' % (numberOfRegressions, len(results['meshes'])))
+    if numberOfRegressions > 0:
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    if len(sys.argv) == 5 and sys.argv[1] == '--skein':
+        skeinMesh(sys.argv[2], sys.argv[3], sys.argv[4])
+    else:
+        sys.exit(main())
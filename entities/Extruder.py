@@ -15,7 +15,7 @@ def setupExtruders(slicedModel):
 
 class Extruder:
     def __init__(self, runtimeParameters, section):
-        self.extrussionDistance = 0
+        self.extrusionDistance = 0
         self.lastRetractDistance = 0
         self.filamentExtruded = 0
 
@@ -55,8 +55,8 @@ class Extruder:
         if self.extrusionUnitsRelative:
             extrusionDistance = round(extrusionDistance, self.dimensionDecimalPlaces)
         else:
-            self.extrussionDistance += extrusionDistance
-            extrusionDistance = round(self.extrussionDistance, self.dimensionDecimalPlaces)
+            self.extrusionDistance += extrusionDistance
+            extrusionDistance = round(self.extrusionDistance, self.dimensionDecimalPlaces)
 
         return extrusionDistance
 
@@ -74,9 +74,9 @@ class Extruder:
             self.extrusionDistance -= retractDistance
             retractDistance = round(self.extrusionDistance, self.dimensionDecimalPlaces)
 
-        commands.append(GcodeCommand(gcodes.LINEAR_GCODE_MOVEMENT, [('F', '%s' % self.extruderRetractionSpeedMinute)]))
-        commands.append(GcodeCommand(gcodes.LINEAR_GCODE_MOVEMENT, [('%s' % self.axisCode, '%s' % retractDistance)]))
-        commands.append(GcodeCommand(gcodes.LINEAR_GCODE_MOVEMENT, [('F', '%s' % resumingSpeed)]))
+        commands.append(GcodeCommand(gcodes.LINEAR_GCODE_MOVEMENT, [('F', self.extruderRetractionSpeedMinute)]))
+        commands.append(GcodeCommand(gcodes.LINEAR_GCODE_MOVEMENT, [(self.axisCode, retractDistance)]))
+        commands.append(GcodeCommand(gcodes.LINEAR_GCODE_MOVEMENT, [('F', resumingSpeed)]))
 
         return commands
 
@@ -91,9 +91,9 @@ class Extruder:
             self.extrusionDistance += self.lastRetractDistance
             retractDistance = round(self.extrusionDistance, self.dimensionDecimalPlaces)
 
-        commands.append(GcodeCommand(gcodes.LINEAR_GCODE_MOVEMENT, [('F', '%s' % self.extruderRetractionSpeedMinute)]))
-        commands.append(GcodeCommand(gcodes.LINEAR_GCODE_MOVEMENT, [('%s' % self.axisCode, '%s' % retractDistance)]))
-        commands.append(GcodeCommand(gcodes.LINEAR_GCODE_MOVEMENT, [('F', '%s' % self.travelFeedRateMinute)]))
+        commands.append(GcodeCommand(gcodes.LINEAR_GCODE_MOVEMENT, [('F', self.extruderRetractionSpeedMinute)]))
+        commands.append(GcodeCommand(gcodes.LINEAR_GCODE_MOVEMENT, [(self.axisCode, retractDistance)]))
+        commands.append(GcodeCommand(gcodes.LINEAR_GCODE_MOVEMENT, [('F', self.travelFeedRateMinute)]))
 
         if not self.extrusionUnitsRelative:
             commands.append(self.getResetExtruderDistanceCommand())
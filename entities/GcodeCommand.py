@@ -1,35 +1,68 @@
-from collections import OrderedDict
 from config import config
 from fabmetheus_utilities import archive, svg_writer, euclidean
 from fabmetheus_utilities.vector3 import Vector3
 from math import log10, floor, pi
 from utilities import memory_tracker
-from StringIO import StringIO
 import gcodes
 import math
 import sys
 import time
 
-class GcodeCommand:
+# The line formats of the commands by their command letter, parameter names and verbosity, so that each is made once.
+globalLineFormats = {}
+
+def getLineFormat(commandLetter, parameterNames, verbose):
+    'Get the format of the line of the commands with the command letter and parameter names, into which their parameter values are formatted.'
+    key = (commandLetter, parameterNames, verbose)
+    if key in globalLineFormats:
+        return globalLineFormats[key]
+    words = [commandLetter[0].replace('%', '%%')]
+    for name in parameterNames:
+        words.append(('%s' % name).replace('%', '%%') + '%s')
+    if verbose:
+        words.append((';%20s' % commandLetter[1]).replace('%', '%%'))
+    lineFormat = ' '.join(words).strip()
+    globalLineFormats[key] = lineFormat
+    return lineFormat
+
+class GcodeCommand(object):
+    '''A gcode command. Its parameter names and values are kept in tuples and the values are formatted only when the line is written.'''
+    __slots__ = ['commandLetter', 'parameterNames', 'parameterValues']
+
     def __init__(self, commandLetter, parameters=None):
         self.commandLetter = commandLetter
+        self.parameterNames = ()
+        self.parameterValues = ()
         if parameters == None:
-            parameters = {}
-        self.parameters = OrderedDict(parameters)
+            return
+        if isinstance(parameters, dict):
+            parameters = parameters.items()
+        if len(parameters) > 0:
+            self.parameterNames, self.parameterValues = zip(*parameters)
+
+    def __getstate__(self):
+        '''Get the values of the slots, for pickling and copying.'''
+        return (self.commandLetter, self.parameterNames, self.parameterValues)
+
+    def __setstate__(self, state):
+        '''Set the values of the slots, from pickling and copying.'''
+        self.commandLetter, self.parameterNames, self.parameterValues = state
 
     def __str__(self):
         return self.str(False)
 
+    def getParameters(self):
+        '''Get the (name, value) pairs of the parameters.'''
+        return zip(self.parameterNames, self.parameterValues)
+
+    parameters = property(getParameters)
+
     def str(self, verbose=False):
         '''Get the string representation.'''
-        output = StringIO()
-        output.write('%s ' % (self.commandLetter[0]))
-        for name, value in self.parameters.items():
-            output.write('%s%s ' % (name, value))
-        if (verbose):
-            output.write(';%20s ' % (self.commandLetter[1]))
-        return output.getvalue().strip()
-
+        lineFormat = globalLineFormats.get((self.commandLetter, self.parameterNames, verbose))
+        if lineFormat == None:
+            lineFormat = getLineFormat(self.commandLetter, self.parameterNames, verbose)
+        return lineFormat % self.parameterValues
 
     @staticmethod
     def printCommand(command, verbose=False):
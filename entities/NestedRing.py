@@ -191,6 +191,20 @@ class NestedRing:
         self.infillPaths.append(infillPath)
 
 
+    def addFillStates(self, fillStates):
+        'Add the fill loops and paths of this and the inner nested rings, which is all that fill changes.'
+        fillStates.append((self.extraLoops, self.penultimateFillLoops, self.lastFillLoops, self.infillPathsHolder))
+        for innerNestedRing in self.innerNestedRings:
+            innerNestedRing.addFillStates(fillStates)
+
+
+    def setFillStates(self, fillStateIterator):
+        'Set the fill loops and paths of this and the inner nested rings, in the order of addFillStates.'
+        self.extraLoops, self.penultimateFillLoops, self.lastFillLoops, self.infillPathsHolder = fillStateIterator.next()
+        for innerNestedRing in self.innerNestedRings:
+            innerNestedRing.setFillStates(fillStateIterator)
+
+
     def getLoopsToBeFilled(self):
         'Get last fill loops from the outside loop and the loops inside the inside loops.'
         if self.lastFillLoops == None:
@@ -34,6 +34,8 @@ class RuntimeParameters:
         self.infillBridgeDirection = config.getboolean('carve', 'infill.bridge.direction')
         self.importCoarsenessRatio = config.getfloat('carve', 'import.coarseness.ratio')
         self.correctMesh = config.getboolean('carve', 'mesh.correct')
+        self.offsetBackend = config.get('carve', 'offset.backend')
+        self.offsetCachePoints = config.getint('carve', 'offset.cache.points')
         self.decimalPlaces = config.getint('general', 'decimal.places')
         self.layerPrintFrom = config.getint('carve', 'layer.print.from')
         self.layerPrintTo = config.getint('carve', 'layer.print.to')
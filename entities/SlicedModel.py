@@ -14,6 +14,7 @@ class SlicedModel:
 
         self.runtimeParameters = RuntimeParameters()
         self.layers = []
+        self.offsetCache = None
 
         self.startGcodeCommands = []
         self.endGcodeCommands = []
@@ -43,7 +44,7 @@ class SlicedModel:
             output.write(GcodeCommand.printCommand(startGcodeCommand, self.runtimeParameters.verboseGcode))
 
         output.write("\nlayers:\n")
-        for layer in self.layers:
+        for layer in self.getReadLayers():
             output.write('%s\n' % layer)
 
         output.write("\nendGcodeCommands:\n")
@@ -52,6 +53,18 @@ class SlicedModel:
 
         return output.getvalue()
 
+    def getReadLayer(self, index):
+        '''Get the layer to read, which if the layers are read lazily is not kept unless a plugin got it.'''
+        if hasattr(self.layers, 'getReadLayer'):
+            return self.layers.getReadLayer(index)
+        return self.layers[index]
+
+    def getReadLayers(self):
+        '''Get the layers to read, of which those read lazily are not kept unless a plugin got them.'''
+        if hasattr(self.layers, 'getReadLayers'):
+            return self.layers.getReadLayers()
+        return self.layers
+
     def insertLayers(self, layers, index):
         '''Inserts list of layers at position given by index.'''
 
@@ -1,63 +1,174 @@
 from GcodeCommand import GcodeCommand
 from StringIO import StringIO
+from array import array
+from collections import namedtuple
 from config import config
 from fabmetheus_utilities.vector3 import Vector3
 from math import pi
 from utilities import memory_tracker
 import gcodes
+import itertools
 import math
 import sys
 import time
+import weakref
 
 # globals used as an easy way to maintain state between layer changes
 _totalExtrusionDistance = 0.0
 _previousPoint = None
 
+# The settings of the paths by the runtime parameters they were copied from, so that they are copied once for each.
+globalPathSettings = weakref.WeakKeyDictionary()
+# The runtime parameters whose path settings were got last and those settings, as almost all paths get the same ones.
+globalLastPathSettings = (None, None)
+
+# The settings which a path uses, copied from the runtime parameters and the configuration. They are shared by all the
+# paths made with the same runtime parameters, so they are immutable.
+PathSettings = namedtuple('PathSettings', [
+        'absolutePositioning', 'bridgeFeedRateMinute', 'bridgeFlowRate', 'combActive', 'decimalPlaces', 'dimensionActive',
+        'dimensionDecimalPlaces', 'extrusionFeedRateMinute', 'extrusionUnitsRelative', 'flowRate', 'layerThickness',
+        'minimumBridgeFeedRateMultiplier', 'minimumExtrusionFeedRateMultiplier', 'minimumLayerFeedRateMinute',
+        'minimumPerimeterFeedRateMultiplier', 'minimumTravelFeedRateMultiplier', 'perimeterFeedRateMinute',
+        'perimeterFlowRate', 'perimeterWidth', 'speedActive', 'supportFeedRateMinute', 'travelFeedRateMinute', 'zDistanceRatio'])
+
+def getPathSettings(runtimeParameters):
+    'Get the path settings of the runtime parameters, which are made once for them.'
+    global globalLastPathSettings
+    if runtimeParameters is globalLastPathSettings[0]:
+        return globalLastPathSettings[1]
+    if runtimeParameters in globalPathSettings:
+        globalLastPathSettings = (runtimeParameters, globalPathSettings[runtimeParameters])
+        return globalLastPathSettings[1]
+    pathSettings = PathSettings(
+        absolutePositioning=config.getboolean('preface', 'positioning.absolute'),
+        bridgeFeedRateMinute=runtimeParameters.bridgeFeedRateMinute,
+        bridgeFlowRate=runtimeParameters.bridgeFlowRate,
+        combActive=runtimeParameters.combActive,
+        decimalPlaces=runtimeParameters.decimalPlaces,
+        dimensionActive=runtimeParameters.dimensionActive,
+        dimensionDecimalPlaces=runtimeParameters.dimensionDecimalPlaces,
+        extrusionFeedRateMinute=runtimeParameters.extrusionFeedRateMinute,
+        extrusionUnitsRelative=runtimeParameters.extrusionUnitsRelative,
+        flowRate=runtimeParameters.flowRate,
+        layerThickness=runtimeParameters.layerThickness,
+        minimumBridgeFeedRateMultiplier=runtimeParameters.minimumBridgeFeedRateMultiplier,
+        minimumExtrusionFeedRateMultiplier=runtimeParameters.minimumExtrusionFeedRateMultiplier,
+        minimumLayerFeedRateMinute=runtimeParameters.minimumLayerFeedRateMinute,
+        minimumPerimeterFeedRateMultiplier=runtimeParameters.minimumPerimeterFeedRateMultiplier,
+        minimumTravelFeedRateMultiplier=runtimeParameters.minimumTravelFeedRateMultiplier,
+        perimeterFeedRateMinute=runtimeParameters.perimeterFeedRateMinute,
+        perimeterFlowRate=runtimeParameters.perimeterFlowRate,
+        perimeterWidth=runtimeParameters.perimeterWidth,
+        speedActive=runtimeParameters.speedActive,
+        supportFeedRateMinute=runtimeParameters.supportFeedRateMinute,
+        travelFeedRateMinute=runtimeParameters.travelFeedRateMinute,
+        zDistanceRatio=5.0)
+    globalPathSettings[runtimeParameters] = pathSettings
+    globalLastPathSettings = (runtimeParameters, pathSettings)
+    return pathSettings
+
+def getPointCoordinates(points):
+    'Get the array of the interleaved x and y coordinates of the complex points.'
+    pointCoordinates = array('d')
+    for point in points:
+        pointCoordinates.append(point.real)
+        pointCoordinates.append(point.imag)
+    return pointCoordinates
+
 def resetExtrusionStats():
     global _previousPoint
     _previousPoint = None
 
-class Path:
-    ''' A Path the tool will follow within a nested ring.'''
+class PathPoints(object):
+    '''A view of the points of a path as a list of complex points, which are stored as the array of their coordinates.'''
+    __slots__ = ['pointCoordinates']
+
+    def __init__(self, pointCoordinates):
+        self.pointCoordinates = pointCoordinates
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __getitem__(self, index):
+        if index.__class__ == slice:
+            return list(self)[index]
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError('path point index out of range')
+        return complex(self.pointCoordinates[2 * index], self.pointCoordinates[2 * index + 1])
+
+    def __iter__(self):
+        return itertools.imap(complex, self.pointCoordinates[0 : : 2], self.pointCoordinates[1 : : 2])
+
+    def __len__(self):
+        return len(self.pointCoordinates) / 2
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def __setitem__(self, index, point):
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError('path point index out of range')
+        self.pointCoordinates[2 * index] = point.real
+        self.pointCoordinates[2 * index + 1] = point.imag
+
+    def append(self, point):
+        self.pointCoordinates.append(point.real)
+        self.pointCoordinates.append(point.imag)
+
+    def extend(self, points):
+        self.pointCoordinates.extend(getPointCoordinates(points))
+
+class Path(object):
+    ''' A Path the tool will follow within a nested ring.
+        Its points are stored as an array of their coordinates and its settings are shared with the other paths, so that
+        many paths take little memory.'''
+    __slots__ = ['gcodeCommands', 'pointCoordinates', 'settings', 'startPoint', 'type', 'z']
+
     def __init__(self, runtimeParameters, z=0):
 
         self.z = z
 
         self.type = None
         self.startPoint = None
-        self.points = []
+        self.pointCoordinates = array('d')
         self.gcodeCommands = []
 
-        self._setParameters(runtimeParameters)
-
-    def _setParameters(self, runtimeParameters):
-        self.decimalPlaces = runtimeParameters.decimalPlaces
-        self.dimensionDecimalPlaces = runtimeParameters.dimensionDecimalPlaces
-        self.speedActive = runtimeParameters.speedActive
-        self.bridgeFeedRateMinute = runtimeParameters.bridgeFeedRateMinute
-        self.perimeterFeedRateMinute = runtimeParameters.perimeterFeedRateMinute
-        self.extrusionFeedRateMinute = runtimeParameters.extrusionFeedRateMinute
-        self.travelFeedRateMinute = runtimeParameters.travelFeedRateMinute
-        self.extrusionUnitsRelative = runtimeParameters.extrusionUnitsRelative
-        self.supportFeedRateMinute = runtimeParameters.supportFeedRateMinute
-
-        self.dimensionActive = runtimeParameters.dimensionActive
-
-        self.zDistanceRatio = 5.0
-
-        self.layerThickness = runtimeParameters.layerThickness
-        self.perimeterWidth = runtimeParameters.perimeterWidth
-        self.absolutePositioning = config.getboolean('preface', 'positioning.absolute')
-        self.flowRate = runtimeParameters.flowRate
-        self.perimeterFlowRate = runtimeParameters.perimeterFlowRate
-        self.bridgeFlowRate = runtimeParameters.bridgeFlowRate
-        self.combActive = runtimeParameters.combActive
-
-        self.minimumBridgeFeedRateMultiplier = runtimeParameters.minimumBridgeFeedRateMultiplier
-        self.minimumPerimeterFeedRateMultiplier = runtimeParameters.minimumPerimeterFeedRateMultiplier
-        self.minimumExtrusionFeedRateMultiplier = runtimeParameters.minimumExtrusionFeedRateMultiplier
-        self.minimumTravelFeedRateMultiplier = runtimeParameters.minimumTravelFeedRateMultiplier
-        self.minimumLayerFeedRateMinute = runtimeParameters.minimumLayerFeedRateMinute
+        self.settings = getPathSettings(runtimeParameters)
+
+    def __getstate__(self):
+        '''Get the values of the slots, for pickling and copying.'''
+        state = {}
+        for pathClass in self.__class__.__mro__:
+            for slotName in pathClass.__dict__.get('__slots__', []):
+                if hasattr(self, slotName):
+                    state[slotName] = getattr(self, slotName)
+        return state
+
+    def __setstate__(self, state):
+        '''Set the values of the slots, from pickling and copying.'''
+        for slotName, value in state.iteritems():
+            setattr(self, slotName, value)
+
+    def getPoints(self):
+        return PathPoints(self.pointCoordinates)
+
+    def setPoints(self, points):
+        self.pointCoordinates = getPointCoordinates(points)
+
+    points = property(getPoints, setPoints)
 
     def __str__(self):
         '''Get the string representation.'''
@@ -93,18 +204,18 @@ class Path:
         return self.startPoint
 
     def getEndPoint(self):
-        if len(self.points) > 0:
-            return self.points[len(self.points) - 1]
+        if len(self.pointCoordinates) > 0:
+            return complex(self.pointCoordinates[-2], self.pointCoordinates[-1])
         else:
             return None
 
     def getFeedRateMinute(self):
         '''Allows subclasses to override the relevant feedrate method so we don't have to use large if statements.'''
-        return self.extrusionFeedRateMinute
+        return self.settings.extrusionFeedRateMinute
 
     def getFlowRate(self):
         '''Allows subclasses to override the relevant flowrate method so we don't have to use large if statements.'''
-        return self.flowRate
+        return self.settings.flowRate
 
     def generateGcode(self, extruder, height, lookaheadStartVector=None, feedAndFlowRateMultiplier=[1.0, 1.0], runtimeParameters=None):
         'Transforms paths and points to gcode'
@@ -112,40 +223,45 @@ class Path:
         self.gcodeCommands = []
 
         if runtimeParameters != None:
-            self._setParameters(runtimeParameters)
+            self.settings = getPathSettings(runtimeParameters)
+        settings = self.settings
 
         if _previousPoint == None:
             _previousPoint = self.startPoint
 
-        for point in self.points:
+        # The settings, feed rate and flow rate are the same for every point of the path.
+        decimalPlaces = settings.decimalPlaces
+        roundedZ = round(self.z + height, decimalPlaces)
+        pathFeedRateMinute = self.getFeedRateMinute()
+        flowRate = self.getFlowRate()
 
-            gcodeArgs = [('X', round(point.real, self.decimalPlaces)),
-                         ('Y', round(point.imag, self.decimalPlaces)),
-                         ('Z', round(self.z + height, self.decimalPlaces))]
+        (pathFeedRateMinute, pathFeedRateMultiplier) = self.getFeedRateAndMultiplier(pathFeedRateMinute, feedAndFlowRateMultiplier[0])
 
-            pathFeedRateMinute = self.getFeedRateMinute()
-            flowRate = self.getFlowRate()
+        for point in self.points:
 
-            (pathFeedRateMinute, pathFeedRateMultiplier) = self.getFeedRateAndMultiplier(pathFeedRateMinute, feedAndFlowRateMultiplier[0])
+            gcodeArgs = [('X', round(point.real, decimalPlaces)),
+                         ('Y', round(point.imag, decimalPlaces)),
+                         ('Z', roundedZ)]
 
-            if self.speedActive:
+            if settings.speedActive:
                 gcodeArgs.append(('F', pathFeedRateMinute))
 
-            if self.dimensionActive:
-                if self.absolutePositioning:
+            if settings.dimensionActive:
+                if settings.absolutePositioning:
                     distance = abs(point - _previousPoint)
                     _previousPoint = point
 
                 extrusionDistance = extruder.getExtrusionDistance(distance, flowRate * feedAndFlowRateMultiplier[1], pathFeedRateMinute)
-                gcodeArgs.append(('%s' % extruder.axisCode, '%s' % extrusionDistance))
+                gcodeArgs.append((extruder.axisCode, extrusionDistance))
 
             self.gcodeCommands.append(
                 GcodeCommand(gcodes.LINEAR_GCODE_MOVEMENT, gcodeArgs))
 
     def getFeedRateAndMultiplier(self, feedRateMinute, feedRateMultiplier):
         'Returns the multiplier that results in either the minimum feed rate or the slowed down feed rate'
-        if (feedRateMultiplier * feedRateMinute) < self.minimumLayerFeedRateMinute:
-            return (self.minimumLayerFeedRateMinute, self.minimumLayerFeedRateMinute / feedRateMinute)
+        minimumLayerFeedRateMinute = self.settings.minimumLayerFeedRateMinute
+        if (feedRateMultiplier * feedRateMinute) < minimumLayerFeedRateMinute:
+            return (minimumLayerFeedRateMinute, minimumLayerFeedRateMinute / feedRateMinute)
         else:
             return (feedRateMinute * feedRateMultiplier, feedRateMultiplier)
 
@@ -153,8 +269,9 @@ class Path:
     def offset(self, offset):
         if self.startPoint != None:
             self.startPoint = complex(self.startPoint.real + offset.real, self.startPoint.imag + offset.imag)
-        for (index, point) in enumerate(self.points):
-            self.points[index] = complex(point.real + offset.real, point.imag + offset.imag)
+        for index in xrange(0, len(self.pointCoordinates), 2):
+            self.pointCoordinates[index] += offset.real
+            self.pointCoordinates[index + 1] += offset.imag
 
     def addPath(self, path):
         'Add a path to the output.'
@@ -167,22 +284,29 @@ class Path:
             logger.warning('Path of only one point: %s, this should never happen.', path)
 
 class Loop(Path):
+    __slots__ = []
+
     def __init__(self, runtimeParameters, z=0):
         Path.__init__(self, runtimeParameters, z)
 
 class InfillPath(Path):
+    __slots__ = []
+
     def __init__(self, runtimeParameters, z=0):
         Path.__init__(self, runtimeParameters, z)
 
 class SupportPath(Path):
+    __slots__ = []
+
     def __init__(self, runtimeParameters, z=0):
         Path.__init__(self, runtimeParameters, z)
 
     def getFeedRateMinute(self):
-        return self.supportFeedRateMinute
+        return self.settings.supportFeedRateMinute
 
 class TravelPath(Path):
     '''Moves from one path to another without extruding. Optionally dodges gaps (comb) and retracts (dimension)'''
+    __slots__ = ['combSkein', 'fromLocation', 'toLocation']
 
     def __init__(self, runtimeParameters, fromLocation, toLocation, combSkein, z=0):
         Path.__init__(self, runtimeParameters, z)
@@ -217,8 +341,9 @@ class TravelPath(Path):
         '''
         startPointPath = []
         global _previousPoint
+        settings = self.settings
 
-        if self.combActive and self.fromLocation != None and self.combSkein != None:
+        if settings.combActive and self.fromLocation != None and self.combSkein != None:
 
             additionalCommands = self.combSkein.getPathsBetween(self.z + height, self.fromLocation.dropAxis(), self.toLocation.dropAxis())
             startPointPath.extend(additionalCommands)
@@ -226,15 +351,15 @@ class TravelPath(Path):
         startPointPath.append(self.toLocation.dropAxis())
 
         for point in startPointPath:
-            gcodeArgs = [('X', round(point.real, self.decimalPlaces)),
-                ('Y', round(point.imag, self.decimalPlaces)),
-                ('Z', round(self.z + height, self.decimalPlaces))]
+            gcodeArgs = [('X', round(point.real, settings.decimalPlaces)),
+                ('Y', round(point.imag, settings.decimalPlaces)),
+                ('Z', round(self.z + height, settings.decimalPlaces))]
 
-            if self.speedActive:
-                travelFeedRateMinute, travelFeedRateMultiplier = self.getFeedRateAndMultiplier(self.travelFeedRateMinute, feedAndFlowRateMultiplier)
-                gcodeArgs.append(('F', self.travelFeedRateMinute * travelFeedRateMultiplier))
+            if settings.speedActive:
+                travelFeedRateMinute, travelFeedRateMultiplier = self.getFeedRateAndMultiplier(settings.travelFeedRateMinute, feedAndFlowRateMultiplier)
+                gcodeArgs.append(('F', settings.travelFeedRateMinute * travelFeedRateMultiplier))
 
-            if self.absolutePositioning:
+            if settings.absolutePositioning:
                 _previousPoint = point
             else:
                 _previousPoint += point
@@ -246,19 +371,19 @@ class TravelPath(Path):
         global _previousPoint
 
         if runtimeParameters != None:
-            self._setParameters(runtimeParameters)
+            self.settings = getPathSettings(runtimeParameters)
 
         if _previousPoint == None:
             _previousPoint = self.startPoint
 
-        if self.dimensionActive:
+        if self.settings.dimensionActive:
 
             if self.fromLocation != None:
 
                 locationMinusOld = self.toLocation - self.fromLocation
                 xyTravel = abs(locationMinusOld.dropAxis())
-                zTravelMultiplied = locationMinusOld.z * self.zDistanceRatio
-                timeToNextThread = math.sqrt(xyTravel * xyTravel + zTravelMultiplied * zTravelMultiplied) / self.extrusionFeedRateMinute * 60
+                zTravelMultiplied = locationMinusOld.z * self.settings.zDistanceRatio
+                timeToNextThread = math.sqrt(xyTravel * xyTravel + zTravelMultiplied * zTravelMultiplied) / self.settings.extrusionFeedRateMinute * 60
             else:
                 timeToNextThread = 0.0
 
@@ -269,7 +394,7 @@ class TravelPath(Path):
 
         self.moveToStartPoint(height, feedAndFlowRateMultiplier[0])
 
-        if self.dimensionActive:
+        if self.settings.dimensionActive:
             #_previousPoint = self.startPoint
             self.gcodeCommands.extend(pathExtruder.getRetractReverseCommands())
 
@@ -277,9 +402,10 @@ class TravelPath(Path):
 
 
     def getFeedRateMinute(self):
-        return self.travelFeedRateMinute
+        return self.settings.travelFeedRateMinute
 
 class BoundaryPerimeter(Path):
+    __slots__ = ['boundaryPoints']
 
     def __init__(self, runtimeParameters, z=0):
         Path.__init__(self, runtimeParameters, z)
@@ -299,7 +425,7 @@ class BoundaryPerimeter(Path):
         Path.offset(self, offset)
 
     def getFeedRateMinute(self):
-        return self.perimeterFeedRateMinute
+        return self.settings.perimeterFeedRateMinute
 
     def getFlowRate(self):
-        return self.perimeterFlowRate
+        return self.settings.perimeterFlowRate
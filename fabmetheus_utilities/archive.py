@@ -116,11 +116,11 @@ def getFilePathWithUnderscoredBasename(fileName, suffix):
     suffixReplacedBaseName = os.path.basename(suffixFileName).replace(' ', '_')
     return os.path.join(suffixDirectoryName, suffixReplacedBaseName)
 
-def getFileText(fileName, printWarning=True, readMode='r'):
-    'Get the entire text of a file.'
+def getFileText(fileName, printWarning=True, readMode='r', size=-1):
+    'Get the entire text of a file, or only its beginning if a size is given.'
     try:
         file = open(fileName, readMode)
-        fileText = file.read()
+        fileText = file.read(size)
         file.close()
         return fileText
     except IOError:
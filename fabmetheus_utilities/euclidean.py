@@ -22,8 +22,10 @@ Below are examples of euclidean use.
 """
 
 from fabmetheus_utilities.vector3 import Vector3
+from fabmetheus_utilities import pixel_grid
 from fabmetheus_utilities import xml_simple_writer
 import StringIO
+import heapq
 import math
 import random
 
@@ -166,6 +168,11 @@ def addSegmentToPixelTable(beginComplex, endComplex, pixelDictionary, shortenDis
     xBegin = int(round(beginComplex.real))
     xEnd = int(round(endComplex.real))
     yIntersection = beginComplex.imag - beginComplex.real * gradient
+    if isinstance(pixelDictionary, pixel_grid.PixelGrid):
+        yBegin = int(round(beginComplex.imag))
+        yEnd = int(round(endComplex.imag))
+        pixelDictionary.addRasterizedSegment(isSteep, xBegin, yBegin, xEnd, yEnd, yIntersection, gradient, None)
+        return
     if isSteep:
         pixelDictionary[( int( round( beginComplex.imag ) ), xBegin)] = None
         pixelDictionary[( int( round( endComplex.imag ) ), xEnd )] = None
@@ -246,6 +253,11 @@ def addValueSegmentToPixelTable(beginComplex, endComplex, pixelDictionary, value
     xBegin = int(round(beginComplex.real))
     xEnd = int(round(endComplex.real))
     yIntersection = beginComplex.imag - beginComplex.real * gradient
+    if isinstance(pixelDictionary, pixel_grid.PixelGrid):
+        yBegin = int(round(beginComplex.imag))
+        yEnd = int(round(endComplex.imag))
+        pixelDictionary.addRasterizedSegment(isSteep, xBegin, yBegin, xEnd, yEnd, yIntersection, gradient, value)
+        return
     if isSteep:
         pixelDictionary[(int( round( beginComplex.imag ) ), xBegin)] = value
         pixelDictionary[(int( round( endComplex.imag ) ), xEnd)] = value
@@ -1430,6 +1442,8 @@ def getPathsFromEndpoints(endpoints, maximumConnectionLength, pixelDictionary, w
     endpointTable = {}
     for endpoint in endpoints:
         addElementToPixelListFromPoint(endpoint, endpointTable, endpoint.point * oneOverEndpointWidth)
+    # The tree of the remaining endpoints is only built when an endpoint beyond the neighboring cells is first needed.
+    endpointTree = None
     while len(endpointTable) > 0:
         if len(endpointTable) == 1:
             if len(endpointTable.values()[0]) < 2:
@@ -1439,23 +1453,17 @@ def getPathsFromEndpoints(endpoints, maximumConnectionLength, pixelDictionary, w
         if nextEndpoint == None:
             path = []
             paths.append(path)
-            endpoints = getListTableElements(endpointTable)
-            nextEndpoint = otherEndpoint.getNearestEndpoint(endpoints)
-# this commented code should be faster than the getListTableElements code, but it isn't, someday a spiral algorithim could be tried
-#                       endpoints = getSquareValuesFromPoint( endpointTable, otherEndpoint.point * oneOverEndpointWidth )
-#                       nextEndpoint = otherEndpoint.getNearestEndpoint(endpoints)
-#                       if nextEndpoint == None:
-#                               endpoints = []
-#                               for endpointTableValue in endpointTable.values():
-#                                       endpoints.append( endpointTableValue[0] )
-#                               nextEndpoint = otherEndpoint.getNearestEndpoint(endpoints)
-#                               endpoints = getSquareValuesFromPoint( endpointTable, nextEndpoint.point * oneOverEndpointWidth )
-#                               nextEndpoint = otherEndpoint.getNearestEndpoint(endpoints)
+            if endpointTree == None:
+                endpointTree = EndpointTree(getListTableElements(endpointTable))
+            nextEndpoint = endpointTree.getNearestEndpoint(otherEndpoint.point)
         addPointToPath(path, pixelDictionary, nextEndpoint.point, len(paths) - 1, width)
         removeElementFromPixelListFromPoint(nextEndpoint, endpointTable, nextEndpoint.point * oneOverEndpointWidth)
         otherEndpoint = nextEndpoint.otherEndpoint
         addPointToPath(path, pixelDictionary, otherEndpoint.point, len(paths) - 1, width)
         removeElementFromPixelListFromPoint(otherEndpoint, endpointTable, otherEndpoint.point * oneOverEndpointWidth)
+        if endpointTree != None:
+            endpointTree.removeEndpoint(nextEndpoint)
+            endpointTree.removeEndpoint(otherEndpoint)
     return paths
 
 def getPlaneDot(vec3First, vec3Second):
@@ -1922,6 +1930,57 @@ def getClosestEnclosingLoop(loops, path):
 
     return enclosingLoop[1]
 
+def getClosestEnclosingLoopIndexes(loops):
+    'Get the index of the closest loop within which each loop is entirely contained, or None, as getClosestEnclosingLoop gets for each loop among the others.'
+    enclosingLoopIndexes = [None] * len(loops)
+    absAreas = [abs(getAreaLoop(loop)) for loop in loops]
+    boundingBoxes = []
+    for loop in loops:
+        if len(loop) < 1:
+            boundingBoxes.append(None)
+            continue
+        xs = [point.real for point in loop]
+        ys = [point.imag for point in loop]
+        boundingBoxes.append((min(xs), min(ys), max(xs), max(ys)))
+    # A point is inside a loop only if it is inside the bounding box of the loop, widened by the margin for the rounding of the intersections.
+    margins = [None] * len(loops)
+    for loopIndex, boundingBox in enumerate(boundingBoxes):
+        if boundingBox != None:
+            margins[loopIndex] = 1.0e-9 * (1.0 + max([abs(coordinate) for coordinate in boundingBox]))
+    loopIndexes = [loopIndex for loopIndex in xrange(len(loops)) if boundingBoxes[loopIndex] != None]
+    # The loops are swept from left to right, and the loops whose boxes span the left of a loop are the only ones which can enclose it.
+    beginIndexes = sorted(loopIndexes, key=lambda loopIndex: boundingBoxes[loopIndex][0] - margins[loopIndex])
+    activeLoops = []
+    beginIndex = 0
+    for loopIndex in sorted(loopIndexes, key=lambda loopIndex: boundingBoxes[loopIndex][0]):
+        xMinimum, yMinimum, xMaximum, yMaximum = boundingBoxes[loopIndex]
+        while beginIndex < len(beginIndexes) and boundingBoxes[beginIndexes[beginIndex]][0] - margins[beginIndexes[beginIndex]] <= xMinimum:
+            otherIndex = beginIndexes[beginIndex]
+            heapq.heappush(activeLoops, (boundingBoxes[otherIndex][2] + margins[otherIndex], otherIndex))
+            beginIndex += 1
+        while len(activeLoops) > 0 and activeLoops[0][0] < xMinimum:
+            heapq.heappop(activeLoops)
+        candidates = []
+        for otherXMaximum, otherIndex in activeLoops:
+            otherBoundingBox = boundingBoxes[otherIndex]
+            margin = margins[otherIndex]
+            if otherIndex != loopIndex and xMaximum <= otherXMaximum and yMinimum >= otherBoundingBox[1] - margin and yMaximum <= otherBoundingBox[3] + margin:
+                candidates.append((absAreas[otherIndex], otherIndex))
+        enclosingLoopIndexes[loopIndex] = getFirstEnclosingLoopIndex(candidates, loops, loops[loopIndex])
+    for loopIndex in xrange(len(loops)):
+        if boundingBoxes[loopIndex] == None:
+            candidates = [(absAreas[otherIndex], otherIndex) for otherIndex in xrange(len(loops)) if otherIndex != loopIndex]
+            enclosingLoopIndexes[loopIndex] = getFirstEnclosingLoopIndex(candidates, loops, loops[loopIndex])
+    return enclosingLoopIndexes
+
+def getFirstEnclosingLoopIndex(candidates, loops, path):
+    'Get the index of the loop of the smallest (area, index) candidate within which the path is entirely contained, or None.'
+    candidates.sort()
+    for absArea, loopIndex in candidates:
+        if isPathEntirelyInsideLoop(loops[loopIndex], path):
+            return loopIndex
+    return None
+
 def isPathInsideLoop(loop, path):
     'Determine if a path is inside another loop.'
     return isPointInsideLoop(loop, getLeftPoint(path))
@@ -1934,7 +1993,9 @@ def isPathInsideLoops(loops, path):
     return False
 
 def isPixelTableIntersecting(bigTable, littleTable, maskTable={}):
-    'Add path to the pixel table.'
+    'Determine if a pixel of the little table which is not in the mask table is in the big table.'
+    if isinstance(bigTable, pixel_grid.PixelGrid):
+        return bigTable.isIntersecting(littleTable, maskTable)
     littleTableKeys = littleTable.keys()
     for littleTableKey in littleTableKeys:
         if littleTableKey not in maskTable:
@@ -2074,6 +2135,9 @@ def removePrefixFromDictionary(dictionary, prefix):
 
 def removePixelTableFromPixelTable(pixelDictionaryToBeRemoved, pixelDictionaryToBeRemovedFrom):
     'Remove pixel from the pixel table.'
+    if isinstance(pixelDictionaryToBeRemovedFrom, pixel_grid.PixelGrid):
+        pixelDictionaryToBeRemovedFrom.removeKeys(pixelDictionaryToBeRemoved.keys())
+        return
     removeElementsFromDictionary(pixelDictionaryToBeRemovedFrom, pixelDictionaryToBeRemoved.keys())
 
 def removeTrueFromDictionary(dictionary, key):
@@ -2294,6 +2358,88 @@ class Endpoint:
         return None
 
 
+class EndpointTree:
+    'A balanced k-d tree of endpoints, which gets the nearest remaining endpoint to a point and from which endpoints can be removed.'
+    def __init__(self, endpoints):
+        'Build the tree, with the median endpoint along the alternating axis of each node.'
+        numberOfNodes = 1
+        while numberOfNodes <= len(endpoints):
+            numberOfNodes += numberOfNodes
+        self.endpoints = [None] * numberOfNodes
+        self.nodeTable = {}
+        self.numbersRemaining = [0] * numberOfNodes
+        self.splits = [0.0] * numberOfNodes
+        nodesToBuild = [(0, 0, endpoints[:])]
+        while len(nodesToBuild) > 0:
+            node, depth, nodeEndpoints = nodesToBuild.pop()
+            if len(nodeEndpoints) < 1:
+                continue
+            if depth % 2 == 0:
+                nodeEndpoints.sort(key=lambda endpoint: endpoint.point.real)
+            else:
+                nodeEndpoints.sort(key=lambda endpoint: endpoint.point.imag)
+            middleIndex = len(nodeEndpoints) / 2
+            endpoint = nodeEndpoints[middleIndex]
+            self.endpoints[node] = endpoint
+            self.nodeTable[endpoint] = node
+            self.numbersRemaining[node] = len(nodeEndpoints)
+            self.splits[node] = self.getAxisValue(depth, endpoint.point)
+            nodesToBuild.append((node + node + 1, depth + 1, nodeEndpoints[: middleIndex]))
+            nodesToBuild.append((node + node + 2, depth + 1, nodeEndpoints[middleIndex + 1 :]))
+
+    def __len__(self):
+        'Get the number of remaining endpoints.'
+        return self.numbersRemaining[0]
+
+    def __repr__(self):
+        'Get the string representation of this EndpointTree.'
+        return 'EndpointTree %s' % len(self)
+
+    def addNearestEndpoint(self, depth, nearest, node, point):
+        'Replace the nearest endpoint and distance with a nearer remaining endpoint of the node and its children.'
+        if node >= len(self.numbersRemaining) or self.numbersRemaining[node] < 1:
+            return
+        endpoint = self.endpoints[node]
+        if endpoint != None:
+            distance = abs(point - endpoint.point)
+            if distance < nearest[1]:
+                nearest[0] = endpoint
+                nearest[1] = distance
+        splitDistance = self.getAxisValue(depth, point) - self.splits[node]
+        if splitDistance < 0.0:
+            self.addNearestEndpoint(depth + 1, nearest, node + node + 1, point)
+            if -splitDistance < nearest[1]:
+                self.addNearestEndpoint(depth + 1, nearest, node + node + 2, point)
+        else:
+            self.addNearestEndpoint(depth + 1, nearest, node + node + 2, point)
+            if splitDistance < nearest[1]:
+                self.addNearestEndpoint(depth + 1, nearest, node + node + 1, point)
+
+    def getAxisValue(self, depth, point):
+        'Get the coordinate of the point along the axis of the depth.'
+        if depth % 2 == 0:
+            return point.real
+        return point.imag
+
+    def getNearestEndpoint(self, point):
+        'Get the nearest remaining endpoint to the point, or None if there are none.'
+        nearest = [None, 987654321987654321.0]
+        self.addNearestEndpoint(0, nearest, 0, point)
+        return nearest[0]
+
+    def removeEndpoint(self, endpoint):
+        'Remove the endpoint if it remains in the tree.'
+        node = self.nodeTable.get(endpoint)
+        if node == None or self.endpoints[node] == None:
+            return
+        self.endpoints[node] = None
+        while True:
+            self.numbersRemaining[node] -= 1
+            if node < 1:
+                return
+            node = (node - 1) / 2
+
+
 class LoopLayer:
     'Loops with a z.'
     def __init__(self, z):
@@ -18,7 +18,12 @@ from fabmetheus_utilities.geometry.geometry_tools import face
 from fabmetheus_utilities.geometry.solids import triangle_mesh
 from fabmetheus_utilities.vector3 import Vector3
 from fabmetheus_utilities import archive
+from array import array
 from struct import unpack
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 __author__ = 'Enrique Perez (perez_enrique@yahoo.com)'
 __credits__ = 'Nophead <http://hydraraptor.blogspot.com/>\nArt of Illusion <http://www.artofillusion.org/>'
@@ -26,60 +31,95 @@ __date__ = '$Date: 2008/21/04 $'
 __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
 
 
+# The number of bytes at the beginning of the file which are checked to see if the stl is text.
+globalTextSampleLength = 16384
+
+if numpy != None:
+    # A binary stl facet record is 50 bytes: normal, three vertexes and the attribute byte count.
+    globalBinaryFacetType = numpy.dtype([('normal', '<f4', (3,)), ('vertexes', '<f4', (3, 3)), ('attribute', '<u2')])
+
+def addFaceGivenCoordinates( triangleMesh, vertexIndexTable, coordinates ):
+    "Add a face given the nine coordinates of its vertexes, only making a Vector3 for each unique vertex."
+    faceGivenCoordinates = face.Face()
+    faceGivenCoordinates.index = len( triangleMesh.faces )
+    for coordinateIndex in xrange( 0, 9, 3 ):
+        weldKey = coordinates[ coordinateIndex : coordinateIndex + 3 ]
+        vertexUniqueIndex = vertexIndexTable.get( weldKey )
+        if vertexUniqueIndex == None:
+            vertexUniqueIndex = len( vertexIndexTable )
+            vertexIndexTable[ weldKey ] = vertexUniqueIndex
+            triangleMesh.vertexes.append( Vector3( weldKey[0], weldKey[1], weldKey[2] ) )
+        faceGivenCoordinates.vertexIndexes.append( vertexUniqueIndex )
+    triangleMesh.faces.append( faceGivenCoordinates )
+
 def addFacesGivenBinary( stlData, triangleMesh, vertexIndexTable ):
     "Add faces given stl binary."
-    numberOfVertexes = ( len( stlData ) - 84 ) / 50
-    vertexes = []
-    for vertexIndex in xrange( numberOfVertexes ):
-        byteIndex = 84 + vertexIndex * 50
-        vertexes.append( getVertexGivenBinary( byteIndex + 12, stlData ) )
-        vertexes.append( getVertexGivenBinary( byteIndex + 24, stlData ) )
-        vertexes.append( getVertexGivenBinary( byteIndex + 36, stlData ) )
-    addFacesGivenVertexes( triangleMesh, vertexIndexTable, vertexes )
+    if numpy != None:
+        addFacesGivenVertexArray( triangleMesh, getVertexArrayGivenBinary(stlData) )
+        return
+    numberOfFacets = ( len( stlData ) - 84 ) / 50
+    for facetIndex in xrange( numberOfFacets ):
+        byteIndex = 84 + facetIndex * 50
+        addFaceGivenCoordinates( triangleMesh, vertexIndexTable, unpack('<9f', stlData[ byteIndex + 12 : byteIndex + 48 ] ) )
 
 def addFacesGivenText( stlText, triangleMesh, vertexIndexTable ):
     "Add faces given stl text."
-    lines = archive.getTextLines( stlText )
-    vertexes = []
-    for line in lines:
-        if line.find('vertex') != - 1:
-            vertexes.append( getVertexGivenLine(line) )
-    addFacesGivenVertexes( triangleMesh, vertexIndexTable, vertexes )
-
-def addFacesGivenVertexes( triangleMesh, vertexIndexTable, vertexes ):
-    "Add faces given stl text."
-    for vertexIndex in xrange( 0, len(vertexes), 3 ):
-        faceGivenLines = face.Face()
-        faceGivenLines.index = len( triangleMesh.faces )
-        for i in xrange( vertexIndex, vertexIndex + 3 ):
-            vertex = vertexes[i]
-            vertexUniqueIndex = len( vertexIndexTable )
-            if str(vertex) in vertexIndexTable:
-                vertexUniqueIndex = vertexIndexTable[ str(vertex) ]
-            else:
-                vertexIndexTable[ str(vertex) ] = vertexUniqueIndex
-                triangleMesh.vertexes.append(vertex)
-            faceGivenLines.vertexIndexes.append( vertexUniqueIndex )
-        triangleMesh.faces.append( faceGivenLines )
+    addFacesGivenTextLines( archive.getTextLines( stlText ), triangleMesh, vertexIndexTable )
+
+def addFacesGivenTextLines( lines, triangleMesh, vertexIndexTable ):
+    "Add faces given stl text lines, which may be an open file so the text is never held in memory as a whole."
+    if numpy != None:
+        coordinates = array('d')
+        for facetCoordinates in getFacetCoordinatesGivenTextLines(lines):
+            coordinates.extend( facetCoordinates )
+        if len( coordinates ) > 0:
+            addFacesGivenVertexArray( triangleMesh, numpy.frombuffer( coordinates, dtype = float ).reshape( -1, 3 ) )
+        return
+    for facetCoordinates in getFacetCoordinatesGivenTextLines(lines):
+        addFaceGivenCoordinates( triangleMesh, vertexIndexTable, facetCoordinates )
+
+def addFacesGivenVertexArray( triangleMesh, vertexArray ):
+    "Add faces given an array of the facet vertex coordinates, only making a Vector3 for each unique vertex."
+    if len( vertexArray ) < 1:
+        return
+    firstIndexes, uniqueIndexes = triangle_mesh.getUniqueVertexIndexesByArray( vertexArray )
+    for x, y, z in vertexArray[ firstIndexes ].astype( float ).tolist():
+        triangleMesh.vertexes.append( Vector3( x, y, z ) )
+    for vertexIndexes in uniqueIndexes.reshape( -1, 3 ).tolist():
+        faceGivenArray = face.Face()
+        faceGivenArray.index = len( triangleMesh.faces )
+        faceGivenArray.vertexIndexes = vertexIndexes
+        triangleMesh.faces.append( faceGivenArray )
 
 def getCarving(fileName=''):
     "Get the triangle mesh for the stl file."
     if fileName == '':
         return None
-    stlData = archive.getFileText(fileName, True, 'rb')
-    if stlData == '':
+    stlSample = archive.getFileText(fileName, True, 'rb', globalTextSampleLength)
+    if stlSample == '':
         return None
     triangleMesh = triangle_mesh.TriangleMesh()
     vertexIndexTable = {}
-    numberOfVertexStrings = stlData.count('vertex')
-    requiredVertexStringsForText = max( 2, len( stlData ) / 8000 )
-    if numberOfVertexStrings > requiredVertexStringsForText:
-        addFacesGivenText( stlData, triangleMesh, vertexIndexTable )
+    if isText(stlSample):
+        stlFile = open(fileName, 'rU')
+        addFacesGivenTextLines( stlFile, triangleMesh, vertexIndexTable )
+        stlFile.close()
     else:
 #       A binary stl should never start with the word "solid".  Because this error is common the file is been parsed as binary regardless.
-        addFacesGivenBinary( stlData, triangleMesh, vertexIndexTable )
+        addFacesGivenBinary( archive.getFileText(fileName, True, 'rb'), triangleMesh, vertexIndexTable )
     return triangleMesh
 
+def getFacetCoordinatesGivenTextLines(lines):
+    "Get a generator of the nine vertex coordinates of each facet in the stl text lines."
+    coordinates = []
+    for line in lines:
+        if line.find('vertex') != - 1:
+            splitLine = line.split()
+            coordinates += [ getFloat( splitLine[1] ), getFloat( splitLine[2] ), getFloat( splitLine[3] ) ]
+            if len( coordinates ) == 9:
+                yield tuple( coordinates )
+                coordinates = []
+
 def getFloat(floatString):
     "Get the float, replacing commas if necessary because an inferior program is using a comma instead of a point for the decimal point."
     try:
@@ -91,6 +131,14 @@ def getFloatGivenBinary( byteIndex, stlData ):
     "Get vertex given stl vertex line."
     return unpack('f', stlData[ byteIndex : byteIndex + 4 ] )[0]
 
+def getVertexArrayGivenBinary(stlData):
+    "Get the array of the facet vertex coordinates in stl binary by reading all the records in a single numpy call."
+    numberOfFacets = ( len( stlData ) - 84 ) / 50
+    if numberOfFacets < 1:
+        return numpy.zeros( ( 0, 3 ), dtype = numpy.float32 )
+    facets = numpy.frombuffer( stlData, dtype = globalBinaryFacetType, count = numberOfFacets, offset = 84 )
+    return facets['vertexes'].reshape( -1, 3 )
+
 def getVertexGivenBinary( byteIndex, stlData ):
     "Get vertex given stl vertex line."
     x = unpack('f', stlData[ byteIndex : byteIndex + 4 ] )[0]
@@ -102,3 +150,9 @@ def getVertexGivenLine(line):
     "Get vertex given stl vertex line."
     splitLine = line.split()
     return Vector3( getFloat(splitLine[1]), getFloat( splitLine[2] ), getFloat( splitLine[3] ) )
+
+def isText(stlSample):
+    "Determine if the stl is text from a sample of the beginning of the file, rather than from a scan of the whole file."
+    numberOfVertexStrings = stlSample.count('vertex')
+    requiredVertexStringsForText = max( 2, len( stlSample ) / 8000 )
+    return numberOfVertexStrings > requiredVertexStringsForText
@@ -98,6 +98,10 @@ class SVGCarving:
         'Set the layer thickness.'
         self.layerThickness = layerThickness
 
+    def setCarveProcesses(self, carveProcesses):
+        'Set the number of processes which carve the layers.'
+        pass
+
     def setCarveImportRadius(self, importRadius):
         'Set the import radius.'
         pass
@@ -105,3 +109,7 @@ class SVGCarving:
     def setCarveIsCorrectMesh(self, isCorrectMesh):
         'Set the is correct mesh flag.'
         pass
+
+    def setCarveWeldTolerance(self, weldTolerance):
+        'Set the weld tolerance.'
+        pass
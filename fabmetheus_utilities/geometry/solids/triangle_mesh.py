@@ -13,8 +13,14 @@ from fabmetheus_utilities.vector3 import Vector3
 from fabmetheus_utilities.vector3index import Vector3Index
 from fabmetheus_utilities import euclidean
 from fabmetheus_utilities import intercircle
+from fabmetheus_utilities import segment_index
+from multiprocessing import Pool
 import cmath
 import math
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 __author__ = 'Enrique Perez (perez_enrique@yahoo.com)'
@@ -23,6 +29,9 @@ __date__ = '$Date: 2008/02/05 $'
 __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
 
 
+# The triangle mesh carved by the workers of a multiprocess carve, set once when each worker starts.
+globalCarvingMesh = None
+
 def addEdgePair( edgePairTable, edges, faceEdgeIndex, remainingEdgeIndex, remainingEdgeTable ):
     'Add edge pair to the edge pair table.'
     if faceEdgeIndex == remainingEdgeIndex:
@@ -405,9 +414,10 @@ def getIsPathEntirelyOutsideTriangle(begin, center, end, vector3Path):
             return False
     return True
 
-def getLoopsFromCorrectMesh( edges, faces, vertexes, z ):
+def getLoopsFromCorrectMesh( edges, faces, vertexes, z, remainingEdgeTable=None ):
     'Get loops from a carve of a correct mesh.'
-    remainingEdgeTable = getRemainingEdgeTable(edges, vertexes, z)
+    if remainingEdgeTable == None:
+        remainingEdgeTable = getRemainingEdgeTable(edges, vertexes, z)
     remainingValues = remainingEdgeTable.values()
     for edge in remainingValues:
         if len( edge.faceIndexes ) < 2:
@@ -420,7 +430,7 @@ def getLoopsFromCorrectMesh( edges, faces, vertexes, z ):
     loops = []
     while isPathAdded( edges, faces, loops, remainingEdgeTable, vertexes, z ):
         pass
-    if euclidean.isLoopListIntersecting(loops):
+    if segment_index.isLoopListIntersecting(loops):
         print('Warning, the triangle mesh slice intersects itself in getLoopsFromCorrectMesh in triangle_mesh.')
         print('Something will still be printed, but there is no guarantee that it will be the correct shape.')
         print('Once the gcode is saved, you should check over the layer with a z of:')
@@ -440,11 +450,12 @@ def getLoopsFromCorrectMesh( edges, faces, vertexes, z ):
 #               remainingLoops.append( untouchable.loop )
 #       return remainingLoops
 
-def getLoopsFromUnprovenMesh(edges, faces, importRadius, vertexes, z):
+def getLoopsFromUnprovenMesh(edges, faces, importRadius, vertexes, z, remainingEdgeTable=None):
     'Get loops from a carve of an unproven mesh.'
     edgePairTable = {}
     corners = []
-    remainingEdgeTable = getRemainingEdgeTable(edges, vertexes, z)
+    if remainingEdgeTable == None:
+        remainingEdgeTable = getRemainingEdgeTable(edges, vertexes, z)
     remainingEdgeTableKeys = remainingEdgeTable.keys()
     for remainingEdgeIndexKey in remainingEdgeTable:
         edge = remainingEdgeTable[remainingEdgeIndexKey]
@@ -572,6 +583,11 @@ def getRemainingLoopAddFace(faces, remainingLoop):
     print(remainingLoop)
     return []
 
+def getRotatedLoopLayersByZs(belowZZs):
+    'Get the rotated loop layers at the zs of a range of layers, in a worker of a multiprocess carve.'
+    belowZ, zs = belowZZs
+    return globalCarvingMesh.getRotatedLoopLayersByZs(belowZ, zs)
+
 def getSharedFace( firstEdge, faces, secondEdge ):
     'Get the face which is shared by two edges.'
     for firstEdgeFaceIndex in firstEdge.faceIndexes:
@@ -624,6 +640,25 @@ def getUniqueVertexes(loops):
                 uniqueVertexes.append(loop[vertexIndex])
     return uniqueVertexes
 
+def getUniqueVertexIndexesByArray(vertexArray, weldTolerance=0.0):
+    'Get the first index of every unique vertex, in order of appearance, and the unique index of every vertex by a sort based unique over the packed coordinates.'
+    vertexArray = numpy.asarray(vertexArray, dtype=float).reshape(-1, 3) + 0.0
+    if weldTolerance > 0.0:
+        vertexArray = numpy.floor(vertexArray / weldTolerance + 0.5).astype(numpy.int64)
+    vertexArray = numpy.ascontiguousarray(vertexArray)
+    packedVertexes = vertexArray.view(numpy.dtype((numpy.void, 3 * vertexArray.dtype.itemsize))).ravel()
+    sortedUniques, sortedFirstIndexes, inverseIndexes = numpy.unique(packedVertexes, return_index=True, return_inverse=True)
+    appearanceOrder = numpy.argsort(sortedFirstIndexes)
+    uniqueIndexes = numpy.empty(len(appearanceOrder), dtype=numpy.int64)
+    uniqueIndexes[appearanceOrder] = numpy.arange(len(appearanceOrder))
+    return sortedFirstIndexes[appearanceOrder], uniqueIndexes[inverseIndexes]
+
+def getWeldKey(vertex, weldTolerance=0.0):
+    'Get the key by which vertexes are welded, the coordinates themselves or the coordinates quantized by the weld tolerance.'
+    if weldTolerance > 0.0:
+        return (math.floor(vertex.x / weldTolerance + 0.5), math.floor(vertex.y / weldTolerance + 0.5), math.floor(vertex.z / weldTolerance + 0.5))
+    return (vertex.x, vertex.y, vertex.z)
+
 def getWideAnglePointIndex(loop):
     'Get a point index which has a wide enough angle, most point indexes have a wide enough angle, this is just to make sure.'
     dotProductMinimum = 9999999.9
@@ -691,6 +726,11 @@ def processXMLElement(xmlElement):
     'Process the xml element.'
     evaluate.processArchivable(TriangleMesh, xmlElement)
 
+def setCarvingMesh(triangleMesh):
+    'Set the triangle mesh carved by this worker of a multiprocess carve.'
+    global globalCarvingMesh
+    globalCarvingMesh = triangleMesh
+
 def setEdgeMaximumMinimum(edge, vertexes):
     'Set the edge maximum and minimum.'
     beginIndex = edge.vertexIndexes[0]
@@ -711,6 +751,83 @@ def sortLoopsInOrderOfArea(isDescending, loops):
     loops.sort(key=euclidean.getAreaLoopAbsolute, reverse=isDescending)
 
 
+def weldVertexes(triangleMesh, weldTolerance):
+    'Weld the vertexes which quantize to the same weld tolerance cell, and remove the faces which collapse.'
+    vertexes = triangleMesh.vertexes
+    if numpy != None:
+        vertexArray = [(vertex.x, vertex.y, vertex.z) for vertex in vertexes]
+        firstIndexes, uniqueIndexes = getUniqueVertexIndexesByArray(vertexArray, weldTolerance)
+        weldedVertexes = [vertexes[firstIndex] for firstIndex in firstIndexes.tolist()]
+        uniqueIndexes = uniqueIndexes.tolist()
+    else:
+        vertexIndexTable = {}
+        weldedVertexes = []
+        uniqueIndexes = []
+        for vertex in vertexes:
+            weldKey = getWeldKey(vertex, weldTolerance)
+            if weldKey not in vertexIndexTable:
+                vertexIndexTable[weldKey] = len(weldedVertexes)
+                weldedVertexes.append(vertex)
+            uniqueIndexes.append(vertexIndexTable[weldKey])
+    if len(weldedVertexes) == len(vertexes):
+        return
+    weldedFaces = []
+    for weldedFace in triangleMesh.faces:
+        vertexIndexes = [uniqueIndexes[vertexIndex] for vertexIndex in weldedFace.vertexIndexes]
+        if len(set(vertexIndexes)) == len(vertexIndexes):
+            weldedFace.index = len(weldedFaces)
+            weldedFace.edgeIndexes = []
+            weldedFace.vertexIndexes = vertexIndexes
+            weldedFaces.append(weldedFace)
+    triangleMesh.edges = []
+    triangleMesh.faces = weldedFaces
+    triangleMesh.vertexes = weldedVertexes
+    triangleMesh.transformedVertexes = None
+
+
+class EdgeSweep:
+    'A sweep line over the edges sorted by z, so that each layer of an ascending carve only touches the edges which straddle it.'
+    def __init__(self, edges, vertexes):
+        'Sort the edge indexes by the minimum and by the maximum z of the edges.'
+        self.edges = edges
+        for edge in edges:
+            setEdgeMaximumMinimum(edge, vertexes)
+        self.edgeIndexesByMaximum = sorted(xrange(len(edges)), key=lambda edgeIndex: edges[edgeIndex].zMaximum)
+        self.edgeIndexesByMinimum = sorted(xrange(len(edges)), key=lambda edgeIndex: edges[edgeIndex].zMinimum)
+        self.reset()
+
+    def getRemainingEdgeTable(self, z):
+        'Get the remaining edge hashtable, the same as getRemainingEdgeTable would for the edges.'
+        if z < self.z:
+            self.reset()
+        self.z = z
+        while self.minimumIndex < len(self.edgeIndexesByMinimum):
+            edgeIndex = self.edgeIndexesByMinimum[self.minimumIndex]
+            edge = self.edges[edgeIndex]
+            if edge.zMinimum >= z:
+                break
+            if edge.zMaximum > z:
+                self.straddlingEdgeIndexes.add(edgeIndex)
+            self.minimumIndex += 1
+        while self.maximumIndex < len(self.edgeIndexesByMaximum):
+            edgeIndex = self.edgeIndexesByMaximum[self.maximumIndex]
+            if self.edges[edgeIndex].zMaximum > z:
+                break
+            self.straddlingEdgeIndexes.discard(edgeIndex)
+            self.maximumIndex += 1
+        remainingEdgeTable = {}
+        for edgeIndex in sorted(self.straddlingEdgeIndexes):
+            remainingEdgeTable[edgeIndex] = self.edges[edgeIndex]
+        return remainingEdgeTable
+
+    def reset(self):
+        'Restart the sweep from below the lowest edge.'
+        self.maximumIndex = 0
+        self.minimumIndex = 0
+        self.straddlingEdgeIndexes = set()
+        self.z = -987654321.0
+
+
 class EdgePair:
     def __init__(self):
         'Pair of edges on a face.'
@@ -736,6 +853,8 @@ class TriangleMesh( group.Group ):
         'Add empty lists.'
         group.Group.__init__(self)
         self.belowLoops = []
+        self.carveProcesses = 1
+        self.edgeSweep = None
         self.infillInDirectionOfBridge = False
         self.edges = []
         self.faces = []
@@ -746,6 +865,23 @@ class TriangleMesh( group.Group ):
         self.transformedVertexes = None
         self.vertexes = []
 
+    def addRotatedLoopLayersByProcesses(self, zs):
+        'Carve ranges of layers in worker processes, which are each given the mesh once, and add the layers in order.'
+        rangeLength = int(math.ceil(len(zs) / float(4 * self.carveProcesses)))
+        belowZZs = []
+        for zIndex in xrange(0, len(zs), rangeLength):
+            belowZ = None
+            if zIndex > 0:
+                belowZ = zs[zIndex - 1]
+            belowZZs.append((belowZ, zs[zIndex : zIndex + rangeLength]))
+        pool = Pool(self.carveProcesses, setCarvingMesh, (self,))
+        try:
+            for rotatedLoopLayers in pool.map(getRotatedLoopLayersByZs, belowZZs):
+                self.rotatedLoopLayers += rotatedLoopLayers
+        finally:
+            pool.close()
+            pool.join()
+
     def addXMLSection(self, depth, output):
         'Add the xml section for this object.'
         xml_simple_writer.addXMLFromVertexes( depth, output, self.vertexes )
@@ -771,10 +907,29 @@ class TriangleMesh( group.Group ):
         self.zoneArrangement = ZoneArrangement(self.layerThickness, self.getTransformedVertexes())
         layerTop = self.cornerMaximum.z - halfHeight * 0.5
         z = self.cornerMinimum.z + halfHeight
-        while z < layerTop:
-            z = self.getZAddExtruderPaths(z)
+        self.setEdgesForAllFaces()
+        self.edgeSweep = EdgeSweep(self.edges, self.getTransformedVertexes())
+        if self.carveProcesses > 1:
+            zs = []
+            while z < layerTop:
+                zs.append(z)
+                z += self.layerThickness
+            self.addRotatedLoopLayersByProcesses(zs)
+        else:
+            while z < layerTop:
+                z = self.getZAddExtruderPaths(z)
+        self.edgeSweep = None
         return self.rotatedLoopLayers
 
+    def getCarvingCopy(self):
+        'Get a copy to carve, with its own faces so that carving the copy does not change this mesh.'
+        carvingCopy = TriangleMesh()
+        carvingCopy.edges = self.edges[:]
+        for face in self.faces:
+            carvingCopy.faces.append(face.copy())
+        carvingCopy.vertexes = self.vertexes[:]
+        return carvingCopy
+
     def getFabmetheusXML(self):
         'Return the fabmetheus XML.'
         return None
@@ -795,11 +950,12 @@ class TriangleMesh( group.Group ):
     def getLoopsFromMesh( self, z ):
         'Get loops from a carve of a mesh.'
         originalLoops = []
-        self.setEdgesForAllFaces()
+        if self.edgeSweep == None:
+            self.setEdgesForAllFaces()
         if self.isCorrectMesh:
-            originalLoops = getLoopsFromCorrectMesh( self.edges, self.faces, self.getTransformedVertexes(), z )
+            originalLoops = getLoopsFromCorrectMesh( self.edges, self.faces, self.getTransformedVertexes(), z, self.getRemainingEdgeTable(z) )
         if len( originalLoops ) < 1:
-            originalLoops = getLoopsFromUnprovenMesh( self.edges, self.faces, self.importRadius, self.getTransformedVertexes(), z )
+            originalLoops = getLoopsFromUnprovenMesh( self.edges, self.faces, self.importRadius, self.getTransformedVertexes(), z, self.getRemainingEdgeTable(z) )
         loops = euclidean.getSimplifiedLoops(originalLoops, self.importRadius)
         sortLoopsInOrderOfArea(True, loops)
         return getOrientedLoops(loops)
@@ -816,6 +972,23 @@ class TriangleMesh( group.Group ):
             self.cornerMinimum.minimize(point)
         return self.cornerMinimum.z
 
+    def getRemainingEdgeTable(self, z):
+        'Get the remaining edge hashtable from the edge sweep of the carve, if there is one.'
+        if self.edgeSweep == None:
+            return getRemainingEdgeTable(self.edges, self.getTransformedVertexes(), z)
+        return self.edgeSweep.getRemainingEdgeTable(z)
+
+    def getRotatedLoopLayersByZs(self, belowZ, zs):
+        'Get the rotated loop layers at the zs, carving the layer at belowZ first for the bridge direction if there is one.'
+        self.belowLoops = []
+        self.rotatedLoopLayers = []
+        if belowZ != None and self.infillInDirectionOfBridge:
+            self.getZAddExtruderPaths(belowZ)
+            self.rotatedLoopLayers = []
+        for z in zs:
+            self.getZAddExtruderPaths(z)
+        return self.rotatedLoopLayers
+
     def getTransformedVertexes(self):
         'Get all transformed vertexes.'
         if self.xmlElement == None:
@@ -864,6 +1037,10 @@ class TriangleMesh( group.Group ):
         'Set the layer thickness.'
         self.layerThickness = layerThickness
 
+    def setCarveProcesses( self, carveProcesses ):
+        'Set the number of processes which carve the layers.'
+        self.carveProcesses = carveProcesses
+
     def setCarveImportRadius( self, importRadius ):
         'Set the import radius.'
         self.importRadius = importRadius
@@ -872,6 +1049,11 @@ class TriangleMesh( group.Group ):
         'Set the is correct mesh flag.'
         self.isCorrectMesh = isCorrectMesh
 
+    def setCarveWeldTolerance( self, weldTolerance ):
+        'Set the weld tolerance and weld the vertexes which are within it.'
+        if weldTolerance > 0.0:
+            weldVertexes(self, weldTolerance)
+
     def setEdgesForAllFaces(self):
         'Set the face edges of all the faces.'
         edgeTable = {}
@@ -0,0 +1,229 @@
+"""
+Pixel grid is a pixel table backed by a two dimensional array covering the extent of a layer, which can be used wherever euclidean uses a pixel dictionary.
+
+Each cell holds a code for the value of its pixel: zero when the pixel is empty, one when the value is None or is kept in the other values dictionary, and the value plus two for a non negative integer.  Pixels outside the extent are kept in a dictionary, so the grid behaves exactly like the dictionary it replaces.
+
+"""
+
+import itertools
+import math
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# The codes of the cells, integer values are stored as the value plus globalIntegerOffset.
+globalEmpty = 0
+globalIntegerOffset = 2
+globalOtherValue = 1
+
+# Above this number of cells the pixel table falls back to a dictionary, to bound the memory of a layer.
+globalMaximumCells = 16777216
+# The number of pixels around the extent of the loops which are inside the grid.
+globalMargin = 4
+# Segments spanning fewer columns than this are set pixel by pixel, because the array calls cost more than they save.
+globalMinimumVectorizedColumns = 16
+
+def getIntegerCode(value):
+    'Get the cell code of None or a small non negative integer, or None if the value must be kept in the other values dictionary.'
+    if value == None:
+        return globalOtherValue
+    if value.__class__ == int and value >= 0 and value < 2147483647 - globalIntegerOffset:
+        return value + globalIntegerOffset
+    return None
+
+def getPixelTable(loops, width):
+    'Get a pixel grid covering the loops, or an empty dictionary if numpy is not available or the grid would be too large.'
+    if numpy == None:
+        return {}
+    points = []
+    for loop in loops:
+        points += loop
+    if len(points) < 1:
+        return {}
+    xs = [point.real for point in points]
+    ys = [point.imag for point in points]
+    xMinimum = int(round(min(xs) / width)) - globalMargin
+    yMinimum = int(round(min(ys) / width)) - globalMargin
+    xSize = int(round(max(xs) / width)) + globalMargin + 1 - xMinimum
+    ySize = int(round(max(ys) / width)) + globalMargin + 1 - yMinimum
+    if xSize * ySize > globalMaximumCells:
+        return {}
+    # The keys of steep segments are (y, x), so the grid is square to cover both orders.
+    minimum = min(xMinimum, yMinimum)
+    size = max(xMinimum + xSize, yMinimum + ySize) - minimum
+    if size * size > globalMaximumCells:
+        return PixelGrid(xMinimum, yMinimum, xSize, ySize)
+    return PixelGrid(minimum, minimum, size, size)
+
+
+class PixelGrid:
+    'A pixel table backed by an array of cell codes, with a dictionary for the pixels outside the array.'
+    def __init__(self, xMinimum, yMinimum, xSize, ySize):
+        'Initialize the empty grid.'
+        self.cells = numpy.zeros((xSize, ySize), dtype=numpy.int32)
+        self.otherValues = {}
+        self.outside = {}
+        self.xMinimum = xMinimum
+        self.xSize = xSize
+        self.yMinimum = yMinimum
+        self.ySize = ySize
+
+    def __contains__(self, key):
+        'Determine if the pixel is occupied.'
+        x = key[0] - self.xMinimum
+        y = key[1] - self.yMinimum
+        if x < 0 or y < 0 or x >= self.xSize or y >= self.ySize:
+            return key in self.outside
+        return self.cells[x, y] != globalEmpty
+
+    def __delitem__(self, key):
+        'Empty the pixel.'
+        x = key[0] - self.xMinimum
+        y = key[1] - self.yMinimum
+        if x < 0 or y < 0 or x >= self.xSize or y >= self.ySize:
+            del self.outside[key]
+            return
+        if self.cells[x, y] == globalEmpty:
+            raise KeyError(key)
+        self.cells[x, y] = globalEmpty
+        if key in self.otherValues:
+            del self.otherValues[key]
+
+    def __getitem__(self, key):
+        'Get the value of the pixel.'
+        x = key[0] - self.xMinimum
+        y = key[1] - self.yMinimum
+        if x < 0 or y < 0 or x >= self.xSize or y >= self.ySize:
+            return self.outside[key]
+        code = int(self.cells[x, y])
+        if code == globalEmpty:
+            raise KeyError(key)
+        if code == globalOtherValue:
+            return self.otherValues.get(key)
+        return code - globalIntegerOffset
+
+    def __iter__(self):
+        'Get an iterator over the occupied pixels.'
+        return iter(self.keys())
+
+    def __len__(self):
+        'Get the number of occupied pixels.'
+        return int(numpy.count_nonzero(self.cells)) + len(self.outside)
+
+    def __repr__(self):
+        'Get the string representation of this pixel grid.'
+        return 'PixelGrid %s, %s %s x %s, %s pixels' % (self.xMinimum, self.yMinimum, self.xSize, self.ySize, len(self))
+
+    def __setitem__(self, key, value):
+        'Set the value of the pixel.'
+        x = key[0] - self.xMinimum
+        y = key[1] - self.yMinimum
+        if x < 0 or y < 0 or x >= self.xSize or y >= self.ySize:
+            self.outside[key] = value
+            return
+        if key in self.otherValues:
+            del self.otherValues[key]
+        self.cells[x, y] = self.getCode(key, value)
+
+    def addRasterizedSegment(self, isSteep, xBegin, yBegin, xEnd, yEnd, yIntersection, gradient, value):
+        'Add the pixels of a rasterized segment, two pixels for each column between the end pixels, as addValueSegmentToPixelTable in euclidean does.'
+        cells = self.cells
+        xMinimum = self.xMinimum
+        yMinimum = self.yMinimum
+        if isSteep:
+            cells = cells.T
+            xMinimum = self.yMinimum
+            yMinimum = self.xMinimum
+        code = getIntegerCode(value)
+        xLow = xBegin - xMinimum
+        xHigh = xEnd - xMinimum
+        yLow = min(yBegin, yEnd) - yMinimum - 2
+        yHigh = max(yBegin, yEnd) - yMinimum + 2
+        if code == None or len(self.otherValues) > 0 or xLow < 0 or yLow < 0 or xHigh >= cells.shape[0] or yHigh >= cells.shape[1]:
+            self.setPixelWithSteepness(isSteep, xBegin, yBegin, value)
+            self.setPixelWithSteepness(isSteep, xEnd, yEnd, value)
+            for x in xrange(xBegin + 1, xEnd):
+                y = int(math.floor(yIntersection + x * gradient))
+                self.setPixelWithSteepness(isSteep, x, y, value)
+                self.setPixelWithSteepness(isSteep, x, y + 1, value)
+            return
+        cells[xLow, yBegin - yMinimum] = code
+        cells[xHigh, yEnd - yMinimum] = code
+        if xEnd - xBegin - 1 < globalMinimumVectorizedColumns:
+            for x in xrange(xBegin + 1, xEnd):
+                y = int(math.floor(yIntersection + x * gradient)) - yMinimum
+                cells[x - xMinimum, y] = code
+                cells[x - xMinimum, y + 1] = code
+            return
+        xs = numpy.arange(xBegin + 1, xEnd)
+        ys = numpy.floor(yIntersection + xs * gradient).astype(int) - yMinimum
+        xs -= xMinimum
+        cells[xs, ys] = code
+        cells[xs, ys + 1] = code
+
+    def get(self, key, default=None):
+        'Get the value of the pixel, or the default if it is empty.'
+        if key in self:
+            return self[key]
+        return default
+
+    def getCellIndexes(self, keys):
+        'Get the arrays of the cell indexes of the keys, and of whether each key is inside the grid.'
+        keyArray = numpy.fromiter(itertools.chain.from_iterable(keys), dtype=int, count=2 * len(keys))
+        xs = keyArray[0 : : 2] - self.xMinimum
+        ys = keyArray[1 : : 2] - self.yMinimum
+        return xs, ys, (xs >= 0) & (ys >= 0) & (xs < self.xSize) & (ys < self.ySize)
+
+    def getCode(self, key, value):
+        'Get the cell code of the value, keeping the value in the other values dictionary if it is not None or a small integer.'
+        code = getIntegerCode(value)
+        if code != None:
+            return code
+        self.otherValues[key] = value
+        return globalOtherValue
+
+    def isIntersecting(self, littleTable, maskTable={}):
+        'Determine if any pixel of the little table which is not in the mask table is occupied.'
+        keys = [key for key in littleTable if key not in maskTable]
+        if len(keys) < globalMinimumVectorizedColumns:
+            for key in keys:
+                if key in self:
+                    return True
+            return False
+        xs, ys, isInside = self.getCellIndexes(keys)
+        if numpy.any(self.cells[xs[isInside], ys[isInside]] != globalEmpty):
+            return True
+        if len(self.outside) < 1 or numpy.all(isInside):
+            return False
+        for keyIndex in numpy.flatnonzero(~isInside).tolist():
+            if keys[keyIndex] in self.outside:
+                return True
+        return False
+
+    def keys(self):
+        'Get the occupied pixels.'
+        xs, ys = numpy.nonzero(self.cells)
+        keys = zip((xs + self.xMinimum).tolist(), (ys + self.yMinimum).tolist())
+        return keys + self.outside.keys()
+
+    def removeKeys(self, keys):
+        'Empty the pixels of the keys which are occupied.'
+        if len(keys) < 1:
+            return
+        xs, ys, isInside = self.getCellIndexes(keys)
+        self.cells[xs[isInside], ys[isInside]] = globalEmpty
+        if len(self.otherValues) > 0:
+            for key in keys:
+                self.otherValues.pop(key, None)
+        if len(self.outside) > 0 and not numpy.all(isInside):
+            for keyIndex in numpy.flatnonzero(~isInside).tolist():
+                self.outside.pop(keys[keyIndex], None)
+
+    def setPixelWithSteepness(self, isSteep, x, y, value):
+        'Set the value of the pixel, swapping the coordinates if the segment is steep.'
+        if isSteep:
+            self[(y, x)] = value
+        else:
+            self[(x, y)] = value
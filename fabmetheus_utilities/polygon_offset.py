@@ -0,0 +1,190 @@
+"""
+Polygon offset gets the inset and outset loops of loops with the backend chosen in the profile.
+
+The intercircle backend builds circles around the points of the loops and walks the loops of their intersections, as skeinforge always has.  The clipper backend offsets the loops with pyclipper, an integer coordinate polygon clipper, after the points are scaled to integer arrays.  Its loops are exact mitered offsets, so they differ slightly from those of intercircle, which is kept as the default for the parity of the output.  If pyclipper is not installed the clipper backend falls back to intercircle.
+
+The plugins offset the same loops by the same radius again and again, so the offset loops are kept in an offset cache, which the sliced model holds for its run.  The cache is keyed on the points of the loops, the radius and the threshold ratio, it keeps the most recently used loops up to a number of points, and it counts its hits and misses.
+
+"""
+
+from collections import OrderedDict
+from fabmetheus_utilities import euclidean, intercircle
+import logging
+try:
+    import numpy
+except ImportError:
+    numpy = None
+try:
+    import pyclipper
+except ImportError:
+    pyclipper = None
+
+logger = logging.getLogger('polygon_offset')
+
+globalBackends = ['intercircle', 'clipper']
+globalBackend = 'intercircle'
+# The offset cache of the run, or None when the loops are always offset.
+globalOffsetCache = None
+# The offset of a corner is limited to this ratio of the radius, about as much as intercircle allows.
+globalMiterLimit = 1.6
+# The points are multiplied by the scale and rounded to integers for pyclipper, so the loops are accurate to about a micron.
+globalScale = 1048576.0
+
+def getBackend():
+    'Get the name of the offset backend.'
+    return globalBackend
+
+def getBackendInsetLoops(loops, radius, thresholdRatio=0.9):
+    'Get the inset loops of each loop with the backend, which might overlap.'
+    insetLoops = []
+    for loop in loops:
+        if globalBackend == 'intercircle' or len(loop) < 3:
+            insetLoops += intercircle.getInsetLoopsFromLoop(loop, radius, thresholdRatio)
+        else:
+            insetLoops += getClipperInsetLoopsFromLoop(loop, radius)
+    return insetLoops
+
+def getBackendInsetSeparateLoops(loops, inset, thresholdRatio=0.9):
+    'Get the separate inset loops with the backend.'
+    if globalBackend == 'intercircle':
+        return intercircle.getInsetSeparateLoopsFromLoops(inset, loops, thresholdRatio)
+    return getClipperInsetSeparateLoopsFromLoops(inset, [loop for loop in loops if len(loop) > 2])
+
+def getCachedLoops(name, function, loops, radius, thresholdRatio=0.9):
+    'Get the loops which the function gets from the loops, radius and threshold ratio, from the offset cache if it holds them.'
+    if globalOffsetCache == None:
+        return function(loops, radius, thresholdRatio)
+    return globalOffsetCache.getLoops(name, function, loops, radius, thresholdRatio)
+
+def getClipperInsetLoopsFromLoop(loop, radius):
+    'Get the inset loops of the region to the left of the loop with pyclipper, oriented like the loop.'
+    isLoopWiddershins = euclidean.isWiddershins(loop)
+    delta = radius
+    if isLoopWiddershins:
+        delta = -radius
+    insetLoops = getLoopsFromScaledPaths(getOffsetScaledPaths(getScaledPaths([loop]), delta))
+    if not isLoopWiddershins:
+        for insetLoop in insetLoops:
+            insetLoop.reverse()
+    return insetLoops
+
+def getClipperInsetSeparateLoopsFromLoops(inset, loops):
+    'Get the inset loops of the region which the loops fill with pyclipper, the outer loops widdershins and the holes clockwise.'
+    clipper = pyclipper.Pyclipper()
+    clipper.AddPaths(getScaledPaths(loops), pyclipper.PT_SUBJECT, True)
+    regionPaths = clipper.Execute(pyclipper.CT_UNION, pyclipper.PFT_EVENODD, pyclipper.PFT_EVENODD)
+    return getLoopsFromScaledPaths(getOffsetScaledPaths(regionPaths, -inset))
+
+def getInsetLoopsFromLoop(loop, radius, thresholdRatio=0.9):
+    'Get the inset loops, which might overlap.'
+    return getCachedLoops('inset', getBackendInsetLoops, [loop], radius, thresholdRatio)
+
+def getInsetLoopsFromLoops(inset, loops):
+    'Get the inset loops, which might overlap.'
+    insetLoops = []
+    for loop in loops:
+        insetLoops += getInsetLoopsFromLoop(loop, inset)
+    return insetLoops
+
+def getInsetSeparateLoopsFromLoops(inset, loops, thresholdRatio=0.9):
+    'Get the separate inset loops.'
+    return getCachedLoops('separate', getBackendInsetSeparateLoops, loops, inset, thresholdRatio)
+
+def getLoopsFromScaledPaths(paths):
+    'Get the complex loops from the integer paths of pyclipper.'
+    loops = []
+    for path in paths:
+        if numpy == None:
+            loops.append([complex(point[0] / globalScale, point[1] / globalScale) for point in path])
+        else:
+            array = numpy.array(path, dtype=float) / globalScale
+            loops.append((array[:, 0] + 1j * array[:, 1]).tolist())
+    return loops
+
+def getNumberOfPoints(loops):
+    'Get the number of points of the loops.'
+    return sum([len(loop) for loop in loops])
+
+def getOffsetScaledPaths(paths, delta):
+    'Get the integer paths of the region of the integer paths offset by the delta, outward when the delta is positive.'
+    if len(paths) < 1:
+        return []
+    offset = pyclipper.PyclipperOffset(globalMiterLimit)
+    offset.AddPaths(paths, pyclipper.JT_MITER, pyclipper.ET_CLOSEDPOLYGON)
+    return offset.Execute(delta * globalScale)
+
+def getScaledPaths(loops):
+    'Get the integer paths of the complex loops for pyclipper, as lists of x and y pairs.'
+    paths = []
+    for loop in loops:
+        if numpy == None:
+            paths.append([(int(round(point.real * globalScale)), int(round(point.imag * globalScale))) for point in loop])
+        else:
+            array = numpy.array(loop, dtype=complex) * globalScale
+            paths.append(numpy.column_stack((array.real, array.imag)).round().astype(numpy.int64).tolist())
+    return paths
+
+def setBackend(backend):
+    'Set the offset backend by its name, falling back to intercircle if the backend is unknown or pyclipper is not installed.'
+    global globalBackend
+    if backend not in globalBackends:
+        logger.warning('Unknown offset backend %s, using intercircle.', backend)
+        backend = 'intercircle'
+    if backend == 'clipper' and pyclipper == None:
+        logger.warning('The clipper offset backend needs pyclipper, which is not installed, using intercircle.')
+        backend = 'intercircle'
+    globalBackend = backend
+
+def setOffsetCache(offsetCache):
+    'Set the offset cache of the run, None turns caching off.'
+    global globalOffsetCache
+    globalOffsetCache = offsetCache
+
+
+class OffsetCache:
+    'A cache of offset loops, which keeps the most recently used loops up to a number of points.'
+    def __init__(self, maximumPoints):
+        'Initialize the cache with the maximum number of points of the loops it holds, keys and offset loops.'
+        self.entries = OrderedDict()
+        self.evictions = 0
+        self.hits = 0
+        self.maximumPoints = maximumPoints
+        self.misses = 0
+        self.numberOfPoints = 0
+
+    def __getstate__(self):
+        'Get the state for pickling, which leaves out the entries.'
+        return {'maximumPoints' : self.maximumPoints}
+
+    def __len__(self):
+        'Get the number of entries.'
+        return len(self.entries)
+
+    def __repr__(self):
+        'Get the string representation of this offset cache.'
+        return 'OffsetCache %s hits, %s misses, %s evictions, %s entries of %s points' % (self.hits, self.misses, self.evictions, len(self), self.numberOfPoints)
+
+    def __setstate__(self, state):
+        'Set the state from pickling, with no entries.'
+        self.__init__(state['maximumPoints'])
+
+    def getLoops(self, name, function, loops, radius, thresholdRatio):
+        'Get copies of the loops which the function gets from the loops, radius and threshold ratio, calling it only if they are not held.'
+        key = (name, globalBackend, tuple([tuple(loop) for loop in loops]), radius, thresholdRatio)
+        entry = self.entries.pop(key, None)
+        if entry == None:
+            self.misses += 1
+            offsetLoops = tuple([tuple(offsetLoop) for offsetLoop in function(loops, radius, thresholdRatio)])
+            entry = (offsetLoops, getNumberOfPoints(key[2]) + getNumberOfPoints(offsetLoops))
+            self.numberOfPoints += entry[1]
+        else:
+            self.hits += 1
+        self.entries[key] = entry
+        self.removeLeastRecentlyUsed()
+        return [list(offsetLoop) for offsetLoop in entry[0]]
+
+    def removeLeastRecentlyUsed(self):
+        'Remove the least recently used entries until they hold no more than the maximum number of points.'
+        while self.numberOfPoints > self.maximumPoints and len(self.entries) > 0:
+            self.numberOfPoints -= self.entries.popitem(False)[1][1]
+            self.evictions += 1
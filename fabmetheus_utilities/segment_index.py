@@ -0,0 +1,270 @@
+"""
+Segment index is a uniform grid of the segments of loops, which finds the segments that a line may cross without testing every segment of the loops.
+
+Each segment is added to the cells which it passes through, widened by a small margin, so a line shares a cell with every segment it can intersect.  Only the segments in the cells of the line are then tested, exactly as euclidean tests a line against a loop: the segment is rotated into the frame of the line, and it crosses the line if its ends are on either side of the line and the crossing is between the ends of the line.  So the index answers as the brute force functions of euclidean do, in a time which grows with the segments near the line rather than with all the segments.
+
+The index also finds the x intersections of the segments crossing a line, the segment of a loop nearest to a point and whether a point is inside a loop, each with the arithmetic of the euclidean function it replaces.
+
+"""
+
+from fabmetheus_utilities import euclidean
+import math
+
+
+# The margin by which the segments and lines are widened in the cells as a ratio of the cell width, which covers the rounding of the rotated points.
+globalMarginRatio = 0.001
+
+def getCellWidth(loops):
+    'Get the cell width for the loops, which is the average extent of their segments.'
+    extents = 0.0
+    numberOfSegments = 0
+    for loop in loops:
+        for pointIndex in xrange(len(loop)):
+            segment = loop[(pointIndex + 1) % len(loop)] - loop[pointIndex]
+            extents += max(abs(segment.real), abs(segment.imag))
+            numberOfSegments += 1
+    if numberOfSegments < 1 or extents <= 0.0:
+        return 1.0
+    return extents / float(numberOfSegments)
+
+def getColumnKeys(xBegin, yBegin, xEnd, yEnd, cellWidth, margin):
+    'Get the keys of the cells which a segment passes through, column by column along its x axis, for a segment at most as steep as a diagonal.'
+    if xBegin > xEnd:
+        xBegin, yBegin, xEnd, yEnd = xEnd, yEnd, xBegin, yBegin
+    gradient = 0.0
+    if xEnd > xBegin:
+        gradient = (yEnd - yBegin) / (xEnd - xBegin)
+    keys = []
+    for column in xrange(int(math.floor((xBegin - margin) / cellWidth)), int(math.floor((xEnd + margin) / cellWidth)) + 1):
+        xLow = min(max(column * cellWidth, xBegin), xEnd)
+        xHigh = max(min((column + 1) * cellWidth, xEnd), xBegin)
+        yLow = yBegin + gradient * (xLow - xBegin)
+        yHigh = yBegin + gradient * (xHigh - xBegin)
+        if yLow > yHigh:
+            yLow, yHigh = yHigh, yLow
+        for row in xrange(int(math.floor((yLow - margin) / cellWidth)), int(math.floor((yHigh + margin) / cellWidth)) + 1):
+            keys.append((column, row))
+    return keys
+
+def getRingKeys(column, row, ring):
+    'Get the keys of the cells in the square ring around the cell, the ring number of cells away from it.'
+    if ring < 1:
+        return [(column, row)]
+    keys = []
+    for ringColumn in xrange(column - ring, column + ring + 1):
+        keys.append((ringColumn, row - ring))
+        keys.append((ringColumn, row + ring))
+    for ringRow in xrange(row - ring + 1, row + ring):
+        keys.append((column - ring, ringRow))
+        keys.append((column + ring, ringRow))
+    return keys
+
+def isLoopIntersectingLoops(loop, otherLoops):
+    'Determine if the loop is intersecting the other loops, as euclidean.isLoopIntersectingLoops does.'
+    return SegmentIndex(otherLoops).isLoopIntersecting(loop)
+
+def isLoopListIntersecting(loops):
+    'Determine if a loop in the list is intersecting the loops after it, as euclidean.isLoopListIntersecting does.'
+    if len(loops) < 2:
+        return False
+    # The first loop is only tested against the others, so the index holds the loops after it, each a loop index lower.
+    segmentIndex = SegmentIndex(loops[1 :])
+    for loopIndex in xrange(len(loops) - 1):
+        if segmentIndex.isLoopIntersecting(loops[loopIndex], loopIndex):
+            return True
+    return False
+
+
+class SegmentIndex:
+    'A uniform grid of the segments of loops, in which each cell holds the indexes of the segments passing through it.'
+    def __init__(self, loops=[], cellWidth=None):
+        'Initialize the index of the segments of the loops, with the cell width or else the average extent of the segments.'
+        if cellWidth == None or cellWidth <= 0.0:
+            cellWidth = getCellWidth(loops)
+        self.cells = {}
+        self.cellWidth = cellWidth
+        self.loopBeginIndexes = []
+        self.loopEndIndexes = []
+        self.loopMaximumXs = []
+        self.loopMinimumXs = []
+        self.margin = globalMarginRatio * cellWidth
+        self.numberOfLoops = 0
+        self.segmentBegins = []
+        self.segmentEnds = []
+        self.segmentLoopIndexes = []
+        for loop in loops:
+            self.addLoop(loop)
+
+    def __len__(self):
+        'Get the number of segments.'
+        return len(self.segmentBegins)
+
+    def __repr__(self):
+        'Get the string representation of this segment index.'
+        return 'SegmentIndex %s loops, %s segments, %s cells of width %s' % (self.numberOfLoops, len(self), len(self.cells), self.cellWidth)
+
+    def addLoop(self, loop):
+        'Add the segments of the loop, including the one closing it, under the next loop index.'
+        loopIndex = self.numberOfLoops
+        self.numberOfLoops += 1
+        self.loopBeginIndexes.append(len(self.segmentBegins))
+        for pointIndex in xrange(len(loop)):
+            self.addSegment(loop[pointIndex], loop[(pointIndex + 1) % len(loop)], loopIndex)
+        self.loopEndIndexes.append(len(self.segmentBegins))
+        if len(loop) > 0:
+            self.loopMaximumXs.append(max([point.real for point in loop]))
+            self.loopMinimumXs.append(min([point.real for point in loop]))
+        else:
+            self.loopMaximumXs.append(0.0)
+            self.loopMinimumXs.append(0.0)
+
+    def addLoops(self, loops):
+        'Add the segments of the loops.'
+        for loop in loops:
+            self.addLoop(loop)
+
+    def addSegment(self, pointBegin, pointEnd, loopIndex):
+        'Add the segment to the cells which it passes through.'
+        segmentIndex = len(self.segmentBegins)
+        self.segmentBegins.append(pointBegin)
+        self.segmentEnds.append(pointEnd)
+        self.segmentLoopIndexes.append(loopIndex)
+        cells = self.cells
+        for key in self.getCellKeys(pointBegin, pointEnd):
+            if key in cells:
+                cells[key].append(segmentIndex)
+            else:
+                cells[key] = [segmentIndex]
+
+    def addXIntersectionIndexesFromLine(self, pointBegin, pointEnd, xIntersectionIndexList):
+        'Add the x intersection indexes of the segments crossing the line between its ends in the frame of the line, in the order of the segments, as euclidean.addXIntersectionIndexesFromLoopY does for the rotated loops.'
+        normalizedSegment = pointEnd - pointBegin
+        normalizedSegmentLength = abs(normalizedSegment)
+        if normalizedSegmentLength <= 0.0:
+            return
+        normalizedSegment /= normalizedSegmentLength
+        segmentYMirror = complex(normalizedSegment.real, -normalizedSegment.imag)
+        pointBeginRotated = segmentYMirror * pointBegin
+        pointEndRotated = segmentYMirror * pointEnd
+        y = pointBeginRotated.imag
+        xMinimum = min(pointBeginRotated.real, pointEndRotated.real)
+        xMaximum = max(pointBeginRotated.real, pointEndRotated.real)
+        for segmentIndex in sorted(self.getCandidateIndexes(pointBegin, pointEnd)):
+            xIntersection = euclidean.getXIntersectionIfExists(segmentYMirror * self.segmentBegins[segmentIndex], segmentYMirror * self.segmentEnds[segmentIndex], y)
+            if xIntersection != None and xIntersection > xMinimum and xIntersection < xMaximum:
+                xIntersectionIndexList.append(euclidean.XIntersectionIndex(self.segmentLoopIndexes[segmentIndex], xIntersection))
+
+    def getCandidateIndexes(self, pointBegin, pointEnd):
+        'Get the indexes of the segments which share a cell with the line, so which may intersect it.'
+        cells = self.cells
+        candidateIndexes = set()
+        for key in self.getCellKeys(pointBegin, pointEnd):
+            if key in cells:
+                candidateIndexes.update(cells[key])
+        return candidateIndexes
+
+    def getCellKeys(self, pointBegin, pointEnd):
+        'Get the keys of the cells which the segment passes through, widened by the margin.'
+        if abs(pointEnd.real - pointBegin.real) < abs(pointEnd.imag - pointBegin.imag):
+            keys = getColumnKeys(pointBegin.imag, pointBegin.real, pointEnd.imag, pointEnd.real, self.cellWidth, self.margin)
+            return [(key[1], key[0]) for key in keys]
+        return getColumnKeys(pointBegin.real, pointBegin.imag, pointEnd.real, pointEnd.imag, self.cellWidth, self.margin)
+
+    def getIntersectingLines(self, lines, minimumLoopIndex=0):
+        'Get the indexes of the (begin, end) lines which intersect the segments of the loops from the minimum loop index on.'
+        return [lineIndex for lineIndex, line in enumerate(lines) if self.isLineIntersecting(line[0], line[1], minimumLoopIndex)]
+
+    def getLoop(self, loopIndex):
+        'Get the points of the loop.'
+        return self.segmentBegins[self.loopBeginIndexes[loopIndex] : self.loopEndIndexes[loopIndex]]
+
+    def getNearestDistanceIndex(self, point, loopIndex):
+        'Get the distance squared to the nearest segment of the loop and the index of that segment in the loop, as euclidean.getNearestDistanceIndex does.'
+        loopBeginIndex = self.loopBeginIndexes[loopIndex]
+        loopEndIndex = self.loopEndIndexes[loopIndex]
+        cells = self.cells
+        column = int(math.floor(point.real / self.cellWidth))
+        row = int(math.floor(point.imag / self.cellWidth))
+        checkedIndexes = set()
+        nearest = None
+        numberOfCells = 0
+        ring = 0
+        # The rings of cells around the cell of the point are searched until no segment beyond them could be as near as the nearest,
+        # or until more cells were searched than the loop has segments, when it is quicker to test them all.
+        while numberOfCells <= loopEndIndex - loopBeginIndex:
+            for key in getRingKeys(column, row, ring):
+                numberOfCells += 1
+                if key not in cells:
+                    continue
+                for segmentIndex in cells[key]:
+                    if segmentIndex >= loopBeginIndex and segmentIndex < loopEndIndex and segmentIndex not in checkedIndexes:
+                        checkedIndexes.add(segmentIndex)
+                        distance = euclidean.getDistanceToPlaneSegment(self.segmentBegins[segmentIndex], self.segmentEnds[segmentIndex], point)
+                        if nearest == None or (distance, segmentIndex) < nearest:
+                            nearest = (distance, segmentIndex)
+            reach = ring * self.cellWidth - self.margin
+            if nearest != None and reach > 0.0 and nearest[0] < reach * reach:
+                return euclidean.DistanceIndex(nearest[0], nearest[1] - loopBeginIndex)
+            ring += 1
+        return euclidean.getNearestDistanceIndex(point, self.getLoop(loopIndex))
+
+    def isLineIntersecting(self, pointBegin, pointEnd, minimumLoopIndex=0):
+        'Determine if the line is intersecting the segments of the loops from the minimum loop index on, as euclidean.isLineIntersectingLoops does.'
+        normalizedSegment = pointEnd - pointBegin
+        normalizedSegmentLength = abs(normalizedSegment)
+        if normalizedSegmentLength <= 0.0:
+            return False
+        normalizedSegment /= normalizedSegmentLength
+        segmentYMirror = complex(normalizedSegment.real, -normalizedSegment.imag)
+        pointBeginRotated = segmentYMirror * pointBegin
+        pointEndRotated = segmentYMirror * pointEnd
+        y = pointBeginRotated.imag
+        xMinimum = min(pointBeginRotated.real, pointEndRotated.real)
+        xMaximum = max(pointBeginRotated.real, pointEndRotated.real)
+        for segmentIndex in self.getCandidateIndexes(pointBegin, pointEnd):
+            if self.segmentLoopIndexes[segmentIndex] < minimumLoopIndex:
+                continue
+            beginRotated = segmentYMirror * self.segmentBegins[segmentIndex]
+            endRotated = segmentYMirror * self.segmentEnds[segmentIndex]
+            if (y > beginRotated.imag) == (y > endRotated.imag):
+                continue
+            endMinusBeginRotated = endRotated - beginRotated
+            xIntersection = (y - beginRotated.imag) / endMinusBeginRotated.imag * endMinusBeginRotated.real + beginRotated.real
+            if xIntersection >= xMinimum and xIntersection <= xMaximum:
+                return True
+        return False
+
+    def isLoopIntersecting(self, loop, minimumLoopIndex=0):
+        'Determine if a segment of the loop is intersecting the segments of the loops from the minimum loop index on, as euclidean.isLoopIntersectingLoops does.'
+        for pointIndex in xrange(len(loop)):
+            if self.isLineIntersecting(loop[pointIndex], loop[(pointIndex + 1) % len(loop)], minimumLoopIndex):
+                return True
+        return False
+
+    def isPointInsideLoop(self, point, loopIndex):
+        'Determine if the point is inside the loop, as euclidean.isPointInsideLoop does.'
+        loopBeginIndex = self.loopBeginIndexes[loopIndex]
+        loopEndIndex = self.loopEndIndexes[loopIndex]
+        xMaximum = self.loopMaximumXs[loopIndex] + self.margin
+        xMinimum = self.loopMinimumXs[loopIndex] - self.margin
+        # A loop crosses the line through the point an even number of times, so the crossings left of the point have the parity of the
+        # others, and the crossings on the shorter side are counted.
+        isLeft = point.real - xMinimum < xMaximum - point.real
+        if isLeft:
+            xEnd = xMinimum
+        else:
+            xEnd = xMaximum
+        if abs(point.real - xEnd) > self.cellWidth * float(loopEndIndex - loopBeginIndex):
+            return euclidean.isPointInsideLoop(self.getLoop(loopIndex), point)
+        cells = self.cells
+        candidateIndexes = set()
+        for key in getColumnKeys(point.real, point.imag, xEnd, point.imag, self.cellWidth, self.margin):
+            if key in cells:
+                candidateIndexes.update(cells[key])
+        numberOfIntersections = 0
+        for segmentIndex in candidateIndexes:
+            if segmentIndex >= loopBeginIndex and segmentIndex < loopEndIndex:
+                xIntersection = euclidean.getXIntersectionIfExists(self.segmentBegins[segmentIndex], self.segmentEnds[segmentIndex], point.imag)
+                if xIntersection != None and (xIntersection < point.real) == isLeft:
+                    numberOfIntersections += 1
+        return numberOfIntersections % 2 == 1
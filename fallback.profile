@@ -8,7 +8,9 @@ file.extension=gcode
 file.extension.profile=true
 replace.filename=replace.csv
 export.slicedmodel=true
-export.slicedmodel.extension=slicedmodel.pickle
+; binary | pickle, the binary sliced model file is compact and its layers can be read one at a time.
+export.slicedmodel.format=binary
+export.slicedmodel.extension=slicedmodel
 overwrite.exported.slicedmodel=true
 
 
@@ -29,12 +31,26 @@ layer.print.from=0
 layer.print.to=912345678
 infill.bridge.direction=true
 mesh.correct=true
+; Vertexes closer than the weld tolerance (in mm) are merged on import, 0 only merges identical vertexes.
+mesh.weld.tolerance=0.0
 import.coarseness.ratio=1.0
+; intercircle | clipper, the backend which offsets the loops for all the plugins. clipper is faster and needs pyclipper, its loops differ slightly from those of intercircle.
+offset.backend=intercircle
+; The offset loops are cached for the run up to this number of points, 0 turns the cache off.
+offset.cache.points=250000
+; Carve ranges of layers in separate processes, 0 processes uses one for each cpu.
+multiprocess=false
+multiprocess.processes=0
+; Keep the carved layers of each model and carve settings on disk, the default directory is ~/.skeinforge_engine/carve_cache.
+cache=false
+cache.directory=
+cache.size.megabytes=256
 
 [inset]
 debug=false
-; The pypy interpreter produces faster results with multiprocessing turned off.
+; Inset the layers in separate processes, 0 processes uses one for each cpu.
 multiprocess=false
+multiprocess.processes=0
 bridge.width.multiplier.ratio=1.0
 nozzle.diameter=0.5
 loop.order.preferloops=true
@@ -67,6 +83,9 @@ infill.rotation.odd.layer=90.0
 ; LineFillStrategy
 strategy.path=plugins/strategies
 strategy=LineFillStrategy
+; Fill ranges of layers in separate processes, 0 processes uses one for each cpu.
+multiprocess=false
+multiprocess.processes=0
 
 [multiply]
 active=true
@@ -133,6 +152,9 @@ decimal.places=4
 
 [comb]
 active=true
+; Offset the betweens of the layers in separate processes before the gcode is written, 0 processes uses one for each cpu.
+multiprocess=false
+multiprocess.processes=0
 
 [cool]
 active=true
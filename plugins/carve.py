@@ -12,6 +12,7 @@ License:
 
 from config import config
 from fabmetheus_utilities import archive, svg_writer, vector3
+from utilities import carve_cache, layer_executor, mesh_cache
 import logging
 import math
 
@@ -22,14 +23,17 @@ logger = logging.getLogger(name)
 def performAction(slicedModel):
     "Get carved text."
     filename = slicedModel.runtimeParameters.inputFilename
-    carving = svg_writer.getCarving(filename)
+    carveSkein = CarveSkein(slicedModel)
+    if carveSkein.carveFromCache(filename):
+        return
+    carving = mesh_cache.getCarving(filename)
     if carving == None:
         return
     if config.getboolean(name, 'debug'):
         carvingFilename = filename[: filename.rfind('.')] + '.carving.xml'
         archive.writeFileText(carvingFilename , str(carving))
         logger.info("Carving XML written to %s", carvingFilename)
-    CarveSkein(slicedModel).carve(carving)
+    carveSkein.carve(carving)
 
 class CarveSkein:
     "A class to carve a 3D model."
@@ -42,9 +46,19 @@ class CarveSkein:
         self.infillBridgeDirection = config.getboolean(name, 'infill.bridge.direction')
         self.importCoarsenessRatio = config.getfloat(name, 'import.coarseness.ratio')
         self.correctMesh = config.getboolean(name, 'mesh.correct')
+        self.weldTolerance = config.getfloat(name, 'mesh.weld.tolerance')
         self.decimalPlaces = config.getint('general', 'decimal.places')
         self.layerPrintFrom = config.getint(name, 'layer.print.from')
         self.layerPrintTo = config.getint(name, 'layer.print.to')
+        self.multiprocess = config.getboolean(name, 'multiprocess')
+        self.processes = config.getint(name, 'multiprocess.processes')
+        self.cache = None
+        self.cacheKey = None
+        if config.getboolean(name, 'cache'):
+            cacheDirectory = config.get(name, 'cache.directory')
+            if cacheDirectory == None or cacheDirectory == '':
+                cacheDirectory = carve_cache.getDefaultDirectory()
+            self.cache = carve_cache.CarveCache(cacheDirectory, int(config.getfloat(name, 'cache.size.megabytes') * 1048576))
 
     def carve(self, carving):
         "Parse 3D model file and store the carved slicedModel."
@@ -54,6 +68,8 @@ class CarveSkein:
         importRadius = 0.5 * self.importCoarsenessRatio * abs(self.extrusionWidth)
         carving.setCarveImportRadius(max(importRadius, 0.001 * self.layerHeight))
         carving.setCarveIsCorrectMesh(self.correctMesh)
+        carving.setCarveWeldTolerance(self.weldTolerance)
+        carving.setCarveProcesses(self.getCarveProcesses())
 
         rotatedLoopLayers = carving.getCarveRotatedBoundaryLayers()
 
@@ -61,8 +77,56 @@ class CarveSkein:
             logger.warning('There are no slices for the model, this could be because the model is too small for the Layer Thickness.')
             return
 
-        self.slicedModel.carvingCornerMaximum = carving.getCarveCornerMaximum()
-        self.slicedModel.carvingCornerMinimum = carving.getCarveCornerMinimum()
+        if self.cacheKey != None:
+            try:
+                self.cache.put(self.cacheKey, (rotatedLoopLayers, carving.getCarveCornerMaximum(), carving.getCarveCornerMinimum()))
+            except (OSError, IOError), error:
+                logger.warning('Could not write the carving to the carve cache %s: %s', self.cache.directory, error)
+
+        self.setRotatedLoopLayers(rotatedLoopLayers, carving.getCarveCornerMaximum(), carving.getCarveCornerMinimum())
+
+    def carveFromCache(self, filename):
+        'Set the carved layers from the carve cache, returning whether there was a cached carving of the file.'
+        if self.cache == None:
+            return False
+        self.cacheKey = self.cache.getKey(filename, self.getCacheSettings())
+        cachedCarving = self.cache.get(self.cacheKey)
+        if cachedCarving == None:
+            return False
+        logger.info('Carving loaded from the carve cache.')
+        rotatedLoopLayers, carvingCornerMaximum, carvingCornerMinimum = cachedCarving
+        self.setRotatedLoopLayers(rotatedLoopLayers, carvingCornerMaximum, carvingCornerMinimum)
+        return True
+
+    def getCacheSettings(self):
+        'Get the settings which change the carving, as the (name, value) pairs of the carve cache key.'
+        return [
+                ('layer.height', self.layerHeight),
+                ('extrusion.width', self.extrusionWidth),
+                ('import.coarseness.ratio', self.importCoarsenessRatio),
+                ('infill.bridge.direction', self.infillBridgeDirection),
+                ('mesh.correct', self.correctMesh),
+                ('mesh.weld.tolerance', self.weldTolerance)]
+
+    def getCarveProcesses(self):
+        'Get the number of processes which carve the layers.'
+        return layer_executor.getProcesses(self.multiprocess, self.processes)
+
+    def getLowerLeftCorner(self, points):
+        'Get the lower left corner point from a set of points.'
+        lowerLeftCorner = None
+        lowestRealPlusImaginary = 987654321.0
+        for point in points:
+            realPlusImaginary = point.real + point.imag
+            if realPlusImaginary < lowestRealPlusImaginary:
+                lowestRealPlusImaginary = realPlusImaginary
+                lowerLeftCorner = point
+        return lowerLeftCorner
+
+    def setRotatedLoopLayers(self, rotatedLoopLayers, carvingCornerMaximum, carvingCornerMinimum):
+        'Set the layers to be printed and the carving corners of the sliced model.'
+        self.slicedModel.carvingCornerMaximum = carvingCornerMaximum
+        self.slicedModel.carvingCornerMinimum = carvingCornerMinimum
 
         toBePrintedLayers = rotatedLoopLayers[self.layerPrintFrom : self.layerPrintTo]
         for toBePrintedLayer in toBePrintedLayers:
@@ -87,14 +151,3 @@ class CarveSkein:
                     self.slicedModel.runtimeParameters.layerThickness)
             archive.writeFileText(svgFilename , svgWriter.getReplacedSVGTemplate(self.slicedModel.runtimeParameters.inputFilename, '', self.slicedModel.rotatedLoopLayers))
             logger.info("Carving SVG written to %s", svgFilename)
-
-    def getLowerLeftCorner(self, points):
-        'Get the lower left corner point from a set of points.'
-        lowerLeftCorner = None
-        lowestRealPlusImaginary = 987654321.0
-        for point in points:
-            realPlusImaginary = point.real + point.imag
-            if realPlusImaginary < lowestRealPlusImaginary:
-                lowestRealPlusImaginary = realPlusImaginary
-                lowerLeftCorner = point
-        return lowerLeftCorner
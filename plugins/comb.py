@@ -2,6 +2,8 @@
 Comb the extrusion hair of a gcode file.  Modifies the travel paths so the nozzle does not go over empty spaces, thus reducing the strings that may build up.
 
 Note: comb is called during gcode generation, not through the usual plugin channel. This is because the travel calculations are made at the last minute.
+The comb skein of each layer is built once before its travels are combed, with segment indexes of its boundaries and betweens, so a travel only tests
+the segments near it. If comb is multiprocess the betweens of all the layers are offset in worker processes before the gcode is written.
 Credits:
         Original Author: Enrique Perez (http://skeinforge.com)
         Contributors: Please see the documentation in Skeinforge
@@ -12,18 +14,46 @@ License:
 """
 
 from config import config
-from fabmetheus_utilities import archive, euclidean, intercircle
+from fabmetheus_utilities import archive, euclidean, intercircle, polygon_offset, segment_index
+from utilities import layer_executor
 import logging
 import math
 
 name = __name__
 logger = logging.getLogger(name)
 
+def getBetweens(boundaries, betweenInset):
+    "Get the betweens of the boundaries of a layer."
+    betweens = []
+    for boundaryLoop in boundaries:
+        betweens += polygon_offset.getInsetLoopsFromLoop(boundaryLoop, betweenInset)
+    return betweens
+
+def getBetweensArray(workerState, layerArguments):
+    "Get the compact array of the betweens of the boundaries of a layer, in a worker of a multiprocess comb."
+    betweenInset, boundariesArray = layerArguments
+    return layer_executor.getLoopsArray(getBetweens(layer_executor.getLoopsFromArray(boundariesArray), betweenInset))
+
+def getCombSkeins(slicedModel):
+    "Get the comb skeins of the layers by layer index with their betweens offset in worker processes, or an empty dictionary if comb is not multiprocess."
+    combProcesses = layer_executor.getProcesses(config.getboolean('comb', 'multiprocess'), config.getint('comb', 'multiprocess.processes'))
+    if combProcesses < 2 or len(slicedModel.layers) < 2:
+        return {}
+    combSkeins = [CombSkein(layer) for layer in slicedModel.getReadLayers()]
+    layerArguments = [(combSkein.betweenInset, layer_executor.getLoopsArray(combSkein.boundaries)) for combSkein in combSkeins]
+    layerResults = layer_executor.getLayerResults(getBetweensArray, layerArguments, combProcesses)
+    for combSkein, betweensArray in zip(combSkeins, layerResults):
+        combSkein.betweens = layer_executor.getLoopsFromArray(betweensArray)
+    return dict([(combSkein.layerIndex, combSkein) for combSkein in combSkeins])
+
 class CombSkein:
     "A class to comb a skein of extrusions."
     def __init__(self, layer):
         'Initialize'
-        self.betweenTable = {}
+        self.betweenIndex = None
+        self.betweens = None
+        self.boundaryIndex = None
+        self.layerIndex = layer.index
         self.z = layer.z
 
         self.perimeterWidth = layer.runtimeParameters.perimeterWidth
@@ -41,16 +71,23 @@ class CombSkein:
                 x.append(boundaryPoint.dropAxis())
             self.boundaries.append(x)
 
+    def getBetweenIndex(self):
+        "Get the segment index of the betweens for the layer, to test the lines against them."
+        if self.betweenIndex == None:
+            self.betweenIndex = segment_index.SegmentIndex(self.getBetweens())
+        return self.betweenIndex
+
     def getBetweens(self):
-        "Set betweens for the layer."
-        if self.z in self.betweenTable:
-            return self.betweenTable[ self.z ]
-        if len(self.boundaries) == 0:
-            return []
-        self.betweenTable[ self.z ] = []
-        for boundaryLoop in self.boundaries:
-            self.betweenTable[ self.z ] += intercircle.getInsetLoopsFromLoop(boundaryLoop, self.betweenInset)
-        return self.betweenTable[ self.z ]
+        "Get the betweens for the layer, which are offset when they are first needed unless they were offset with those of all the layers."
+        if self.betweens == None:
+            self.betweens = getBetweens(self.boundaries, self.betweenInset)
+        return self.betweens
+
+    def getBoundaryIndex(self):
+        "Get the segment index of the boundaries for the layer, to find the boundaries crossed by the lines."
+        if self.boundaryIndex == None:
+            self.boundaryIndex = segment_index.SegmentIndex(self.boundaries)
+        return self.boundaryIndex
 
     def getIsAsFarAndNotIntersecting(self, begin, end):
         "Determine if the point on the line is at least as far from the loop as the center point."
@@ -58,7 +95,7 @@ class CombSkein:
             print('this should never happen but it does not really matter, begin == end in getIsAsFarAndNotIntersecting in comb.')
             print(begin)
             return True
-        return not euclidean.isLineIntersectingLoops(self.getBetweens(), begin, end)
+        return not self.getBetweenIndex().isLineIntersecting(begin, end)
 
     def getIsRunningJumpPathAdded(self, betweens, end, lastPoint, nearestEndMinusLastSegment, pathAround, penultimatePoint, runningJumpSpace):
         "Add a running jump path if possible, and return if it was added."
@@ -68,10 +105,11 @@ class CombSkein:
         pathAround[-1] = jumpStartPoint
         return True
 
-    def getPathsByIntersectedLoop(self, begin, end, loop):
+    def getPathsByIntersectedLoop(self, begin, end, loopIndex):
         "Get both paths along the loop from the point nearest to the begin to the point nearest to the end."
-        nearestBeginDistanceIndex = euclidean.getNearestDistanceIndex(begin, loop)
-        nearestEndDistanceIndex = euclidean.getNearestDistanceIndex(end, loop)
+        loop = self.boundaries[loopIndex]
+        nearestBeginDistanceIndex = self.getBoundaryIndex().getNearestDistanceIndex(begin, loopIndex)
+        nearestEndDistanceIndex = self.getBoundaryIndex().getNearestDistanceIndex(end, loopIndex)
         beginIndex = (nearestBeginDistanceIndex.index + 1) % len(loop)
         endIndex = (nearestEndDistanceIndex.index + 1) % len(loop)
         nearestBegin = euclidean.getNearestPointOnSegment(loop[ nearestBeginDistanceIndex.index ], loop[ beginIndex ], begin)
@@ -85,9 +123,10 @@ class CombSkein:
         widdershinsPath.append(nearestEnd)
         return [ clockwisePath, widdershinsPath ]
 
-    def getPathBetween(self, loop, points):
+    def getPathBetween(self, loopIndex, points):
         "Add a path between the perimeter and the fill."
-        paths = self.getPathsByIntersectedLoop(points[1], points[2], loop)
+        loop = self.boundaries[loopIndex]
+        paths = self.getPathsByIntersectedLoop(points[1], points[2], loopIndex)
         shortestPath = paths[int(euclidean.getPathLength(paths[1]) < euclidean.getPathLength(paths[0]))]
         if len(shortestPath) < 2:
             return shortestPath
@@ -116,11 +155,11 @@ class CombSkein:
                 between = center
             if between == None:
                 centerSideWiddershins = center + centerPerpendicular
-                if euclidean.isPointInsideLoop(loop, centerSideWiddershins) == loopWiddershins:
+                if self.getBoundaryIndex().isPointInsideLoop(centerSideWiddershins, loopIndex) == loopWiddershins:
                     between = centerSideWiddershins
             if between == None:
                 centerSideClockwise = center - centerPerpendicular
-                if euclidean.isPointInsideLoop(loop, centerSideClockwise) == loopWiddershins:
+                if self.getBoundaryIndex().isPointInsideLoop(centerSideClockwise, loopIndex) == loopWiddershins:
                     between = centerSideClockwise
             if between == None:
                 between = center
@@ -133,25 +172,15 @@ class CombSkein:
         aroundBetweenPath = []
         points = [begin]
         lineX = []
-        switchX = []
         segment = euclidean.getNormalized(end - begin)
         segmentYMirror = complex(segment.real, -segment.imag)
         beginRotated = segmentYMirror * begin
-        endRotated = segmentYMirror * end
         y = beginRotated.imag
 
-        for boundaryIndex in xrange(len(self.boundaries)):
-            boundary = self.boundaries[ boundaryIndex ]
-            boundaryRotated = euclidean.getPointsRoundZAxis(segmentYMirror, boundary)
-            euclidean.addXIntersectionIndexesFromLoopY(boundaryRotated, boundaryIndex, switchX, y)
-        switchX.sort()
-        maximumX = max(beginRotated.real, endRotated.real)
-        minimumX = min(beginRotated.real, endRotated.real)
-        for xIntersection in switchX:
-            if xIntersection.x > minimumX and xIntersection.x < maximumX:
-                point = segment * complex(xIntersection.x, y)
-                points.append(point)
-                lineX.append(xIntersection)
+        self.getBoundaryIndex().addXIntersectionIndexesFromLine(begin, end, lineX)
+        lineX.sort()
+        for xIntersection in lineX:
+            points.append(segment * complex(xIntersection.x, y))
         points.append(end)
         lineXIndex = 0
         while lineXIndex < len(lineX) - 1:
@@ -159,7 +188,7 @@ class CombSkein:
             lineXSecond = lineX[lineXIndex + 1]
             loopFirst = self.boundaries[lineXFirst.index]
             if lineXSecond.index == lineXFirst.index:
-                pathBetween = self.getPathBetween(loopFirst, points[lineXIndex : lineXIndex + 4])
+                pathBetween = self.getPathBetween(lineXFirst.index, points[lineXIndex : lineXIndex + 4])
                 pathBetween = self.getSimplifiedAroundPath(points[lineXIndex], points[lineXIndex + 3], loopFirst, pathBetween)
                 aroundBetweenPath += pathBetween
                 lineXIndex += 2
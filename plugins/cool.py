@@ -13,6 +13,7 @@ License:
 from config import config
 from fabmetheus_utilities import archive, euclidean, intercircle
 from entities import GcodeCommand
+from utilities import plugin_profiler
 import gcodes
 import logging
 from importlib import import_module
@@ -61,7 +62,7 @@ class CoolSkein:
         except Exception as inst:
             logger.warning("Exception reading strategy %s: %s", self.coolStrategyName, inst)
 
-        for layer in self.slicedModel.layers:
+        for layer in plugin_profiler.getTimedLayers(self.slicedModel.layers):
             for line in self.coolStartLines:
                 layer.preLayerGcodeCommands.append(line)
 
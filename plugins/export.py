@@ -13,12 +13,12 @@ License:
 from config import config
 from datetime import timedelta
 from fabmetheus_utilities import archive, euclidean
-from utilities import memory_tracker
+from utilities import memory_tracker, sliced_model_file
 from writers.gcode_writer import GcodeWriter
-from StringIO import StringIO
 import datetime
 import logging
 import os
+import re
 import string
 import time
 import sys
@@ -39,6 +39,18 @@ def performAction(slicedModel):
     if slicedModel.runtimeParameters.profileMemory:
         memory_tracker.create_snapshot("After export")
 
+def getReplaceRules(nameOfReplaceFile):
+    'Get the (search, replacement) rules of the replace.csv file in the alterations folder.'
+    fullReplaceFilePath = os.path.join('alterations', nameOfReplaceFile)
+    if nameOfReplaceFile == '' or not os.path.exists(fullReplaceFilePath):
+        return []
+    replaceRules = []
+    for replaceLine in archive.getTextLines(archive.getFileText(fullReplaceFilePath)):
+        splitLine = replaceLine.replace('\\n', '\t').split('\t')
+        if splitLine[0] != '':
+            replaceRules.append((splitLine[0], '\n'.join(splitLine[1 :])))
+    return replaceRules
+
 class ExportSkein:
     'A class to export a skein of extrusions.'
     def __init__(self, slicedModel):
@@ -49,33 +61,10 @@ class ExportSkein:
         self.nameOfReplaceFile = config.get(name, 'replace.filename')
         self.exportSlicedModel = config.getboolean(name, 'export.slicedmodel')
         self.exportSlicedModelExtension = config.get(name, 'export.slicedmodel.extension')
+        self.exportSlicedModelFormat = config.get(name, 'export.slicedmodel.format')
         self.addProfileExtension = config.getboolean(name, 'file.extension.profile')
         self.overwriteExportedSlicedModel = config.getboolean(name, 'overwrite.exported.slicedmodel')
 
-    def getReplaceableExportGcode(self, nameOfReplaceFile, replaceableExportGcode):
-        'Get text with strings replaced according to replace.csv file.'
-
-        fullReplaceFilePath = os.path.join('alterations', nameOfReplaceFile)
-
-        if self.nameOfReplaceFile == '' or not os.path.exists(fullReplaceFilePath):
-            return replaceableExportGcode
-
-        fullReplaceText = archive.getFileText(fullReplaceFilePath)
-        replaceLines = archive.getTextLines(fullReplaceText)
-        if len(replaceLines) < 1:
-            return replaceableExportGcode
-        for replaceLine in replaceLines:
-            splitLine = replaceLine.replace('\\n', '\t').split('\t')
-            if len(splitLine) > 0:
-                replaceableExportGcode = replaceableExportGcode.replace(splitLine[0], '\n'.join(splitLine[1 :]))
-        output = StringIO()
-
-        for line in archive.getTextLines(replaceableExportGcode):
-            if line != '':
-                output.write(line + '\n')
-
-        return output.getvalue()
-
     def export(self):
         'Perform final modifications to slicedModel and performs export.'
 
@@ -92,9 +81,7 @@ class ExportSkein:
             exportFileName += '.' + self.fileExtension
             self.slicedModel.runtimeParameters.outputFilename = exportFileName
 
-        replaceableExportGcode = self.getReplaceableExportGcode(self.nameOfReplaceFile, GcodeWriter(self.slicedModel).getSlicedModel())
-        archive.writeFileText(exportFileName, replaceableExportGcode)
-        logger.info('Gcode exported to: %s', os.path.basename(exportFileName))
+        self.writeGcode(exportFileName)
 
         if self.debug:
             slicedModelTextFilename = filenamePrefix
@@ -114,4 +101,83 @@ class ExportSkein:
                 os.rename(slicedModelExportFilename, backupFilename)
                 logger.info('Existing slicedmodel file backed up to: %s', backupFilename)
             logger.info('Sliced Model exported to: %s', slicedModelExportFilename)
-            archive.writeFileText(slicedModelExportFilename, pickle.dumps(self.slicedModel))
+            if self.exportSlicedModelFormat == 'pickle':
+                # Layers read lazily from a sliced model file are loaded into a list, as the memory mapped file can not be pickled.
+                self.slicedModel.layers = list(self.slicedModel.layers)
+                archive.writeFileText(slicedModelExportFilename, pickle.dumps(self.slicedModel, pickle.HIGHEST_PROTOCOL))
+            else:
+                sliced_model_file.writeSlicedModel(self.slicedModel, slicedModelExportFilename)
+
+    def writeGcode(self, exportFileName):
+        'Write the gcode to the file layer by layer, replacing strings line by line according to the replace.csv file.'
+        try:
+            exportFile = open(exportFileName, 'w')
+        except IOError:
+            logger.error('The file %s can not be written to.', exportFileName)
+            return
+        output = exportFile
+        replaceRules = getReplaceRules(self.nameOfReplaceFile)
+        if len(replaceRules) > 0:
+            output = ReplaceLineWriter(exportFile, replaceRules)
+        try:
+            GcodeWriter(self.slicedModel).writeSlicedModel(output, keepGcodeCommands=self.debug)
+            output.flush()
+        finally:
+            exportFile.close()
+        logger.info('Gcode exported to: %s', os.path.basename(exportFileName))
+
+class ReplaceLineWriter:
+    'A file-like writer which applies the replace rules to each line of the text written to it, and drops the lines which become empty.'
+    def __init__(self, output, replaceRules, bufferSize=65536):
+        self.bufferSize = bufferSize
+        self.output = output
+        self.replaceRules = replaceRules
+        self.searchPattern = re.compile('|'.join([re.escape(search) for search, replacement in replaceRules]))
+        self.texts = []
+        self.textsLength = 0
+
+    def flush(self):
+        'Write all the text, even if its last line is not complete.'
+        text = ''.join(self.texts).replace('\r', '\n')
+        self.texts = []
+        self.textsLength = 0
+        if not text.endswith('\n'):
+            text += '\n'
+        self.writeLines(text)
+
+    def write(self, text):
+        'Buffer the text, and when the buffer is full write its complete lines.'
+        self.texts.append(text)
+        self.textsLength += len(text)
+        if self.textsLength < self.bufferSize:
+            return
+        text = ''.join(self.texts).replace('\r', '\n')
+        lineEnd = text.rfind('\n') + 1
+        self.texts = [text[lineEnd :]]
+        self.textsLength = len(self.texts[0])
+        self.writeLines(text[: lineEnd])
+
+    def writeLine(self, line):
+        'Write the line with the replace rules applied one after the other.'
+        for search, replacement in self.replaceRules:
+            line = line.replace(search, replacement)
+        self.writeUnreplacedLines(line + '\n')
+
+    def writeLines(self, text):
+        'Write the complete lines of the text, finding the lines which any rule could replace in a single search of all the rules.'
+        beginIndex = 0
+        match = self.searchPattern.search(text)
+        while match != None:
+            lineBegin = text.rfind('\n', 0, match.start()) + 1
+            lineEnd = text.find('\n', match.end())
+            self.writeUnreplacedLines(text[beginIndex : lineBegin])
+            self.writeLine(text[lineBegin : lineEnd])
+            beginIndex = lineEnd + 1
+            match = self.searchPattern.search(text, beginIndex)
+        self.writeUnreplacedLines(text[beginIndex :])
+
+    def writeUnreplacedLines(self, text):
+        'Write the complete lines of the text without the empty lines.'
+        if text.startswith('\n') or '\n\n' in text:
+            text = ''.join([line + '\n' for line in text.split('\n') if line != ''])
+        self.output.write(text)
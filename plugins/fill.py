@@ -12,14 +12,23 @@ License:
 
 from config import config
 from importlib import import_module
-from utilities import memory_tracker
+from utilities import layer_executor, memory_tracker, plugin_profiler
 import logging
-import math
 import sys
 
 logger = logging.getLogger(__name__)
 name = __name__
 
+def getFillStates(fillStrategy, layerIndexExtraShells):
+    'Fill a layer in a worker of a multiprocess fill and get the fill states of its nested rings.'
+    layerIndex, extraShells = layerIndexExtraShells
+    layer = fillStrategy.slicedModel.layers[layerIndex]
+    fillStrategy.addFill(layer, extraShells)
+    fillStates = []
+    for nestedRing in layer.nestedRings:
+        nestedRing.addFillStates(fillStates)
+    return fillStates
+
 def performAction(slicedModel):
     'Fills the perimeters.'
     if not config.getboolean(name, 'active'):
@@ -40,6 +49,8 @@ class FillSkein:
         self.extrusionWidth = config.getfloat('carve', 'extrusion.width')
         self.fillStrategyName = config.get(name, 'strategy')
         self.fillStrategyPath = config.get(name, 'strategy.path')
+        self.multiprocess = config.getboolean(name, 'multiprocess')
+        self.processes = config.getint(name, 'multiprocess.processes')
 
     def fill(self):
         'Fills the layers.'
@@ -58,7 +69,27 @@ class FillSkein:
         except Exception as inst:
             logger.warning("Exception reading strategy %s: %s", self.fillStrategyName, inst)
 
-        for layer in self.slicedModel.layers:
+        if fillStrategy == None:
+            return
+
+        fillProcesses = layer_executor.getProcesses(self.multiprocess, self.processes)
+        if fillProcesses > 1 and len(self.slicedModel.layers) > 1 and hasattr(fillStrategy, 'addFill'):
+            self.fillByProcesses(fillStrategy, fillProcesses)
+            return
+
+        for layer in plugin_profiler.getTimedLayers(self.slicedModel.layers):
+            fillStrategy.fill(layer)
 
-            if fillStrategy != None:
-                fillStrategy.fill(layer)
+    def fillByProcesses(self, fillStrategy, fillProcesses):
+        'Fill ranges of layers in worker processes, then order the fill of each layer into threads in layer order.'
+        layers = self.slicedModel.layers
+        # The extra shells and the threads depend on the layer before, so they are done in order here rather than in the workers.
+        layerIndexesExtraShells = [(layerIndex, fillStrategy.getExtraShells(layer)) for layerIndex, layer in enumerate(layers)]
+        # The workers are forked with the unfilled layers, from which they read the boundaries of the surrounding layers.
+        layersFillStates = layer_executor.getLayerResults(getFillStates, layerIndexesExtraShells, fillProcesses, fillStrategy)
+        for layer, fillStates in zip(layers, layersFillStates):
+            fillStateIterator = iter(fillStates)
+            for nestedRing in layer.nestedRings:
+                nestedRing.setFillStates(fillStateIterator)
+        for layer in layers:
+            fillStrategy.addThreadsBridgeLayer(layer.index, layer.nestedRings, layer)
@@ -11,23 +11,32 @@ License:
 """
 
 from config import config, config
-from fabmetheus_utilities import archive, euclidean, intercircle
+from fabmetheus_utilities import archive, euclidean, intercircle, polygon_offset, segment_index
 from fabmetheus_utilities.geometry.solids import triangle_mesh
 from entities import NestedRing, Layer, GcodeCommand,  BoundaryPerimeter
-from multiprocessing import Pool, Manager, Process
-from utilities import class_pickler
-import copy_reg
+from utilities import layer_executor, plugin_profiler
 import logging
 import math
-import multiprocessing
 import os
 import sys
-import types
 from utilities import memory_tracker
 
 logger = logging.getLogger(__name__)
 name = __name__
 
+def addNestedRingsInInsetOrder(nestedRing, insetOrderedRings):
+    "Add the nested ring after its inner nested rings, in the order in which they are inset."
+    # Note: inner nested rings have to come first so the intersecting check of the inset does not give a false positive
+    for innerNestedRing in nestedRing.innerNestedRings:
+        addNestedRingsInInsetOrder(innerNestedRing, insetOrderedRings)
+    insetOrderedRings.append(nestedRing)
+
+def getPerimeterPathsArrays(insetSkein, layerArguments):
+    "Get the compact arrays of the perimeter paths of each boundary of a layer, in a worker of a multiprocess inset."
+    halfWidth, boundariesArray = layerArguments
+    boundaries = layer_executor.getLoopsFromArray(boundariesArray)
+    return [layer_executor.getLoopsArray(perimeterPaths) for perimeterPaths in insetSkein.getPerimeterPathsByBoundaries(boundaries, halfWidth)]
+
 def performAction(slicedModel):
     "Inset the slicedModel."
 
@@ -53,70 +62,88 @@ class InsetSkein:
         self.halfPerimeterWidth = 0.5 * self.perimeterWidth
         self.overlapRemovalWidth = self.perimeterWidth * (0.7853) * self.overlapRemovalWidthOverPerimeterWidth
         self.multiprocess = config.getboolean(name, 'multiprocess')
+        self.processes = config.getint(name, 'multiprocess.processes')
 
     def inset(self):
         "Inset the layers"
-
-        if self.multiprocess:
-            manager = Manager()
-            sharedLayers = manager.list(self.slicedModel.layers)
-
-            p = Pool()
-            resultLayers = p.map(self.addInsetForLayer, sharedLayers)
-            p.close()
-            p.join()
-
-            for resultLayer in resultLayers:
-                self.slicedModel.layers[resultLayer.index] = resultLayer
-
-        else:
-
-            for layer in self.slicedModel.layers:
-                self.addInsetForLayer(layer)
+        insetProcesses = layer_executor.getProcesses(self.multiprocess, self.processes)
+        if insetProcesses > 1 and len(self.slicedModel.layers) > 1:
+            self.insetByProcesses(insetProcesses)
+            return
+        for layer in plugin_profiler.getTimedLayers(self.slicedModel.layers):
+            self.addInsetForLayer(layer)
+
+    def insetByProcesses(self, insetProcesses):
+        "Inset the layers in worker processes, which are sent the boundaries of each layer and send back its perimeter paths."
+        layersNestedRings = []
+        layerArguments = []
+        for layer in self.slicedModel.layers:
+            nestedRings = self.getNestedRingsInInsetOrder(layer)
+            boundaries = [nestedRing.getXYBoundaries() for nestedRing in nestedRings]
+            layersNestedRings.append(nestedRings)
+            layerArguments.append((self.getHalfWidth(layer), layer_executor.getLoopsArray(boundaries)))
+        layerResults = layer_executor.getLayerResults(getPerimeterPathsArrays, layerArguments, insetProcesses, self)
+        for nestedRings, perimeterPathsArrays in zip(layersNestedRings, layerResults):
+            for nestedRing, perimeterPathsArray in zip(nestedRings, perimeterPathsArrays):
+                for perimeterPath in layer_executor.getLoopsFromArray(perimeterPathsArray):
+                    nestedRing.perimeter.addPath(perimeterPath)
 
     def addInsetForLayer(self, layer):
-        halfWidth = self.halfPerimeterWidth * 0.7853
-        if layer.bridgeRotation != None:
-            halfWidth = self.bridgeWidthMultiplier * ((2 * self.nozzleDiameter - self.layerThickness) / 2) * 0.7853
+        "Add the perimeter paths of the nested rings of the layer."
+        nestedRings = self.getNestedRingsInInsetOrder(layer)
+        boundaries = [nestedRing.getXYBoundaries() for nestedRing in nestedRings]
+        for nestedRing, perimeterPaths in zip(nestedRings, self.getPerimeterPathsByBoundaries(boundaries, self.getHalfWidth(layer))):
+            for perimeterPath in perimeterPaths:
+                nestedRing.perimeter.addPath(perimeterPath)
+        return layer
 
-        alreadyFilledArounds = []
+    def getHalfWidth(self, layer):
+        "Get the inset width of the layer, which is wider for a bridge layer."
+        if layer.bridgeRotation != None:
+            return self.bridgeWidthMultiplier * ((2 * self.nozzleDiameter - self.layerThickness) / 2) * 0.7853
+        return self.halfPerimeterWidth * 0.7853
 
+    def getNestedRingsInInsetOrder(self, layer):
+        "Get the nested rings of the layer, each after its inner nested rings."
+        insetOrderedRings = []
         for nestedRing in layer.nestedRings:
-            self.addInset(nestedRing, halfWidth, alreadyFilledArounds)
-        return layer
-
-    def addInset(self, nestedRing, halfWidth, alreadyFilledArounds):
-        "Add inset to the layer."
+            addNestedRingsInInsetOrder(nestedRing, insetOrderedRings)
+        return insetOrderedRings
 
-        # Note: inner nested rings have to come first so the intersecting check below does not give a false positive
-        for innerNestedRing in nestedRing.innerNestedRings:
-            self.addInset(innerNestedRing, halfWidth, alreadyFilledArounds)
+    def getPerimeterPathsByBoundaries(self, boundaries, halfWidth):
+        "Get the perimeter paths of each boundary of a layer, with the boundaries in inset order."
+        alreadyFilledArounds = []
+        aroundIndex = segment_index.SegmentIndex(cellWidth=self.overlapRemovalWidth)
+        return [self.getPerimeterPaths(boundary, halfWidth, alreadyFilledArounds, aroundIndex) for boundary in boundaries]
 
-        boundary = [nestedRing.getXYBoundaries()]
-        insetBoundaryPerimeter = intercircle.getInsetLoopsFromLoops(halfWidth, boundary)
+    def getPerimeterPaths(self, boundary, halfWidth, alreadyFilledArounds, aroundIndex):
+        "Get the perimeter paths of the inset of a boundary."
+        boundary = [boundary]
+        insetBoundaryPerimeter = polygon_offset.getInsetLoopsFromLoops(halfWidth, boundary)
 
         triangle_mesh.sortLoopsInOrderOfArea(not self.loopOrderAscendingArea, insetBoundaryPerimeter)
 
+        perimeterPaths = []
         for loop in insetBoundaryPerimeter:
             centerOutset = intercircle.getLargestCenterOutsetLoopFromLoopRegardless(loop, halfWidth)
 
             "Add the perimeter block remainder of the loop which does not overlap the alreadyFilledArounds loops."
             if self.overlapRemovalWidthOverPerimeterWidth < 0.1:
-                nestedRing.perimeter.addPath(centerOutset.center + [centerOutset.center[0]])
+                perimeterPaths.append(centerOutset.center + [centerOutset.center[0]])
                 break
             isIntersectingSelf = isIntersectingItself(centerOutset.center, self.overlapRemovalWidth)
 
-            if isIntersectingWithinLists(centerOutset.center, alreadyFilledArounds) or isIntersectingSelf:
-                self.addGcodeFromPerimeterPaths(nestedRing, isIntersectingSelf, centerOutset.center, alreadyFilledArounds, halfWidth, boundary)
+            if isIntersectingWithinLists(centerOutset.center, alreadyFilledArounds, aroundIndex) or isIntersectingSelf:
+                self.addGcodeFromPerimeterPaths(perimeterPaths, isIntersectingSelf, centerOutset.center, alreadyFilledArounds, halfWidth, boundary)
             else:
-                nestedRing.perimeter.addPath(centerOutset.center + [centerOutset.center[0]])
-            addAlreadyFilledArounds(alreadyFilledArounds, centerOutset.center, self.overlapRemovalWidth)
-
+                perimeterPaths.append(centerOutset.center + [centerOutset.center[0]])
+            addAlreadyFilledArounds(alreadyFilledArounds, aroundIndex, centerOutset.center, self.overlapRemovalWidth)
+        return perimeterPaths
 
-    def addGcodeFromPerimeterPaths(self, nestedRing, isIntersectingSelf, loop, alreadyFilledArounds, halfWidth, boundary):
-        "Add the perimeter paths to the output."
+    def addGcodeFromPerimeterPaths(self, insetPerimeterPaths, isIntersectingSelf, loop, alreadyFilledArounds, halfWidth, boundary):
+        "Add the perimeter paths which are not already filled to the inset perimeter paths."
         segments = []
-        outlines = []
+        outlineIndex = segment_index.SegmentIndex(cellWidth=self.overlapRemovalWidth)
         thickOutlines = []
         allLoopLists = alreadyFilledArounds[:] + [thickOutlines]
         aroundLists = alreadyFilledArounds
@@ -124,11 +151,11 @@ class InsetSkein:
             pointBegin = loop[pointIndex]
             pointEnd = loop[(pointIndex + 1) % len(loop)]
             if isIntersectingSelf:
-                if euclidean.isLineIntersectingLoops(outlines, pointBegin, pointEnd):
+                if outlineIndex.isLineIntersecting(pointBegin, pointEnd):
                     segments += getSegmentsFromLoopListsPoints(allLoopLists, pointBegin, pointEnd)
                 else:
                     segments += getSegmentsFromLoopListsPoints(alreadyFilledArounds, pointBegin, pointEnd)
-                addSegmentOutline(False, outlines, pointBegin, pointEnd, self.overlapRemovalWidth)
+                addSegmentOutlineToIndex(False, outlineIndex, pointBegin, pointEnd, self.overlapRemovalWidth)
                 addSegmentOutline(True, thickOutlines, pointBegin, pointEnd, self.overlapRemovalWidth)
             else:
                 segments += getSegmentsFromLoopListsPoints(alreadyFilledArounds, pointBegin, pointEnd)
@@ -152,10 +179,10 @@ class InsetSkein:
         muchGreaterThanRadius = 6.0 * halfWidth
         for perimeterPath in perimeterPaths:
             if euclidean.getPathLength(perimeterPath) > muchGreaterThanRadius:
-                nestedRing.perimeter.addPath(perimeterPath)
+                insetPerimeterPaths.append(perimeterPath)
 
-def addAlreadyFilledArounds(alreadyFilledArounds, loop, radius):
-    "Add already filled loops around loop to alreadyFilledArounds."
+def addAlreadyFilledArounds(alreadyFilledArounds, aroundIndex, loop, radius):
+    "Add already filled loops around loop to alreadyFilledArounds and to their segment index."
     radius = abs(radius)
     alreadyFilledLoop = []
     slightlyGreaterThanRadius = 1.01 * radius
@@ -167,6 +194,7 @@ def addAlreadyFilledArounds(alreadyFilledArounds, loop, radius):
             alreadyFilledLoop.append(alreadyFilledInset)
     if len(alreadyFilledLoop) > 0:
         alreadyFilledArounds.append(alreadyFilledLoop)
+        aroundIndex.addLoops(alreadyFilledLoop)
 
 def addSegmentOutline(isThick, outlines, pointBegin, pointEnd, width):
     "Add a diamond or hexagonal outline for a line segment."
@@ -220,6 +248,12 @@ def addSegmentOutline(isThick, outlines, pointBegin, pointEnd, width):
         outline.append(outsideBeginCenterDown)
     outlines.append(euclidean.getPointsRoundZAxis(normalizedSegment, outline))
 
+def addSegmentOutlineToIndex(isThick, outlineIndex, pointBegin, pointEnd, width):
+    "Add the outline for a line segment to the segment index of the outlines."
+    outlines = []
+    addSegmentOutline(isThick, outlines, pointBegin, pointEnd, width)
+    outlineIndex.addLoops(outlines)
+
 def getInteriorSegments(loops, segments):
     'Get segments inside the loops.'
     interiorSegments = []
@@ -229,15 +263,6 @@ def getInteriorSegments(loops, segments):
             interiorSegments.append(segment)
     return interiorSegments
 
-def getIsIntersectingWithinList(loop, loopList):
-    "Determine if the loop is intersecting or is within the loop list."
-    leftPoint = euclidean.getLeftPoint(loop)
-    for otherLoop in loopList:
-        if euclidean.getNumberOfIntersectionsToLeft(otherLoop, leftPoint) % 2 == 1:
-            return True
-    return euclidean.isLoopIntersectingLoops(loop, loopList)
-
-
 def getSegmentsFromLoopListsPoints(loopLists, pointBegin, pointEnd):
     "Get endpoint segments from the beginning and end of a line segment."
     normalizedSegment = pointEnd - pointBegin
@@ -274,20 +299,20 @@ def isCloseToLast(paths, point, radius):
 
 def isIntersectingItself(loop, width):
     "Determine if the loop is intersecting itself."
-    outlines = []
+    outlineIndex = segment_index.SegmentIndex(cellWidth=width)
     for pointIndex in xrange(len(loop)):
         pointBegin = loop[pointIndex]
         pointEnd = loop[(pointIndex + 1) % len(loop)]
-        if euclidean.isLineIntersectingLoops(outlines, pointBegin, pointEnd):
+        if outlineIndex.isLineIntersecting(pointBegin, pointEnd):
             return True
-        addSegmentOutline(False, outlines, pointBegin, pointEnd, width)
+        addSegmentOutlineToIndex(False, outlineIndex, pointBegin, pointEnd, width)
     return False
 
-def isIntersectingWithinLists(loop, loopLists):
-    "Determine if the loop is intersecting or is within the loop lists."
+def isIntersectingWithinLists(loop, loopLists, loopListsIndex):
+    "Determine if the loop is within the loop lists or is intersecting them, whose loops are all in the segment index."
+    leftPoint = euclidean.getLeftPoint(loop)
     for loopList in loopLists:
-        if getIsIntersectingWithinList(loop, loopList):
-            return True
-    return False
-
-copy_reg.pickle(types.MethodType, class_pickler._pickle_method, class_pickler._unpickle_method)
+        for otherLoop in loopList:
+            if euclidean.getNumberOfIntersectionsToLeft(otherLoop, leftPoint) % 2 == 1:
+                return True
+    return loopListsIndex.isLoopIntersecting(loop)
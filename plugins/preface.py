@@ -59,39 +59,25 @@ class PrefaceSkein:
             layer.bridgeRotation = complex(rotatedLoopLayer.rotation)
 
         loops = rotatedLoopLayer.loops
-        internalLoops = self.createLoopHierarchy(loops)
+        enclosingLoopIndexes = self.createLoopHierarchy(loops)
 
-        nestRingPlaceholder = {}
+        nestedRings = []
         for loop in loops:
             nestedRing = NestedRing(self.slicedModel.runtimeParameters)
             nestedRing.setBoundaryPerimeter(loop)
-            nestRingPlaceholder[str(loop)] = nestedRing
+            nestedRings.append(nestedRing)
 
-        for internalLoop in internalLoops:
-            parent = internalLoops[internalLoop]
-            child = loops[internalLoop]
-            childNestedRing = nestRingPlaceholder[str(loops[internalLoop])]
-
-            if parent == None:
-                layer.addNestedRing(childNestedRing)
+        for (loopIndex, enclosingLoopIndex) in enumerate(enclosingLoopIndexes):
+            if enclosingLoopIndex == None:
+                layer.addNestedRing(nestedRings[loopIndex])
             else:
-                parentNestedRing = nestRingPlaceholder[str(internalLoops[internalLoop])]
-                parentNestedRing.innerNestedRings.append(childNestedRing)
+                nestedRings[enclosingLoopIndex].innerNestedRings.append(nestedRings[loopIndex])
 
         self.slicedModel.layers.append(layer)
 
     def createLoopHierarchy(self, loops):
-        internalLoops = {}
-
-        for (loopIndex, loop) in enumerate(loops):
-            internalLoops[loopIndex] = []
-            otherLoops = []
-            for beforeIndex in xrange(loopIndex):
-                otherLoops.append(loops[beforeIndex])
-            for afterIndex in xrange(loopIndex + 1, len(loops)):
-                otherLoops.append(loops[afterIndex])
-            internalLoops[loopIndex] = euclidean.getClosestEnclosingLoop(otherLoops, loop)
-        return internalLoops
+        "Get the index of the loop which directly encloses each loop, or None for an outermost loop."
+        return euclidean.getClosestEnclosingLoopIndexes(loops)
 
     def addStartCommandsToGcode(self):
         if config.get(name, 'start.file') != None:
@@ -11,7 +11,7 @@ License:
 """
 
 from config import config
-from fabmetheus_utilities import euclidean, intercircle
+from fabmetheus_utilities import euclidean, intercircle, polygon_offset
 from fabmetheus_utilities.geometry.solids import triangle_mesh
 from entities import SupportPath
 import logging
@@ -124,7 +124,7 @@ class SkirtSkein:
 
         skirtLoops = []
         for shellNo in xrange(shellCount):
-            outsetLoops = intercircle.getInsetSeparateLoopsFromLoops(-(outset + self.edgeWidth * shellNo), outerLoops)
+            outsetLoops = polygon_offset.getInsetSeparateLoopsFromLoops(-(outset + self.edgeWidth * shellNo), outerLoops)
             outsetLoops = self.getOuterLoops(outsetLoops)
             if self.convex:
                 outsetLoops = [euclidean.getLoopConvex(euclidean.getConcatenatedList(outsetLoops))]
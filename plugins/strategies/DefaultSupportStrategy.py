@@ -12,7 +12,7 @@ License:
 """
 
 from config import config
-from fabmetheus_utilities import archive, euclidean, intercircle
+from fabmetheus_utilities import archive, euclidean, intercircle, polygon_offset
 from fabmetheus_utilities.geometry.solids import triangle_mesh
 from fabmetheus_utilities.vector3 import Vector3
 from entities import SupportPath
@@ -122,7 +122,7 @@ class SupportSkein:
 
         for boundaryLayer in self.boundaryLayers:
             # thresholdRadius of 0.8 is needed to avoid the ripple inset bug http://hydraraptor.blogspot.com/2010/12/crackers.html
-            supportLoops = intercircle.getInsetSeparateLoopsFromLoops(-self.supportOutset, boundaryLayer, 0.8)
+            supportLoops = polygon_offset.getInsetSeparateLoopsFromLoops(-self.supportOutset, boundaryLayer, 0.8)
             supportLayer = SupportLayer(supportLoops)
             self.supportLayers.append(supportLayer)
 
@@ -196,7 +196,7 @@ class SupportSkein:
         boundaryLayer = self.boundaryLayers[layerIndex]
         rise = self.slicedModel.layers[layerIndex + 1 ].z - self.slicedModel.layers[layerIndex].z
 
-        outsetSupportLoops = intercircle.getInsetSeparateLoopsFromLoops(-self.minimumSupportRatio * rise, boundaryLayer)
+        outsetSupportLoops = polygon_offset.getInsetSeparateLoopsFromLoops(-self.minimumSupportRatio * rise, boundaryLayer)
         numberOfSubSteps = 4
         subStepSize = self.interfaceStep / float(numberOfSubSteps)
         aboveIntersectionsTable = {}
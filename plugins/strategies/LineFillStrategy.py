@@ -11,7 +11,7 @@ License:
 """
 
 from config import config
-from fabmetheus_utilities import archive, euclidean, intercircle
+from fabmetheus_utilities import archive, euclidean, intercircle, pixel_grid, polygon_offset
 from fabmetheus_utilities.vector3 import Vector3
 import logging
 import math
@@ -52,39 +52,33 @@ class LineFillStrategy:
 
     def fill(self, layer):
         'Add fill to the carve layer.'
+        self.addFill(layer, self.getExtraShells(layer))
+        self.addThreadsBridgeLayer(layer.index, layer.nestedRings, layer)
+
+    def addFill(self, layer, extraShells):
+        'Add the extra loops and the infill paths to the nested rings of the carve layer, without ordering them into threads.'
         layerIndex = layer.index
         alreadyFilledArounds = []
-        pixelTable = {}
         arounds = []
         betweenWidth = self.extrusionWidth / 1.7594801994   # this really sucks I cant find hwe#(self.repository.infillWidthOverThickness.value * self.extrusionWidth *(0.7853))/1.5 #- 0.0866#todo todo TODO *0.5 is the distance between the outer loops..
-        self.layerExtrusionWidth = self.infillWidth # spacing between fill lines
+        self.layerExtrusionWidth = self.getLayerExtrusionWidth(layer) # spacing between fill lines
         layerFillInset = self.infillWidth  # the distance between perimeter incl loops and the fill pattern
 
         layerRotation = self.getLayerRotation(layerIndex, layer)
         reverseRotation = complex(layerRotation.real, -layerRotation.imag)
         surroundingCarves = []
-        layerRemainder = layerIndex % self.diaphragmPeriod
-        extraShells = self.extraShellsSparseLayer
 
-        if layerRemainder >= self.diaphragmThickness and layer.bridgeRotation == None:
+        if self.isSurroundedBySolidLayers(layer):
             for surroundingIndex in xrange(1, self.solidSurfaceThickness + 1):
                 self.addRotatedCarve(layerIndex, -surroundingIndex, reverseRotation, surroundingCarves)
                 self.addRotatedCarve(layerIndex, surroundingIndex, reverseRotation, surroundingCarves)
 
-        if len(surroundingCarves) < self.doubleSolidSurfaceThickness:
-            extraShells = self.extraShellsAlternatingSolidLayer
-            if self.previousExtraShells != self.extraShellsBase:
-                extraShells = self.extraShellsBase
-
         if layer.bridgeRotation != None:
-            extraShells = 0
             betweenWidth *= self.bridgeWidthMultiplier#/0.7853  #todo check what is better with or without the normalizer
-            self.layerExtrusionWidth *= self.bridgeWidthMultiplier
             layerFillInset *= self.bridgeWidthMultiplier
 
         aroundInset = 0.25 * self.layerExtrusionWidth
         aroundWidth = 0.25 * self.layerExtrusionWidth
-        self.previousExtraShells = extraShells
         gridPointInsetX = 0.5 * layerFillInset
         doubleExtrusionWidth = 2.0 * self.layerExtrusionWidth
         endpoints = []
@@ -107,10 +101,13 @@ class LineFillStrategy:
         slightlyGreaterThanFill = 1.001 * layerFillInset #todo was 1.01 ACT 0.95  How much the parallel fill is filled
 
         for loop in fillLoops:
+            rotatedLoops.append(euclidean.getPointsRoundZAxis(reverseRotation, loop))
+
+        pixelTable = pixel_grid.getPixelTable(rotatedLoops, aroundWidth)
+
+        for planeRotatedPerimeter in rotatedLoops:
             alreadyFilledLoop = []
             alreadyFilledArounds.append(alreadyFilledLoop)
-            planeRotatedPerimeter = euclidean.getPointsRoundZAxis(reverseRotation, loop)
-            rotatedLoops.append(planeRotatedPerimeter)
             centers = intercircle.getCentersFromLoop(planeRotatedPerimeter, slightlyGreaterThanFill)
             euclidean.addLoopToPixelTable(planeRotatedPerimeter, pixelTable, aroundWidth)
             for center in centers:
@@ -124,7 +121,6 @@ class LineFillStrategy:
                         euclidean.addLoopToPixelTable(around, pixelTable, aroundWidth)
 
         if len(arounds) < 1:
-            self.addThreadsBridgeLayer(layerIndex, nestedRings, layer)
             return
 
         back = euclidean.getBackOfLoops(arounds)
@@ -166,8 +162,6 @@ class LineFillStrategy:
         for nestedRing in nestedRings:
             nestedRing.transferPaths(infillPaths)
 
-        self.addThreadsBridgeLayer(layerIndex, nestedRings, layer)
-
     def addRotatedCarve(self, currentLayer, layerDelta, reverseRotation, surroundingCarves):
         'Add a rotated carve to the surrounding carves.'
         layerIndex = currentLayer + layerDelta
@@ -182,14 +176,14 @@ class LineFillStrategy:
             planeRotatedLoop = euclidean.getPointsRoundZAxis(reverseRotation, nestedRing.getXYBoundaries())
             rotatedCarve.append(planeRotatedLoop)
         outsetRadius = float(abs(layerDelta)) * self.extrusionWidth #todo investigate was   float(abs(layerDelta)) * self.layerThickness
-        rotatedCarve = intercircle.getInsetSeparateLoopsFromLoops(-outsetRadius, rotatedCarve)
+        rotatedCarve = polygon_offset.getInsetSeparateLoopsFromLoops(-outsetRadius, rotatedCarve)
         surroundingCarves.append(rotatedCarve)
 
     def addThreadsBridgeLayer(self, layerIndex, nestedRings, rotatedLayer):
         'Add the threads, add the bridge end & the layer end tag.'
         if self.oldOrderedLocation == None or self.startFromChoice == "LowerLeft":
             self.oldOrderedLocation = getLowerLeftCorner(nestedRings)
-        extrusionHalfWidth = 0.5 * self.layerExtrusionWidth
+        extrusionHalfWidth = 0.5 * self.getLayerExtrusionWidth(rotatedLayer)
         threadSequence = self.threadSequence
         if layerIndex < 1:
             threadSequence = ['perimeter', 'loops', 'infill']
@@ -197,6 +191,30 @@ class LineFillStrategy:
         for nestedRing in nestedRings:
             nestedRing.addToThreads(extrusionHalfWidth, self.oldOrderedLocation, threadSequence)
 
+    def getExtraShells(self, layer):
+        'Get the number of extra shells of the layer, which depends on that of the layer before, so the layers must be given in order.'
+        numberOfSurroundingCarves = 0
+        if self.isSurroundedBySolidLayers(layer):
+            for surroundingIndex in xrange(1, self.solidSurfaceThickness + 1):
+                for surroundingLayerIndex in [layer.index - surroundingIndex, layer.index + surroundingIndex]:
+                    if surroundingLayerIndex >= 0 and surroundingLayerIndex < len(self.slicedModel.layers):
+                        numberOfSurroundingCarves += 1
+        extraShells = self.extraShellsSparseLayer
+        if numberOfSurroundingCarves < self.doubleSolidSurfaceThickness:
+            extraShells = self.extraShellsAlternatingSolidLayer
+            if self.previousExtraShells != self.extraShellsBase:
+                extraShells = self.extraShellsBase
+        if layer.bridgeRotation != None:
+            extraShells = 0
+        self.previousExtraShells = extraShells
+        return extraShells
+
+    def getLayerExtrusionWidth(self, layer):
+        'Get the spacing between the fill lines of the layer.'
+        if layer.bridgeRotation != None:
+            return self.infillWidth * self.bridgeWidthMultiplier
+        return self.infillWidth
+
     def getLayerRotation(self, layerIndex, rotatedLayer):
         'Get the layer rotation.'
         rotation = rotatedLayer.bridgeRotation
@@ -206,6 +224,10 @@ class LineFillStrategy:
         layerAngle = self.infillBeginRotation + infillOddLayerRotationMultiplier * self.infillOddLayerExtraRotation
         return euclidean.getWiddershinsUnitPolar(layerAngle)
 
+    def isSurroundedBySolidLayers(self, layer):
+        'Determine if the fill of the layer depends on the carves of the solid layers around it, which it does unless it is a bridge or a diaphragm.'
+        return layer.index % self.diaphragmPeriod >= self.diaphragmThickness and layer.bridgeRotation == None
+
 def addPathToInfillPaths(infillWidth, infillPaths, path, rotationPlaneAngle):
     'Add simplified path to fill.'
     simplifiedPath = euclidean.getSimplifiedPath(path, infillWidth)
@@ -301,8 +323,10 @@ def getAdditionalLength(path, point, pointIndex):
         return abs(point - path[-1])
     return abs(point - path[pointIndex - 1]) + abs(point - path[pointIndex]) - abs(path[pointIndex] - path[pointIndex - 1])
 
-def getExtraFillLoops(loops, radius):
-    'Get extra loops between inside and outside loops. Extra perimeters'
+def getBackendExtraFillLoops(loops, radius, thresholdRatio=0.9):
+    'Get extra loops between inside and outside loops with the offset backend. Extra perimeters'
+    if polygon_offset.getBackend() != 'intercircle':
+        return polygon_offset.getBackendInsetSeparateLoops(loops, radius)
     greaterThanRadius = radius / 0.7853  #todo was  *1.4 ACT (radius /0.7853)  how much the tight spots are covered by the extra loops
     extraFillLoops = []
     centers = intercircle.getCentersFromPoints(intercircle.getPointsFromLoops(loops, greaterThanRadius), greaterThanRadius)
@@ -314,6 +338,10 @@ def getExtraFillLoops(loops, radius):
                 extraFillLoops.append(inset)
     return extraFillLoops
 
+def getExtraFillLoops(loops, radius):
+    'Get extra loops between inside and outside loops, from the offset cache if it holds them. Extra perimeters'
+    return polygon_offset.getCachedLoops('extraFill', getBackendExtraFillLoops, loops, radius)
+
 def getLowerLeftCorner(nestedRings):
     'Get the lower left corner from the nestedRings.'
     lowerLeftCorner = Vector3()
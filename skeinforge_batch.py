@@ -0,0 +1,185 @@
+#!/usr/bin/python
+"""
+Skeins the models of a manifest of jobs into gcode, in a pool of worker processes.
+
+The manifest is a csv file with a model, and optionally a profile and an output filename, on each line:
+    parts/bracket.stl,profiles/fine.profile,out/bracket_fine.gcode
+    parts/bracket.stl,profiles/draft.profile,out/bracket_draft.gcode
+    parts/knob.stl
+Blank lines and lines starting with # are skipped, and relative paths are relative to the manifest.
+
+The jobs of a model run one after the other in the same worker, which parses the model once for all of its profiles.
+Each worker imports the engine and the plugins once and reads the configuration afresh for every job.
+The status and duration of every job are written to a summary csv file.
+"""
+
+from config import config
+from datetime import timedelta
+from utilities import mesh_cache
+import Queue
+import argparse
+import csv
+import logging
+import multiprocessing
+import os
+import skeinforge_engine
+import sys
+import time
+import traceback
+
+logger = logging.getLogger('batch')
+
+def addJobResult(configFilename, job, results, progressCallback=None):
+    'Skein the job and add its result.'
+    jobIndex, model, profile, output = job
+    argv = ['-c', configFilename]
+    if profile != '':
+        argv += ['-p', profile]
+    if output != '':
+        argv += ['-o', output]
+    argv.append(model)
+    startTime = time.time()
+    status = 'ok'
+    message = ''
+    try:
+        slicedModel = skeinforge_engine.main(argv, progressCallback)
+        if slicedModel == None:
+            status = 'failed'
+        elif slicedModel.runtimeParameters.outputFilename != None:
+            output = slicedModel.runtimeParameters.outputFilename
+    except Exception, exception:
+        logger.error('Job %s for %s failed:\n%s', jobIndex + 1, model, traceback.format_exc())
+        status = 'error'
+        message = str(exception)
+    results.append((jobIndex, model, profile, output, status, time.time() - startTime, message))
+
+def getJobGroups(jobs):
+    'Get the jobs grouped by model, in the order in which each model first appears.'
+    jobGroups = []
+    jobGroupTable = {}
+    for job in jobs:
+        model = job[1]
+        if model not in jobGroupTable:
+            jobGroupTable[model] = []
+            jobGroups.append(jobGroupTable[model])
+        jobGroupTable[model].append(job)
+    return jobGroups
+
+def getJobs(manifestFilename):
+    'Get the (index, model, profile, output) jobs of the manifest.'
+    manifestDirectory = os.path.dirname(os.path.abspath(manifestFilename))
+    jobs = []
+    manifestFile = open(manifestFilename, 'rb')
+    for row in csv.reader(manifestFile):
+        row = [cell.strip() for cell in row]
+        if len(row) < 1 or row[0] == '' or row[0].startswith('#'):
+            continue
+        row += [''] * (3 - len(row))
+        paths = []
+        for path in row[: 3]:
+            if path != '':
+                path = os.path.normpath(os.path.join(manifestDirectory, os.path.expanduser(path)))
+            paths.append(path)
+        jobs.append(tuple([len(jobs)] + paths))
+    manifestFile.close()
+    return jobs
+
+def getResults(configFilename, jobGroups, processes, meshCacheEntries):
+    'Get the results of the job groups, run in the number of worker processes.'
+    results = []
+    if processes < 2:
+        mesh_cache.setMaximumEntries(meshCacheEntries)
+        for jobGroup in jobGroups:
+            for job in jobGroup:
+                addJobResult(configFilename, job, results)
+        return results
+    taskQueue = multiprocessing.Queue()
+    resultQueue = multiprocessing.Queue()
+    for jobGroup in jobGroups:
+        taskQueue.put(jobGroup)
+    workers = []
+    for workerIndex in xrange(processes):
+        taskQueue.put(None)
+        worker = multiprocessing.Process(target=runWorker, args=(configFilename, meshCacheEntries, taskQueue, resultQueue))
+        worker.start()
+        workers.append(worker)
+    numberOfGroupResults = 0
+    while numberOfGroupResults < len(jobGroups):
+        try:
+            results += resultQueue.get(True, 1.0)
+            numberOfGroupResults += 1
+        except Queue.Empty:
+            if not any([worker.is_alive() for worker in workers]):
+                logger.error('The workers stopped before all the jobs were finished.')
+                break
+    for worker in workers:
+        worker.join()
+    return results
+
+def runWorker(configFilename, meshCacheEntries, taskQueue, resultQueue):
+    'Skein the job groups from the task queue until there are no more.'
+    mesh_cache.setMaximumEntries(meshCacheEntries)
+    for jobGroup in iter(taskQueue.get, None):
+        results = []
+        for job in jobGroup:
+            addJobResult(configFilename, job, results)
+        resultQueue.put(results)
+
+def writeSummary(jobs, results, summaryFilename):
+    'Write the status and duration of each job to the summary csv file, in the order of the manifest.'
+    resultTable = {}
+    for result in results:
+        resultTable[result[0]] = result
+    summaryFile = open(summaryFilename, 'wb')
+    writer = csv.writer(summaryFile)
+    writer.writerow(['job', 'model', 'profile', 'output', 'status', 'seconds', 'message'])
+    for jobIndex, model, profile, output in jobs:
+        result = resultTable.get(jobIndex, (jobIndex, model, profile, output, 'not run', 0.0, ''))
+        writer.writerow([jobIndex + 1, result[1], result[2], result[3], result[4], '%.3f' % result[5], result[6]])
+    summaryFile.close()
+
+def main(argv=None):
+    "Starting point for batch skeining."
+    parser = argparse.ArgumentParser(description='Skeins the models of a manifest of jobs into gcode.')
+    parser.add_argument('manifest', help='Csv file of jobs, with a model and optionally a profile and an output filename on each line.')
+    parser.add_argument('-c', metavar='config', help='Configuration for skeinforge engine.', default='skeinforge_engine.cfg')
+    parser.add_argument('-j', metavar='processes', type=int, help='Number of worker processes, defaults to the number of cpus.', default=0)
+    parser.add_argument('-m', metavar='meshes', type=int, help='Number of parsed models each worker keeps in memory.', default=4)
+    parser.add_argument('-s', metavar='summary', help='Summary filename, defaults to the manifest filename with a .summary.csv extension.')
+
+    if argv is None:
+        argv = sys.argv[1:]
+    args = parser.parse_args(argv)
+
+    config.read(args.c)
+    logging.basicConfig(level=config.get('general', 'log.level'), format='%(asctime)s %(levelname)s (%(name)s) %(message)s')
+
+    if not os.path.isfile(args.manifest):
+        logger.error('Manifest not found: %s', args.manifest)
+        return 1
+
+    configFilename = os.path.abspath(args.c)
+    jobs = getJobs(args.manifest)
+    processes = args.j
+    if processes < 1:
+        processes = multiprocessing.cpu_count()
+    jobGroups = getJobGroups(jobs)
+    processes = min(processes, len(jobGroups))
+    summaryFilename = args.s
+    if summaryFilename == None:
+        summaryFilename = os.path.splitext(args.manifest)[0] + '.summary.csv'
+
+    logger.info('Skeining %s jobs of %s models in %s processes.', len(jobs), len(jobGroups), processes)
+    startTime = time.time()
+    results = getResults(configFilename, jobGroups, processes, args.m)
+    writeSummary(jobs, results, summaryFilename)
+
+    numberOfSuccesses = [result[4] for result in results].count('ok')
+    logger.info('%s of %s jobs succeeded in %s seconds, summary written to %s', numberOfSuccesses, len(jobs), timedelta(seconds=time.time() - startTime).total_seconds(), summaryFilename)
+    if numberOfSuccesses < len(jobs):
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    logging.Handler.handleError = skeinforge_engine.handleError
+    sys.exit(main())
@@ -6,9 +6,9 @@ Skeins a 3D model into gcode.
 from config import config
 from datetime import timedelta
 from entities import SlicedModel, RuntimeParameters
-from fabmetheus_utilities import archive
+from fabmetheus_utilities import archive, polygon_offset
 from importlib import import_module
-from utilities import memory_tracker
+from utilities import memory_tracker, plugin_profiler, sliced_model_file
 from entities.Extruder import setupExtruders
 import StringIO
 import argparse
@@ -24,23 +24,30 @@ except:
     import pickle
 
 __plugins_path__ = 'plugins'
+# The extension of the pickled sliced models exported before the binary format, which are still reprocessed.
+__legacy_sliced_model_extension__ = 'slicedmodel.pickle'
 logger = logging.getLogger('engine')
 
-def getCraftedTextFromPlugins(pluginSequence, gcode):
-    'Get a crafted shape file from a list of pluginSequence.'
+def getCraftedTextFromPlugins(pluginSequence, gcode, progressCallback=None):
+    'Get a crafted shape file from a list of pluginSequence, calling progressCallback(pluginIndex, numberOfPlugins, plugin) before each plugin.'
     lastProcedureTime = time.time()
     if __plugins_path__ not in sys.path:
         sys.path.insert(0, __plugins_path__)
-    for plugin in pluginSequence:
+    for pluginIndex, plugin in enumerate(pluginSequence):
+        if progressCallback != None:
+            progressCallback(pluginIndex, len(pluginSequence), plugin)
         pluginModule = import_module(plugin)
         if pluginModule != None:
             if gcode.runtimeParameters.profileMemory:
                 memory_tracker.create_snapshot('Before %s action' % plugin)
-            pluginModule.performAction(gcode)
+            if plugin_profiler.isProfiling():
+                plugin_profiler.runPlugin(plugin, pluginModule.performAction, gcode)
+            else:
+                pluginModule.performAction(gcode)
             logger.info('%s plugin took %s seconds.', plugin.capitalize(), timedelta(seconds=time.time() - lastProcedureTime).total_seconds())
             lastProcedureTime = time.time()
 
-def main(argv=None):
+def main(argv=None, progressCallback=None):
     "Starting point for skeinforge engine."
     parser = argparse.ArgumentParser(description='Skeins a 3D model into slicedModel.')
     parser.add_argument('file', help='The file to skein. Files accepted: stl, obj, gts, and svg. Or sliced model files produced by SkeinforgeEngine.')
@@ -48,6 +55,8 @@ def main(argv=None):
     parser.add_argument('-p', metavar='profile', help='Profile for the skeining.')
     parser.add_argument('-o', metavar='output', help='Output filename. Overrides other export filename settings.')
     parser.add_argument('-r', metavar='reprocess', help='Comma seperated list of plugins to reprocess a sliced model file. The export plugin is automatically appended.')
+    parser.add_argument('--profile', action='store_true', help='Profile each plugin and the time of each layer.')
+    parser.add_argument('--profile-directory', metavar='directory', help='Directory of the profiles, which implies --profile and defaults to the file name with a _profile suffix.')
 
 
     if argv is None:
@@ -57,6 +66,8 @@ def main(argv=None):
     if args.c == None:
         logger.error('Invalid or missing configuration file.')
         return
+    for section in config.sections():
+        config.remove_section(section)
     config.read(args.c)
 
     logLevel = config.get('general', 'log.level')
@@ -83,8 +94,15 @@ def main(argv=None):
     logger.info("Processing file: %s", os.path.basename(inputFilename))
 
     exportedSlicedModelExtension = config.get('export', 'export.slicedmodel.extension')
+    if not inputFilename.endswith(exportedSlicedModelExtension) and inputFilename.endswith(__legacy_sliced_model_extension__):
+        exportedSlicedModelExtension = __legacy_sliced_model_extension__
     if inputFilename.endswith(exportedSlicedModelExtension):
-        slicedModel = pickle.load(open(inputFilename))
+        if sliced_model_file.isSlicedModelFile(inputFilename):
+            slicedModel = sliced_model_file.openSlicedModel(inputFilename)
+            if slicedModel == None:
+                return
+        else:
+            slicedModel = pickle.load(open(inputFilename, 'rb'))
         slicedModel.runtimeParameters = RuntimeParameters()
         inputFilename = inputFilename.replace('.'+exportedSlicedModelExtension, '')
     else:
@@ -114,11 +132,28 @@ def main(argv=None):
     slicedModel.runtimeParameters.inputFilename = inputFilename
 
     setupExtruders(slicedModel)
-
-    getCraftedTextFromPlugins(pluginSequence[:], slicedModel)
+    polygon_offset.setBackend(slicedModel.runtimeParameters.offsetBackend)
+    slicedModel.offsetCache = None
+    if slicedModel.runtimeParameters.offsetCachePoints > 0:
+        slicedModel.offsetCache = polygon_offset.OffsetCache(slicedModel.runtimeParameters.offsetCachePoints)
+    polygon_offset.setOffsetCache(slicedModel.offsetCache)
+
+    if args.profile or args.profile_directory != None:
+        profileDirectory = args.profile_directory
+        if profileDirectory == None:
+            profileDirectory = os.path.splitext(inputFilename)[0] + '_profile'
+        plugin_profiler.startProfiling(profileDirectory)
+    try:
+        getCraftedTextFromPlugins(pluginSequence[:], slicedModel, progressCallback)
+    finally:
+        plugin_profiler.stopProfiling()
+        polygon_offset.setOffsetCache(None)
 
     slicedModel.runtimeParameters.endTime = time.time()
 
+    if slicedModel.offsetCache != None:
+        logger.info('Offset cache: %s', slicedModel.offsetCache)
+
     logger.info('It took %s seconds to complete.', timedelta(seconds=slicedModel.runtimeParameters.endTime - slicedModel.runtimeParameters.startTime).total_seconds())
 
     if slicedModel.runtimeParameters.profileMemory:
@@ -0,0 +1,385 @@
+#!/usr/bin/python
+"""
+Serves skeining jobs over http on the local machine, from a queue run by a fixed number of warm worker processes.
+
+Each worker imports the engine and the plugins once, keeps the recently parsed models in memory and reads the
+configuration afresh for every job, so a job pays none of the startup of a cold skeinforge_engine.py.
+
+    POST /jobs              queue a job given as json: {"model": "part.stl", "profile": "fine.profile", "output": "part.gcode"}
+    GET  /jobs              the status of the jobs
+    GET  /jobs/<id>         the status and plugin progress of the job
+    GET  /jobs/<id>/log     the log lines of the job from ?offset=0, with &follow=1 streaming them until the job ends
+"""
+
+from collections import OrderedDict
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from config import config
+from utilities import mesh_cache
+import Queue
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import skeinforge_batch
+import skeinforge_engine
+import sys
+import threading
+import time
+import urlparse
+
+__log_format__ = '%(asctime)s %(levelname)s (%(name)s) %(message)s'
+logger = logging.getLogger('server')
+
+def getFilesystemPath(value):
+    'Get the path of a json string in the encoding of the filesystem.'
+    if not isinstance(value, basestring):
+        raise TypeError('The path %r is not a string.' % value)
+    if isinstance(value, unicode):
+        return value.encode(sys.getfilesystemencoding() or 'utf-8')
+    return value
+
+def runWorker(workerId, configFilename, meshCacheEntries, taskQueue, eventQueue):
+    'Skein the jobs from the task queue until there are no more, sending their progress, log and result as events.'
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    mesh_cache.setMaximumEntries(meshCacheEntries)
+    eventLogHandler = EventLogHandler(eventQueue)
+    logging.getLogger().addHandler(eventLogHandler)
+    for job in iter(taskQueue.get, None):
+        jobId = job[0]
+        eventLogHandler.jobId = jobId
+        eventQueue.put((jobId, 'start', workerId))
+        progressCallback = lambda pluginIndex, numberOfPlugins, plugin: eventQueue.put((jobId, 'progress', (pluginIndex, numberOfPlugins, plugin)))
+        results = []
+        skeinforge_batch.addJobResult(configFilename, job, results, progressCallback)
+        eventLogHandler.jobId = None
+        eventQueue.put((jobId, 'end', results[0][3 :]))
+
+
+class EventLogHandler(logging.Handler):
+    'A log handler which sends the log lines of the current job of a worker as events.'
+    def __init__(self, eventQueue):
+        'Initialize.'
+        logging.Handler.__init__(self)
+        self.eventQueue = eventQueue
+        self.jobId = None
+        self.setFormatter(logging.Formatter(__log_format__))
+
+    def emit(self, record):
+        'Send the log line if there is a current job.'
+        if self.jobId != None:
+            self.eventQueue.put((self.jobId, 'log', self.format(record)))
+
+
+class Job:
+    'A skeining job and its progress.'
+    def __init__(self, jobId, model, profile, output):
+        'Initialize the queued job.'
+        self.endTime = None
+        self.id = jobId
+        self.logLines = []
+        self.message = ''
+        self.model = model
+        self.numberOfPlugins = 0
+        self.output = output
+        self.plugin = None
+        self.pluginIndex = 0
+        self.profile = profile
+        self.queueTime = time.time()
+        self.startTime = None
+        self.status = 'queued'
+        self.workerId = None
+
+    def getDictionary(self):
+        'Get the status of the job as a dictionary.'
+        seconds = None
+        if self.startTime != None:
+            seconds = (self.endTime or time.time()) - self.startTime
+        return OrderedDict([
+                ('id', self.id),
+                ('model', self.model),
+                ('profile', self.profile),
+                ('output', self.output),
+                ('status', self.status),
+                ('plugin', self.plugin),
+                ('pluginIndex', self.pluginIndex),
+                ('numberOfPlugins', self.numberOfPlugins),
+                ('seconds', seconds),
+                ('logLines', len(self.logLines)),
+                ('message', self.message)])
+
+    def isFinished(self):
+        'Determine if the job has finished.'
+        return self.endTime != None
+
+
+class JobQueue:
+    'The jobs of the server, skeined in order by the worker processes.'
+    def __init__(self, configFilename, processes, meshCacheEntries, maximumFinishedJobs):
+        'Start the worker processes and the thread which applies their events to the jobs.'
+        self.condition = threading.Condition()
+        self.jobs = OrderedDict()
+        self.configFilename = configFilename
+        self.isStopping = False
+        self.maximumFinishedJobs = maximumFinishedJobs
+        self.meshCacheEntries = meshCacheEntries
+        self.nextJobId = 1
+        self.nextWorkerId = 1
+        self.taskQueue = multiprocessing.Queue()
+        self.eventQueue = multiprocessing.Queue()
+        self.workers = OrderedDict()
+        for workerIndex in xrange(processes):
+            self.startWorker()
+        self.eventThread = threading.Thread(target=self.processEvents)
+        self.eventThread.daemon = True
+        self.eventThread.start()
+
+    def addJob(self, model, profile, output):
+        'Queue a job and return it.'
+        self.condition.acquire()
+        try:
+            job = Job(self.nextJobId, model, profile, output)
+            self.nextJobId += 1
+            self.jobs[job.id] = job
+            self.removeOldestFinishedJobs()
+        finally:
+            self.condition.release()
+        self.taskQueue.put((job.id, model, profile, output))
+        return job
+
+    def checkWorkers(self):
+        'Fail the running jobs of the workers which died, and start a worker in place of each of them.'
+        if self.isStopping:
+            return
+        for workerId, worker in self.workers.items():
+            if worker.is_alive():
+                continue
+            del self.workers[workerId]
+            logger.error('Worker process %s died with exit code %s, starting another.', worker.pid, worker.exitcode)
+            for job in self.jobs.values():
+                if job.workerId == workerId and not job.isFinished():
+                    job.endTime = time.time()
+                    job.message = 'The worker process skeining the job died with exit code %s.' % worker.exitcode
+                    job.plugin = None
+                    job.status = 'failed'
+                    logger.info('Job %s for %s ended with %s.', job.id, job.model, job.status)
+            self.startWorker()
+
+    def getJob(self, jobId):
+        'Get the job with the id, or None if there is no such job.'
+        self.condition.acquire()
+        try:
+            return self.jobs.get(jobId)
+        finally:
+            self.condition.release()
+
+    def getJobDictionaries(self):
+        'Get the status of all the jobs as dictionaries.'
+        self.condition.acquire()
+        try:
+            return [job.getDictionary() for job in self.jobs.values()]
+        finally:
+            self.condition.release()
+
+    def processEvent(self, jobId, kind, data):
+        'Apply an event from a worker to its job.'
+        job = self.jobs.get(jobId)
+        if job == None:
+            return
+        if kind == 'log':
+            job.logLines.append(data)
+        elif kind == 'progress':
+            job.pluginIndex, job.numberOfPlugins, job.plugin = data
+        elif kind == 'start':
+            job.startTime = time.time()
+            job.status = 'running'
+            job.workerId = data
+        elif kind == 'end':
+            job.output, job.status, seconds, job.message = data
+            job.endTime = time.time()
+            job.plugin = None
+            job.pluginIndex = job.numberOfPlugins
+            logger.info('Job %s for %s ended with %s in %.3f seconds.', jobId, job.model, job.status, seconds)
+
+    def processEvents(self):
+        'Apply the events from the workers to the jobs, check the workers at least every second and wake the requests which wait for them.'
+        while True:
+            try:
+                event = self.eventQueue.get(True, 1.0)
+            except Queue.Empty:
+                event = ()
+            if event == None:
+                return
+            self.condition.acquire()
+            try:
+                if len(event) > 0:
+                    self.processEvent(*event)
+                self.checkWorkers()
+                self.condition.notifyAll()
+            finally:
+                self.condition.release()
+
+    def removeOldestFinishedJobs(self):
+        'Remove the oldest finished jobs until there are no more than the maximum.'
+        finishedJobIds = [job.id for job in self.jobs.values() if job.isFinished()]
+        for jobId in finishedJobIds[: max(0, len(finishedJobIds) - self.maximumFinishedJobs)]:
+            del self.jobs[jobId]
+
+    def startWorker(self):
+        'Start a worker process.'
+        worker = multiprocessing.Process(target=runWorker, args=(self.nextWorkerId, self.configFilename, self.meshCacheEntries, self.taskQueue, self.eventQueue))
+        worker.start()
+        self.workers[self.nextWorkerId] = worker
+        self.nextWorkerId += 1
+
+    def stop(self):
+        'Drop the queued jobs, let the workers finish their running jobs and stop them.'
+        self.condition.acquire()
+        try:
+            self.isStopping = True
+            workers = self.workers.values()
+        finally:
+            self.condition.release()
+        try:
+            while True:
+                self.taskQueue.get_nowait()
+        except Queue.Empty:
+            pass
+        for worker in workers:
+            self.taskQueue.put(None)
+        for worker in workers:
+            worker.join()
+        self.eventQueue.put(None)
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    'Handles the requests of the job api.'
+    def do_GET(self):
+        'Get the jobs, a job or the log of a job.'
+        url = urlparse.urlparse(self.path)
+        pathWords = [word for word in url.path.split('/') if word != '']
+        if pathWords == ['jobs']:
+            self.sendJSON(200, self.server.jobQueue.getJobDictionaries())
+            return
+        if len(pathWords) < 2 or len(pathWords) > 3 or pathWords[0] != 'jobs' or not pathWords[1].isdigit():
+            self.sendJSON(404, {'error': 'Unknown path %s' % url.path})
+            return
+        job = self.server.jobQueue.getJob(int(pathWords[1]))
+        if job == None:
+            self.sendJSON(404, {'error': 'There is no job %s' % pathWords[1]})
+            return
+        if len(pathWords) == 2:
+            self.sendJSON(200, job.getDictionary())
+        elif pathWords[2] == 'log':
+            query = urlparse.parse_qs(url.query)
+            try:
+                offset = int(query.get('offset', ['0'])[0])
+            except ValueError:
+                self.sendJSON(400, {'error': 'The offset must be an integer.'})
+                return
+            self.sendLog(job, max(0, offset), query.get('follow', ['0'])[0] == '1')
+        else:
+            self.sendJSON(404, {'error': 'Unknown path %s' % url.path})
+
+    def do_POST(self):
+        'Queue a job.'
+        if self.path.rstrip('/') != '/jobs':
+            self.sendJSON(404, {'error': 'Unknown path %s' % self.path})
+            return
+        try:
+            jobDictionary = json.loads(self.rfile.read(int(self.headers.getheader('content-length', 0))))
+            model = getFilesystemPath(jobDictionary['model'])
+            profile = getFilesystemPath(jobDictionary.get('profile') or '')
+            output = getFilesystemPath(jobDictionary.get('output') or '')
+        except (AttributeError, KeyError, TypeError, ValueError):
+            self.sendJSON(400, {'error': 'The job must be a json object with a model and optionally a profile and an output, as paths the filesystem can encode.'})
+            return
+        for path in [model, profile]:
+            if path != '' and not os.path.isfile(path):
+                self.sendJSON(400, {'error': 'File not found: %s' % path})
+                return
+        job = self.server.jobQueue.addJob(model, profile, output)
+        self.sendJSON(202, job.getDictionary())
+
+    def log_message(self, format, *args):
+        'Log the request at debug level rather than to stderr.'
+        logger.debug('%s %s', self.address_string(), format % args)
+
+    def sendJSON(self, code, value):
+        'Send the value as a json response.'
+        body = json.dumps(value, indent=2)
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def sendLog(self, job, offset, follow):
+        'Send the log lines of the job from the offset, and if following, send the later lines as they arrive until the job ends.'
+        condition = self.server.jobQueue.condition
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.end_headers()
+        while True:
+            condition.acquire()
+            try:
+                while follow and offset >= len(job.logLines) and not job.isFinished():
+                    condition.wait(1.0)
+                logLines = job.logLines[offset :]
+                isFinished = job.isFinished()
+            finally:
+                condition.release()
+            for logLine in logLines:
+                self.wfile.write(logLine + '\n')
+            self.wfile.flush()
+            offset += len(logLines)
+            if not follow or (isFinished and len(logLines) < 1):
+                return
+
+
+def stopServing(signalNumber, frame):
+    'Stop serving on an interrupt or a terminate signal.'
+    raise KeyboardInterrupt
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    'An http server which handles each request in a thread, so that streamed logs do not block the other requests.'
+    daemon_threads = True
+
+def main(argv=None):
+    "Starting point for the skeinforge server."
+    parser = argparse.ArgumentParser(description='Serves skeining jobs over http on the local machine.')
+    parser.add_argument('-c', metavar='config', help='Configuration for skeinforge engine.', default='skeinforge_engine.cfg')
+    parser.add_argument('-a', metavar='address', help='Address to listen on.', default='127.0.0.1')
+    parser.add_argument('-p', metavar='port', type=int, help='Port to listen on.', default=8420)
+    parser.add_argument('-j', metavar='processes', type=int, help='Number of worker processes, defaults to the number of cpus.', default=0)
+    parser.add_argument('-m', metavar='meshes', type=int, help='Number of parsed models each worker keeps in memory.', default=4)
+    parser.add_argument('-k', metavar='keep', type=int, help='Number of finished jobs which are kept for their status and log.', default=100)
+
+    if argv is None:
+        argv = sys.argv[1:]
+    args = parser.parse_args(argv)
+
+    config.read(args.c)
+    logging.basicConfig(level=config.get('general', 'log.level'), format=__log_format__)
+
+    processes = args.j
+    if processes < 1:
+        processes = multiprocessing.cpu_count()
+    jobQueue = JobQueue(os.path.abspath(args.c), processes, args.m, args.k)
+    server = ThreadingHTTPServer((args.a, args.p), RequestHandler)
+    server.jobQueue = jobQueue
+    signal.signal(signal.SIGINT, stopServing)
+    signal.signal(signal.SIGTERM, stopServing)
+    logger.info('Serving skeining jobs on http://%s:%s/jobs with %s processes.', args.a, server.server_port, processes)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info('Stopping after the running jobs.')
+    server.server_close()
+    jobQueue.stop()
+
+if __name__ == "__main__":
+    logging.Handler.handleError = skeinforge_engine.handleError
+    main()
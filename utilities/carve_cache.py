@@ -0,0 +1,125 @@
+'''
+On disk cache of carved layers, keyed on the content of the model file and the carve settings.
+
+Each entry is a pickle of the rotated loop layers and the carving corners. The access time of an entry is its
+modification time, so the least recently used entries are evicted when the cache grows past its size.
+'''
+
+import hashlib
+import logging
+import os
+import tempfile
+try:
+    import cPickle as pickle
+except:
+    import pickle
+
+# Bumped when the pickled carving changes, so that older entries are never loaded.
+__cache_version__ = 1
+__entry_extension__ = '.carving'
+
+logger = logging.getLogger('carve_cache')
+
+def getDefaultDirectory():
+    'Get the cache directory used when the profile does not set one.'
+    return os.path.join(os.path.expanduser('~'), '.skeinforge_engine', 'carve_cache')
+
+def getFileHash(fileName):
+    'Get the sha1 hex digest of the content of the file, reading it in blocks.'
+    fileHash = hashlib.sha1()
+    modelFile = open(fileName, 'rb')
+    try:
+        block = modelFile.read(1048576)
+        while block != '':
+            fileHash.update(block)
+            block = modelFile.read(1048576)
+    finally:
+        modelFile.close()
+    return fileHash.hexdigest()
+
+
+class CarveCache:
+    'A size bounded, least recently used cache of carvings in a directory.'
+    def __init__(self, directory, maximumSize):
+        'Initialize the directory and the maximum total size in bytes of the entries.'
+        self.directory = directory
+        self.maximumSize = maximumSize
+
+    def evict(self):
+        'Remove the least recently used entries until the entries fit in the maximum size.'
+        entries = []
+        totalSize = 0
+        for entryName in os.listdir(self.directory):
+            if not entryName.endswith(__entry_extension__):
+                continue
+            entryPath = os.path.join(self.directory, entryName)
+            try:
+                entryStat = os.stat(entryPath)
+            except OSError:
+                continue
+            entries.append((entryStat.st_mtime, entryStat.st_size, entryPath))
+            totalSize += entryStat.st_size
+        entries.sort()
+        for modificationTime, entrySize, entryPath in entries:
+            if totalSize <= self.maximumSize:
+                return
+            try:
+                os.remove(entryPath)
+                totalSize -= entrySize
+            except OSError:
+                pass
+
+    def get(self, key):
+        'Get the cached carving for the key, or None if there is none.'
+        entryPath = self.getEntryPath(key)
+        try:
+            entryFile = open(entryPath, 'rb')
+        except IOError:
+            return None
+        try:
+            try:
+                carving = pickle.load(entryFile)
+            except Exception:
+                logger.warning('Could not load the cached carving %s, it will be carved again.', entryPath)
+                return None
+        finally:
+            entryFile.close()
+        try:
+            os.utime(entryPath, None)
+        except OSError:
+            pass
+        return carving
+
+    def getEntryPath(self, key):
+        'Get the path of the entry for the key.'
+        return os.path.join(self.directory, key + __entry_extension__)
+
+    def getKey(self, fileName, settings):
+        'Get the key of the carving of the file with the list of (name, value) carve settings.'
+        keyHash = hashlib.sha1()
+        keyHash.update('%s\n%s\n' % (__cache_version__, getFileHash(fileName)))
+        keyHash.update('%s\n' % os.path.splitext(fileName)[1].lower())
+        for settingName, settingValue in settings:
+            keyHash.update('%s=%r\n' % (settingName, settingValue))
+        return keyHash.hexdigest()
+
+    def put(self, key, carving):
+        'Write the carving to the entry for the key, then evict the least recently used entries.'
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        temporaryHandle, temporaryPath = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            temporaryFile = os.fdopen(temporaryHandle, 'wb')
+            try:
+                pickle.dump(carving, temporaryFile, pickle.HIGHEST_PROTOCOL)
+            finally:
+                temporaryFile.close()
+            entryPath = self.getEntryPath(key)
+            if os.path.exists(entryPath):
+                os.remove(entryPath)
+            os.rename(temporaryPath, entryPath)
+        except:
+            if os.path.exists(temporaryPath):
+                os.remove(temporaryPath)
+            raise
+        self.evict()
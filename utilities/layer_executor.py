@@ -0,0 +1,83 @@
+'''
+Layer executor runs a function over the layers of a model in a pool of worker processes.
+
+The workers are forked with the state of the plugin, so only the arguments of each layer are sent to them and only the
+results of each layer are sent back. The arguments and the results should be small, so the loops of a layer are sent
+as a compact array of their coordinates rather than as pickled lists of points. The layers are sent in ranges, four
+for each process, so a process which gets the quick layers takes more ranges.
+'''
+
+from multiprocessing import Pool
+from utilities import plugin_profiler
+import array
+import math
+import multiprocessing
+import time
+
+# The layer function and the plugin state of this worker of a layer executor.
+globalLayerFunction = None
+globalWorkerState = None
+
+def getLayerResults(layerFunction, layerArguments, processes, workerState=None):
+    'Get the results of the layer function for the state and the arguments of each layer, run in the worker processes.'
+    if processes < 2 or len(layerArguments) < 2:
+        return [layerFunction(workerState, arguments) for arguments in layerArguments]
+    rangeLength = int(math.ceil(len(layerArguments) / float(4 * processes)))
+    pool = Pool(processes, setWorkerState, (layerFunction, workerState))
+    try:
+        layerResults = pool.map(getWorkerLayerResult, layerArguments, rangeLength)
+    finally:
+        pool.close()
+        pool.join()
+    if not plugin_profiler.isProfiling():
+        return layerResults
+    # When the plugins are profiled the workers send the seconds of each layer with its result, and the arguments are in layer order.
+    for layerIndex, (seconds, layerResult) in enumerate(layerResults):
+        plugin_profiler.addLayerTime(layerIndex, seconds)
+    return [layerResult for seconds, layerResult in layerResults]
+
+def getLoopsArray(loops):
+    'Get the loops as a compact pair of the string of their x and y coordinates and the tuple of their lengths.'
+    coordinates = array.array('d')
+    for loop in loops:
+        for point in loop:
+            coordinates.append(point.real)
+            coordinates.append(point.imag)
+    return (coordinates.tostring(), tuple([len(loop) for loop in loops]))
+
+def getLoopsFromArray(loopsArray):
+    'Get the loops of complex points from the compact pair of their coordinates and their lengths.'
+    coordinatesString, loopLengths = loopsArray
+    coordinates = array.array('d')
+    coordinates.fromstring(coordinatesString)
+    points = map(complex, coordinates[0 : : 2], coordinates[1 : : 2])
+    loops = []
+    pointIndex = 0
+    for loopLength in loopLengths:
+        loops.append(points[pointIndex : pointIndex + loopLength])
+        pointIndex += loopLength
+    return loops
+
+def getProcesses(multiprocess, processes):
+    'Get the number of worker processes, one if not multiprocess and one for each cpu if the processes are not set.'
+    if not multiprocess:
+        return 1
+    if processes > 0:
+        return processes
+    return multiprocessing.cpu_count()
+
+def getWorkerLayerResult(arguments):
+    'Get the result of the layer function of this worker for the arguments of a layer, with its seconds if the plugins are profiled.'
+    if not plugin_profiler.isProfiling():
+        return globalLayerFunction(globalWorkerState, arguments)
+    startTime = time.time()
+    layerResult = globalLayerFunction(globalWorkerState, arguments)
+    return (time.time() - startTime, layerResult)
+
+def setWorkerState(layerFunction, workerState):
+    'Set the layer function and the plugin state of this worker.'
+    global globalLayerFunction
+    global globalWorkerState
+    globalLayerFunction = layerFunction
+    globalWorkerState = workerState
+    plugin_profiler.setWorkerProcess()
@@ -0,0 +1,44 @@
+'''
+In memory cache of parsed model files, so that the jobs of a batch or of the slicing server parse each model once.
+
+A cached triangle mesh is never carved itself, every job carves a copy of it. Other carvings are parsed for every job.
+'''
+
+from collections import OrderedDict
+from fabmetheus_utilities import svg_writer
+import os
+
+# The parsed carvings keyed on the file name, modification time and size in order of use, or None when the cache is off.
+carvings = None
+maximumEntries = 0
+
+def getCarving(fileName):
+    'Get a carving of the file, only parsing the file if it is not in the cache.'
+    if carvings == None:
+        return svg_writer.getCarving(fileName)
+    fileStat = os.stat(fileName)
+    key = (os.path.abspath(fileName), fileStat.st_mtime, fileStat.st_size)
+    carving = carvings.pop(key, None)
+    if carving == None:
+        carving = svg_writer.getCarving(fileName)
+        if carving == None or not hasattr(carving, 'getCarvingCopy'):
+            return carving
+    carvings[key] = carving
+    removeLeastRecentlyUsed()
+    return carving.getCarvingCopy()
+
+def removeLeastRecentlyUsed():
+    'Remove the least recently used carvings until there are no more than the maximum entries.'
+    while len(carvings) > maximumEntries:
+        carvings.popitem(False)
+
+def setMaximumEntries(entries):
+    'Keep up to the number of parsed carvings, turning the cache off if the number is less than one.'
+    global carvings, maximumEntries
+    maximumEntries = entries
+    if entries < 1:
+        carvings = None
+        return
+    if carvings == None:
+        carvings = OrderedDict()
+    removeLeastRecentlyUsed()
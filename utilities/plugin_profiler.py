@@ -0,0 +1,164 @@
+'''
+Profiler of the plugins of a skein, which is started by the --profile option of skeinforge_engine.
+
+Each plugin runs under cProfile and under a sampling profiler, which records the stack of the plugin every few
+milliseconds of cpu time. For each plugin the profile directory gets:
+    <plugin>.pstats     the cProfile statistics, to be read with pstats or a viewer such as snakeviz
+    <plugin>.collapsed  the sampled stacks as collapsed stack lines, to be drawn with flamegraph.pl or speedscope
+and once the skein ends, layers.csv gets the seconds each layer loop plugin spent on each layer.
+
+The worker processes of a multiprocess plugin are not profiled, but they record the times of their layers.
+'''
+
+import cProfile
+import logging
+import os
+import pstats
+import signal
+import sys
+import time
+
+# The profiler of the running skein, None unless the plugins are profiled.
+globalProfiler = None
+# The cpu seconds between the samples of the stacks.
+globalSamplingInterval = 0.002
+
+logger = logging.getLogger('plugin_profiler')
+
+def addLayerTime(layerIndex, seconds):
+    'Add the seconds the running plugin spent on the layer, if the plugins are profiled.'
+    if globalProfiler != None:
+        globalProfiler.addLayerTime(layerIndex, seconds)
+
+def getTimedLayers(layers):
+    'Get the layers, or if the plugins are profiled an iterator over them which records the time the running plugin spends on each layer.'
+    if globalProfiler == None:
+        return layers
+    return globalProfiler.getTimedLayers(layers)
+
+def isProfiling():
+    'Determine if the plugins are profiled.'
+    return globalProfiler != None
+
+def runPlugin(plugin, performAction, slicedModel):
+    'Run the action of the plugin under the profilers and write its profiles.'
+    globalProfiler.runPlugin(plugin, performAction, slicedModel)
+
+def setWorkerProcess():
+    'Stop the profiling which a forked worker process inherits, keeping the recording of its layer times.'
+    if globalProfiler != None:
+        sys.setprofile(None)
+
+def startProfiling(directory):
+    'Start profiling the plugins, writing the profiles to the directory.'
+    global globalProfiler
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    globalProfiler = PluginProfiler(directory)
+    logger.info('Profiling the plugins to %s', directory)
+
+def stopProfiling():
+    'Write the layer times and stop profiling the plugins.'
+    global globalProfiler
+    if globalProfiler == None:
+        return
+    globalProfiler.writeLayerTimes()
+    globalProfiler = None
+
+
+class PluginProfiler:
+    'Profiles the plugins and records the time each layer loop plugin spends on each layer.'
+    def __init__(self, directory):
+        'Initialize.'
+        self.directory = directory
+        self.layerTimes = []
+        self.plugin = None
+        self.stackCounts = {}
+
+    def addLayerTime(self, layerIndex, seconds):
+        'Add the seconds the running plugin spent on the layer.'
+        self.layerTimes.append((self.plugin, layerIndex, seconds))
+
+    def addSample(self, signalNumber, frame):
+        'Count the stack of the plugin which the sampling signal interrupted.'
+        stackFrames = []
+        while frame != None and frame.f_code != cProfile.Profile.runcall.im_func.func_code:
+            code = frame.f_code
+            stackFrames.append('%s (%s:%s)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+            frame = frame.f_back
+        stackFrames.reverse()
+        stack = ';'.join(stackFrames)
+        self.stackCounts[stack] = self.stackCounts.get(stack, 0) + 1
+
+    def getTimedLayers(self, layers):
+        'Get an iterator over the layers which records the time the running plugin spends on each layer.'
+        for layer in layers:
+            startTime = time.time()
+            yield layer
+            self.addLayerTime(layer.index, time.time() - startTime)
+
+    def logHottestFunctions(self, profile, numberOfFunctions=5):
+        'Log the functions in which the plugin spent the most time, not counting the functions they call.'
+        functionTimes = []
+        for function, (primitiveCalls, calls, totalTime, cumulativeTime, callers) in pstats.Stats(profile).stats.items():
+            functionTimes.append((totalTime, function))
+        functionTimes.sort(reverse=True)
+        hottestFunctions = ['%s (%s:%s) %.3f s' % (function[2], os.path.basename(function[0]), function[1], totalTime) for totalTime, function in functionTimes[: numberOfFunctions]]
+        logger.info('Hottest functions of %s: %s', self.plugin, ', '.join(hottestFunctions))
+
+    def runPlugin(self, plugin, performAction, slicedModel):
+        'Run the action of the plugin under cProfile and the sampling profiler and write its profiles.'
+        self.plugin = plugin
+        self.stackCounts = {}
+        profile = cProfile.Profile()
+        isSampling = self.startSampling()
+        try:
+            profile.runcall(performAction, slicedModel)
+        finally:
+            if isSampling:
+                self.stopSampling()
+        profile.dump_stats(os.path.join(self.directory, '%s.pstats' % plugin))
+        if isSampling:
+            self.writeCollapsedStacks(os.path.join(self.directory, '%s.collapsed' % plugin))
+        self.logHottestFunctions(profile)
+
+    def startSampling(self):
+        'Start sampling the stacks, returning False if they can not be sampled, which needs the profiling timer and the main thread.'
+        if not hasattr(signal, 'setitimer'):
+            return False
+        try:
+            signal.signal(signal.SIGPROF, self.addSample)
+        except ValueError:
+            return False
+        signal.siginterrupt(signal.SIGPROF, False)
+        signal.setitimer(signal.ITIMER_PROF, globalSamplingInterval, globalSamplingInterval)
+        return True
+
+    def stopSampling(self):
+        'Stop sampling the stacks.'
+        signal.setitimer(signal.ITIMER_PROF, 0.0)
+        signal.signal(signal.SIGPROF, signal.SIG_DFL)
+
+    def writeCollapsedStacks(self, fileName):
+        'Write the sampled stacks of the plugin as collapsed stack lines, each with the number of its samples.'
+        collapsedFile = open(fileName, 'w')
+        for stack in sorted(self.stackCounts.keys()):
+            collapsedFile.write('%s %s\n' % (stack, self.stackCounts[stack]))
+        collapsedFile.close()
+
+    def writeLayerTimes(self, numberOfLayers=3):
+        'Write the layer times of the plugins to layers.csv and log the slowest layers of each plugin.'
+        layerTimesFile = open(os.path.join(self.directory, 'layers.csv'), 'w')
+        layerTimesFile.write('plugin,layer,seconds\n')
+        pluginLayerTimes = {}
+        plugins = []
+        for plugin, layerIndex, seconds in self.layerTimes:
+            layerTimesFile.write('%s,%s,%.6f\n' % (plugin, layerIndex, seconds))
+            if plugin not in pluginLayerTimes:
+                pluginLayerTimes[plugin] = []
+                plugins.append(plugin)
+            pluginLayerTimes[plugin].append((seconds, layerIndex))
+        layerTimesFile.close()
+        for plugin in plugins:
+            slowestLayers = sorted(pluginLayerTimes[plugin], reverse=True)[: numberOfLayers]
+            logger.info('Slowest layers of %s: %s', plugin, ', '.join(['%s %.3f s' % (layerIndex, seconds) for seconds, layerIndex in slowestLayers]))
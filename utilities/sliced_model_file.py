@@ -0,0 +1,459 @@
+'''
+Sliced model file is a compact, versioned binary file of a sliced model, whose layers can be read one at a time.
+
+The file begins with a header of the magic bytes, the format version and the offsets of the settings and of the layer
+index. The layers follow, each a marshalled record of tuples in which the points of every path and loop are packed
+into a string of their coordinates, as are the float parameter values of the gcode commands. After the layers the
+settings are pickled once for the whole model: the runtime parameters, the other attributes of the sliced model, its
+rotated loop layers, the letters and parameter names of the gcode commands, the settings which the paths share, and for
+each entity class the attributes which its objects share. The record of an object keeps only its attributes which
+differ from those shared. The index is the offset of each layer record and the
+end of the last one.
+
+The entities of a model read from the file all refer to the runtime parameters of the model, which their own runtime
+parameters were copied from.
+
+An opened sliced model reads its layers lazily from the memory mapped file: a layer is read when a plugin first gets it
+from the layers of the model, and is kept from then on. The gcode writer reads each layer which no plugin got only
+while writing it, and when the model is written again the records of those untouched layers are copied unchanged, so
+the cost of reprocessing scales with the layers which the plugins use.
+'''
+
+from entities import BoundaryPerimeter, GcodeCommand, InfillPath, Layer, Loop, NestedRing, SlicedModel, SupportPath, TravelPath
+from fabmetheus_utilities import euclidean
+from fabmetheus_utilities.vector3 import Vector3
+from utilities import layer_executor
+import array
+import logging
+import marshal
+import mmap
+import os
+import struct
+import types
+try:
+    import cPickle as pickle
+except:
+    import pickle
+
+# Bumped when the records or the settings change, so that a file is never read with the wrong format.
+__format_version__ = 3
+__header_format__ = '<8sIQQ'
+__magic__ = 'SKEINSMF'
+
+# The path classes by their code in the path records.
+globalPathClasses = [BoundaryPerimeter, Loop, InfillPath, SupportPath, TravelPath]
+# The attributes which are packed into the records, rather than shared or kept in the differing attributes.
+globalPackedAttributes = {
+        'Layer' : ['bridgeRotation', 'feedAndFlowRateMultiplier', 'index', 'nestedRings', 'postLayerGcodeCommands', 'postSupportGcodeCommands', 'preLayerGcodeCommands', 'preSupportGcodeCommands', 'runtimeParameters', 'supportPaths', 'z'],
+        'NestedRing' : ['extraLoops', 'infillPaths', 'infillPathsHolder', 'innerNestedRings', 'lastFillLoops', 'loops', 'penultimateFillLoops', 'perimeter', 'runtimeParameters'],
+        'Path' : ['boundaryPoints', 'gcodeCommands', 'pointCoordinates', 'settings', 'startPoint', 'type', 'z']}
+# The types of the attribute values which can be shared, because they can not be changed.
+globalShareableTypes = (types.NoneType, bool, int, long, float, complex, str, unicode)
+
+logger = logging.getLogger('sliced_model_file')
+
+def isSlicedModelFile(fileName):
+    'Determine if the file is a sliced model file, of any format version.'
+    modelFile = open(fileName, 'rb')
+    magic = modelFile.read(len(__magic__))
+    modelFile.close()
+    return magic == __magic__
+
+def openSlicedModel(fileName):
+    'Open the sliced model, whose layers are read lazily from the file, or return None if the file has another format version.'
+    slicedModelFile = SlicedModelFile(fileName)
+    if not slicedModelFile.isReadable():
+        slicedModelFile.close()
+        return None
+    return slicedModelFile.getSlicedModel()
+
+def readSlicedModel(fileName):
+    'Read the sliced model with all its layers, or return None if the file has another format version.'
+    slicedModelFile = SlicedModelFile(fileName)
+    try:
+        if not slicedModelFile.isReadable():
+            return None
+        slicedModel = slicedModelFile.getSlicedModel()
+        slicedModel.layers = list(slicedModel.layers)
+        return slicedModel
+    finally:
+        slicedModelFile.close()
+
+def writeSlicedModel(slicedModel, fileName):
+    'Write the sliced model to the file.'
+    SlicedModelWriter(slicedModel).write(fileName)
+
+
+class LazyLayers:
+    'The layers of a sliced model file, each read when it is first got and kept from then on.'
+    def __init__(self, slicedModelFile):
+        'Initialize.'
+        self.loadedLayers = {}
+        self.numberOfLayers = len(slicedModelFile)
+        self.readLayers = {}
+        self.slicedModelFile = slicedModelFile
+
+    def __getitem__(self, index):
+        'Get the layer, loading it if it has not been loaded, or a list of the layers of a slice.'
+        if index.__class__ == slice:
+            return [self[layerIndex] for layerIndex in xrange(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index not in self.loadedLayers:
+            if index < 0 or index >= len(self):
+                raise IndexError('layer index out of range')
+            if index in self.readLayers:
+                self.loadedLayers[index] = self.readLayers.pop(index)
+            else:
+                self.loadedLayers[index] = self.slicedModelFile.getLayer(index)
+        return self.loadedLayers[index]
+
+    def __iter__(self):
+        'Get an iterator over the layers, which loads each.'
+        for layerIndex in xrange(len(self)):
+            yield self[layerIndex]
+
+    def __len__(self):
+        'Get the number of layers.'
+        return self.numberOfLayers
+
+    def __setitem__(self, index, layer):
+        'Replace the layer.'
+        if index < 0:
+            index += len(self)
+        self.loadedLayers[index] = layer
+
+    def append(self, layer):
+        'Add the layer after the last, as a loaded layer.'
+        self.loadedLayers[self.numberOfLayers] = layer
+        self.numberOfLayers += 1
+
+    def getReadLayer(self, index):
+        'Get the layer to read, which if it has not been loaded is read without being kept, though the last two read layers are at hand.'
+        if index in self.loadedLayers:
+            return self.loadedLayers[index]
+        if index not in self.readLayers:
+            for readIndex in self.readLayers.keys():
+                if readIndex < index - 1:
+                    del self.readLayers[readIndex]
+            self.readLayers[index] = self.slicedModelFile.getLayer(index)
+        return self.readLayers[index]
+
+    def getReadLayers(self):
+        'Get an iterator over the layers to read, which reads each layer which has not been loaded without keeping it.'
+        for layerIndex in xrange(len(self)):
+            yield self.getReadLayer(layerIndex)
+
+    def insert(self, index, layer):
+        'Insert the layer before the index, loading the layers after it, which move up.'
+        if index < 0:
+            index = max(0, index + self.numberOfLayers)
+        index = min(index, self.numberOfLayers)
+        for layerIndex in xrange(self.numberOfLayers - 1, index - 1, -1):
+            self.loadedLayers[layerIndex + 1] = self[layerIndex]
+        self.loadedLayers[index] = layer
+        self.numberOfLayers += 1
+
+    def isLoaded(self, index):
+        'Determine if the layer has been loaded, which is when it may have been changed.'
+        return index in self.loadedLayers
+
+
+class SlicedModelFile:
+    'A sliced model file, from which the layers are read one at a time.'
+    def __init__(self, fileName):
+        'Open and memory map the file and read its settings and layer index.'
+        self.fileName = fileName
+        self.modelFile = open(fileName, 'rb')
+        self.modelMap = None
+        self.settings = None
+        magic, self.formatVersion, settingsOffset, indexOffset = struct.unpack(__header_format__, self.modelFile.read(struct.calcsize(__header_format__)))
+        if magic != __magic__ or self.formatVersion != __format_version__:
+            logger.error('%s is not a sliced model file of format version %s.', fileName, __format_version__)
+            return
+        self.modelMap = mmap.mmap(self.modelFile.fileno(), 0, access=mmap.ACCESS_READ)
+        self.settings = pickle.loads(self.modelMap[settingsOffset : indexOffset])
+        index = self.modelMap[indexOffset :]
+        self.layerOffsets = struct.unpack('<%sQ' % (len(index) / 8), index)
+        self.commandShapes = self.settings['commandShapes']
+        self.pathSettings = self.settings['pathSettings']
+        self.runtimeParameters = self.settings['runtimeParameters']
+        self.sharedAttributes = self.settings['sharedAttributes']
+
+    def __len__(self):
+        'Get the number of layers.'
+        return len(self.layerOffsets) - 1
+
+    def close(self):
+        'Close the file.'
+        if self.modelMap != None:
+            self.modelMap.close()
+        self.modelFile.close()
+
+    def getAttributes(self, className, differingAttributes):
+        'Get the attributes of an object from the shared attributes of its class and its pickled differing attributes.'
+        attributes = self.sharedAttributes.get(className, {}).copy()
+        if differingAttributes != None:
+            attributes.update(pickle.loads(differingAttributes))
+        return attributes
+
+    def getCommandsFromRecord(self, commandsRecord):
+        'Get the gcode commands, and the gcode lines, from their record.'
+        commandRecords, packedValues, otherValues = commandsRecord
+        values = array.array('d')
+        values.fromstring(packedValues)
+        valueIndex = 0
+        otherValueIndex = 0
+        commands = []
+        for commandRecord in commandRecords:
+            if commandRecord.__class__ == int:
+                commandLetter, parameterNames, areFloats = self.commandShapes[commandRecord]
+                parameters = []
+                for parameterName, isFloat in zip(parameterNames, areFloats):
+                    if isFloat:
+                        parameters.append((parameterName, values[valueIndex]))
+                        valueIndex += 1
+                    else:
+                        parameters.append((parameterName, otherValues[otherValueIndex]))
+                        otherValueIndex += 1
+                commandRecord = GcodeCommand(commandLetter, parameters)
+            commands.append(commandRecord)
+        return commands
+
+    def getLayer(self, layerIndex):
+        'Read the layer.'
+        return self.getLayerFromRecord(marshal.loads(self.getLayerRecord(layerIndex)))
+
+    def getLayerFromRecord(self, layerRecord):
+        'Get the layer from its record.'
+        (index, z, bridgeRotation, feedAndFlowRateMultiplier, preLayerCommands, postLayerCommands, preSupportCommands, postSupportCommands,
+                supportPathRecords, nestedRingRecords, differingAttributes) = layerRecord
+        attributes = self.getAttributes('Layer', differingAttributes)
+        attributes['bridgeRotation'] = bridgeRotation
+        attributes['feedAndFlowRateMultiplier'] = list(feedAndFlowRateMultiplier)
+        attributes['index'] = index
+        attributes['nestedRings'] = [self.getNestedRingFromRecord(nestedRingRecord) for nestedRingRecord in nestedRingRecords]
+        attributes['postLayerGcodeCommands'] = self.getCommandsFromRecord(postLayerCommands)
+        attributes['postSupportGcodeCommands'] = self.getCommandsFromRecord(postSupportCommands)
+        attributes['preLayerGcodeCommands'] = self.getCommandsFromRecord(preLayerCommands)
+        attributes['preSupportGcodeCommands'] = self.getCommandsFromRecord(preSupportCommands)
+        attributes['runtimeParameters'] = self.runtimeParameters
+        attributes['supportPaths'] = [self.getPathFromRecord(supportPathRecord) for supportPathRecord in supportPathRecords]
+        attributes['z'] = z
+        return types.InstanceType(Layer, attributes)
+
+    def getLayerRecord(self, layerIndex):
+        'Get the marshalled record of the layer.'
+        return self.modelMap[self.layerOffsets[layerIndex] : self.layerOffsets[layerIndex + 1]]
+
+    def getNestedRingFromRecord(self, nestedRingRecord):
+        'Get the nested ring from its record.'
+        (perimeterRecord, loopRecords, infillPathRecords, innerNestedRingRecords, infillPathsHolder, extraLoops, penultimateFillLoops, lastFillLoops,
+                differingAttributes) = nestedRingRecord
+        attributes = self.getAttributes('NestedRing', differingAttributes)
+        attributes['extraLoops'] = layer_executor.getLoopsFromArray(extraLoops)
+        attributes['infillPaths'] = [self.getPathFromRecord(infillPathRecord) for infillPathRecord in infillPathRecords]
+        attributes['infillPathsHolder'] = layer_executor.getLoopsFromArray(infillPathsHolder)
+        attributes['innerNestedRings'] = [self.getNestedRingFromRecord(innerNestedRingRecord) for innerNestedRingRecord in innerNestedRingRecords]
+        attributes['lastFillLoops'] = None
+        if lastFillLoops != None:
+            attributes['lastFillLoops'] = layer_executor.getLoopsFromArray(lastFillLoops)
+        attributes['loops'] = [self.getPathFromRecord(loopRecord) for loopRecord in loopRecords]
+        attributes['penultimateFillLoops'] = layer_executor.getLoopsFromArray(penultimateFillLoops)
+        attributes['perimeter'] = None
+        if perimeterRecord != None:
+            attributes['perimeter'] = self.getPathFromRecord(perimeterRecord)
+        attributes['runtimeParameters'] = self.runtimeParameters
+        return types.InstanceType(NestedRing, attributes)
+
+    def getPathFromRecord(self, pathRecord):
+        'Get the path from its record.'
+        classCode, pathType, z, startPoint, packedPointCoordinates, commandsRecord, boundaryPoints, pathSettingsIndex, differingAttributes = pathRecord
+        pathClass = globalPathClasses[classCode]
+        attributes = self.getAttributes(pathClass.__name__, differingAttributes)
+        if boundaryPoints != None:
+            attributes['boundaryPoints'] = [Vector3(*boundaryPoint) for boundaryPoint in boundaryPoints]
+        attributes['gcodeCommands'] = self.getCommandsFromRecord(commandsRecord)
+        attributes['pointCoordinates'] = array.array('d')
+        attributes['pointCoordinates'].fromstring(packedPointCoordinates)
+        attributes['settings'] = self.pathSettings[pathSettingsIndex]
+        attributes['startPoint'] = startPoint
+        attributes['type'] = pathType
+        attributes['z'] = z
+        path = pathClass.__new__(pathClass)
+        path.__setstate__(attributes)
+        return path
+
+    def getSlicedModel(self):
+        'Get the sliced model, whose layers are read lazily.'
+        slicedModel = types.InstanceType(SlicedModel, self.settings['slicedModel'].copy())
+        slicedModel.runtimeParameters = self.runtimeParameters
+        slicedModel.rotatedLoopLayers = []
+        for z, rotation, loops in self.settings['rotatedLoopLayers']:
+            rotatedLoopLayer = euclidean.RotatedLoopLayer(z)
+            rotatedLoopLayer.rotation = rotation
+            rotatedLoopLayer.loops = layer_executor.getLoopsFromArray(loops)
+            slicedModel.rotatedLoopLayers.append(rotatedLoopLayer)
+        slicedModel.layers = LazyLayers(self)
+        return slicedModel
+
+    def isReadable(self):
+        'Determine if the file has the format version which can be read.'
+        return self.settings != None
+
+
+class SlicedModelWriter:
+    'Writes a sliced model file, sharing the attributes which most objects of a class have in common.'
+    def __init__(self, slicedModel):
+        'Initialize.'
+        self.slicedModel = slicedModel
+        self.commandShapeIndexes = {}
+        self.commandShapes = []
+        self.lazyLayers = None
+        self.pathSettings = []
+        self.pathSettingsIndexes = {}
+        self.sharedAttributes = {}
+        if isinstance(slicedModel.layers, LazyLayers):
+            self.lazyLayers = slicedModel.layers
+            self.commandShapes = list(self.lazyLayers.slicedModelFile.commandShapes)
+            for commandShapeIndex, commandShape in enumerate(self.commandShapes):
+                self.commandShapeIndexes[commandShape] = commandShapeIndex
+            self.pathSettings = list(self.lazyLayers.slicedModelFile.pathSettings)
+            for pathSettingsIndex, pathSettings in enumerate(self.pathSettings):
+                self.pathSettingsIndexes[pathSettings] = pathSettingsIndex
+            self.sharedAttributes = self.lazyLayers.slicedModelFile.sharedAttributes.copy()
+
+    def getCommandShapeIndex(self, command):
+        'Get the index of the shape of the command, its letter, parameter names and which parameters are floats, adding the shape if it is new.'
+        commandShape = (command.commandLetter, command.parameterNames, tuple([value.__class__ == float for value in command.parameterValues]))
+        if commandShape not in self.commandShapeIndexes:
+            self.commandShapeIndexes[commandShape] = len(self.commandShapes)
+            self.commandShapes.append(commandShape)
+        return self.commandShapeIndexes[commandShape]
+
+    def getCommandsRecord(self, commands):
+        'Get the record of the gcode commands, in which the float parameter values are packed and a gcode line or None is kept as it is.'
+        commandRecords = []
+        values = array.array('d')
+        otherValues = []
+        for command in commands:
+            if isinstance(command, GcodeCommand):
+                for value in command.parameterValues:
+                    if value.__class__ == float:
+                        values.append(value)
+                    else:
+                        otherValues.append(value)
+                command = self.getCommandShapeIndex(command)
+            commandRecords.append(command)
+        return (commandRecords, values.tostring(), otherValues)
+
+    def getDifferingAttributes(self, className, packedClassName, attributes):
+        'Get the pickled attributes of an entity which differ from those shared by its class, or None if there are none.'
+        packedAttributes = globalPackedAttributes[packedClassName]
+        if className not in self.sharedAttributes:
+            sharedAttributes = {}
+            for attributeName, value in attributes.iteritems():
+                if attributeName not in packedAttributes and value.__class__ in globalShareableTypes:
+                    sharedAttributes[attributeName] = value
+            self.sharedAttributes[className] = sharedAttributes
+        sharedAttributes = self.sharedAttributes[className]
+        differingAttributes = {}
+        for attributeName, value in attributes.iteritems():
+            if attributeName in packedAttributes:
+                continue
+            if attributeName not in sharedAttributes:
+                differingAttributes[attributeName] = value
+                continue
+            sharedValue = sharedAttributes[attributeName]
+            if value.__class__ != sharedValue.__class__ or value != sharedValue:
+                differingAttributes[attributeName] = value
+        if len(differingAttributes) < 1:
+            return None
+        return pickle.dumps(differingAttributes, pickle.HIGHEST_PROTOCOL)
+
+    def getLayerRecord(self, layer):
+        'Get the record of the layer.'
+        return (layer.index, layer.z, layer.bridgeRotation, tuple(layer.feedAndFlowRateMultiplier),
+                self.getCommandsRecord(layer.preLayerGcodeCommands), self.getCommandsRecord(layer.postLayerGcodeCommands),
+                self.getCommandsRecord(layer.preSupportGcodeCommands), self.getCommandsRecord(layer.postSupportGcodeCommands),
+                [self.getPathRecord(supportPath) for supportPath in layer.supportPaths],
+                [self.getNestedRingRecord(nestedRing) for nestedRing in layer.nestedRings],
+                self.getDifferingAttributes('Layer', 'Layer', vars(layer)))
+
+    def getNestedRingRecord(self, nestedRing):
+        'Get the record of the nested ring.'
+        perimeterRecord = None
+        if nestedRing.perimeter != None:
+            perimeterRecord = self.getPathRecord(nestedRing.perimeter)
+        lastFillLoops = None
+        if nestedRing.lastFillLoops != None:
+            lastFillLoops = layer_executor.getLoopsArray(nestedRing.lastFillLoops)
+        return (perimeterRecord,
+                [self.getPathRecord(loop) for loop in nestedRing.loops],
+                [self.getPathRecord(infillPath) for infillPath in nestedRing.infillPaths],
+                [self.getNestedRingRecord(innerNestedRing) for innerNestedRing in nestedRing.innerNestedRings],
+                layer_executor.getLoopsArray(nestedRing.infillPathsHolder),
+                layer_executor.getLoopsArray(nestedRing.extraLoops),
+                layer_executor.getLoopsArray(nestedRing.penultimateFillLoops),
+                lastFillLoops,
+                self.getDifferingAttributes('NestedRing', 'NestedRing', vars(nestedRing)))
+
+    def getPathRecord(self, path):
+        'Get the record of the path.'
+        boundaryPoints = None
+        if path.__class__ == BoundaryPerimeter:
+            boundaryPoints = [(boundaryPoint.x, boundaryPoint.y, boundaryPoint.z) for boundaryPoint in path.boundaryPoints]
+        return (globalPathClasses.index(path.__class__), path.type, path.z, path.startPoint, path.pointCoordinates.tostring(),
+                self.getCommandsRecord(path.gcodeCommands), boundaryPoints, self.getPathSettingsIndex(path.settings),
+                self.getDifferingAttributes(path.__class__.__name__, 'Path', path.__getstate__()))
+
+    def getPathSettingsIndex(self, pathSettings):
+        'Get the index of the path settings, which are added to the path settings if they are new.'
+        if pathSettings not in self.pathSettingsIndexes:
+            self.pathSettingsIndexes[pathSettings] = len(self.pathSettings)
+            self.pathSettings.append(pathSettings)
+        return self.pathSettingsIndexes[pathSettings]
+
+    def getSettings(self):
+        'Get the settings of the whole model.'
+        slicedModelAttributes = vars(self.slicedModel).copy()
+        for attributeName in ['layers', 'rotatedLoopLayers', 'runtimeParameters']:
+            del slicedModelAttributes[attributeName]
+        slicedModelAttributes.pop('offsetCache', None)
+        rotatedLoopLayers = []
+        for rotatedLoopLayer in self.slicedModel.rotatedLoopLayers:
+            rotatedLoopLayers.append((rotatedLoopLayer.z, rotatedLoopLayer.rotation, layer_executor.getLoopsArray(rotatedLoopLayer.loops)))
+        return {
+                'commandShapes' : self.commandShapes,
+                'pathSettings' : self.pathSettings,
+                'rotatedLoopLayers' : rotatedLoopLayers,
+                'runtimeParameters' : self.slicedModel.runtimeParameters,
+                'sharedAttributes' : self.sharedAttributes,
+                'slicedModel' : slicedModelAttributes}
+
+    def write(self, fileName):
+        'Write the layer records, the settings and the layer index to a new file, then the header which locates them, and replace the file with it.'
+        newFileName = fileName + '.new'
+        modelFile = open(newFileName, 'wb')
+        try:
+            modelFile.write(struct.pack(__header_format__, __magic__, __format_version__, 0, 0))
+            layerOffsets = []
+            for layerIndex in xrange(len(self.slicedModel.layers)):
+                layerOffsets.append(modelFile.tell())
+                if self.lazyLayers != None and not self.lazyLayers.isLoaded(layerIndex):
+                    modelFile.write(self.lazyLayers.slicedModelFile.getLayerRecord(layerIndex))
+                else:
+                    modelFile.write(marshal.dumps(self.getLayerRecord(self.slicedModel.layers[layerIndex])))
+            settingsOffset = modelFile.tell()
+            layerOffsets.append(settingsOffset)
+            modelFile.write(pickle.dumps(self.getSettings(), pickle.HIGHEST_PROTOCOL))
+            indexOffset = modelFile.tell()
+            modelFile.write(struct.pack('<%sQ' % len(layerOffsets), *layerOffsets))
+            modelFile.seek(0)
+            modelFile.write(struct.pack(__header_format__, __magic__, __format_version__, settingsOffset, indexOffset))
+        finally:
+            modelFile.close()
+        # The file may be the one whose layers are being read, which stays memory mapped once it is replaced.
+        if os.name == 'nt' and os.path.exists(fileName):
+            os.remove(fileName)
+        os.rename(newFileName, fileName)
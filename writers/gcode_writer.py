@@ -1,7 +1,8 @@
 from config import config
 from fabmetheus_utilities.vector3 import Vector3
 from entities import GcodeCommand, TravelPath
-from plugins.comb import CombSkein
+from plugins.comb import CombSkein, getCombSkeins
+from utilities import plugin_profiler
 import StringIO
 import gcodes
 import sys
@@ -13,44 +14,49 @@ class GcodeWriter:
 
     def __init__(self, slicedModel):
         self.slicedModel = slicedModel
+        self.keepGcodeCommands = True
+        self.combSkeins = {}
 
 
     def getSlicedModel(self, verbose=False):
         '''Final Gcode representation.'''
         output = StringIO.StringIO()
+        self.writeSlicedModel(output, verbose)
+        return output.getvalue()
+
+    def writeSlicedModel(self, output, verbose=False, keepGcodeCommands=True):
+        '''Writes the final Gcode representation to the output layer by layer, such as to a file so it is never held whole in memory.
+        Unless keepGcodeCommands is set the gcode commands of each path are dropped once they are written.'''
+        self.keepGcodeCommands = keepGcodeCommands
+        if self.slicedModel.runtimeParameters.combActive:
+            self.combSkeins = getCombSkeins(self.slicedModel)
 
-        for startCommand in self.slicedModel.startGcodeCommands:
-            output.write(printCommand(startCommand, verbose))
+        writeCommands(output, self.slicedModel.startGcodeCommands, verbose)
 
         lookaheadStartVector = None
         lookaheadKeyIndex = 0
         layerCount = len(self.slicedModel.layers)
-        for layer in self.slicedModel.layers:
+        for layer in plugin_profiler.getTimedLayers(self.slicedModel.getReadLayers()):
             lookaheadStartPoint = None
             lookaheadIndex = layer.index + 1
             if lookaheadIndex < layerCount:
-                lookaheadLayer = self.slicedModel.layers[lookaheadIndex]
+                lookaheadLayer = self.slicedModel.getReadLayer(lookaheadIndex)
                 lookaheadStartPoint = lookaheadLayer.getStartPoint()
                 if lookaheadStartPoint != None:
                     lookaheadStartVector = Vector3(lookaheadStartPoint.real, lookaheadStartPoint.imag, lookaheadLayer.z)
 
             self.getLayer(layer, output, lookaheadStartVector, verbose)
 
-        for endCommand in self.slicedModel.endGcodeCommands:
-            output.write(printCommand(endCommand, verbose))
-
-        return output.getvalue()
+        writeCommands(output, self.slicedModel.endGcodeCommands, verbose)
 
 
     def getLayer(self, layer, output, parentLookaheadStartVector=None, verbose=False):
         '''Final Gcode representation.'''
-        for preLayerGcodeCommand in layer.preLayerGcodeCommands:
-            output.write(printCommand(preLayerGcodeCommand, verbose))
+        writeCommands(output, layer.preLayerGcodeCommands, verbose)
 
+        combSkein = None
         if layer.runtimeParameters.combActive:
-            combSkein = CombSkein(layer)
-        else:
-            combSkein = None
+            combSkein = self.getCombSkein(layer)
 
         pathList = layer.getOrderedPathList()
         paths.resetExtrusionStats()
@@ -80,8 +86,14 @@ class GcodeWriter:
 
             self.getPath(path, layer.z, output, lookaheadVector, layer.feedAndFlowRateMultiplier, verbose)
 
-        for postLayerGcodeCommand in layer.postLayerGcodeCommands:
-            output.write(printCommand(postLayerGcodeCommand, verbose))
+        writeCommands(output, layer.postLayerGcodeCommands, verbose)
+
+    def getCombSkein(self, layer):
+        '''Get the comb skein of the layer, which was built with those of all the layers or is built now, and is only used for this layer.'''
+        combSkein = self.combSkeins.pop(layer.index, None)
+        if combSkein == None:
+            return CombSkein(layer)
+        return combSkein
 
     def getPath(self, path, pathHeight, output, lookaheadStartVector=None, feedAndFlowRateMultiplier=[1.0, 1.0], verbose=False):
         '''Final Gcode representation.'''
@@ -89,13 +101,18 @@ class GcodeWriter:
 
         path.generateGcode(pathExtruder, pathHeight, lookaheadStartVector, feedAndFlowRateMultiplier, self.slicedModel.runtimeParameters)
 
-        for command in path.gcodeCommands:
-            output.write('%s' % printCommand(command, verbose))
-
-def printCommand(command, verbose=False):
-    if command == None:
-        return
-    if isinstance(command, GcodeCommand):
-        return'%s\n' % command.str(verbose)
-    else:
-        return '%s\n' % command
+        writeCommands(output, path.gcodeCommands, verbose)
+        if not self.keepGcodeCommands:
+            path.gcodeCommands = []
+
+def writeCommands(output, commands, verbose=False):
+    '''Writes the lines of the gcode commands, and of the gcode lines among them, to the output in a single write.'''
+    lines = []
+    for command in commands:
+        if command.__class__ == GcodeCommand:
+            lines.append(command.str(verbose))
+        elif command != None:
+            lines.append('%s' % command)
+    if len(lines) > 0:
+        lines.append('')
+        output.write('\n'.join(lines))